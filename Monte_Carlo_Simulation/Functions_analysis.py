@@ -6,6 +6,14 @@ import gams.transfer as gt
 import pybalmorel as pyb
 import gams
 import os
+import glob
+import shutil
+import tempfile
+import uuid
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
 import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
@@ -13,10 +21,17 @@ from plotly.subplots import make_subplots
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import HistGradientBoostingRegressor
 from sklearn.metrics import r2_score
-from io import StringIO
 from typing import Union
 import matplotlib.cm as cm
 import plotly.express as px 
+from Functions_storage import ResultsCache, ResultsStore, StoredModel, TableCache, LazyModel, ChunkedTable
+from Functions_sensitivity import sensitivity_indices, sensitivity_table, correlation_coefficients
+from Functions_surrogate import SurrogateModels
+from Functions_profiling import StageProfiler, no_profiler, profiled, log_event
+from Functions_convergence import ConvergenceMonitor
+from Functions_discovery import ScenarioIndex
+from Functions_network import H2Network
+from Functions_comparison import pairwise_statistics, baseline_statistics, comparison_table, win_rate_matrix, baseline_name
 
 #%% ------------------------------- ###
 ###          0. Hard coded          ###
@@ -28,6 +43,10 @@ EU_East = ['POLAND', 'CZECH_REPUBLIC', 'SLOVAKIA', 'ROMANIA', 'BULGARIA', 'HUNGA
 EU_South = ['ITALY', 'SPAIN', 'PORTUGAL', 'SLOVENIA', 'CROATIA', 'ALBANIA', 'MALTA', 'CYPRUS', 'BOSNIA_AND_HERZEGOVINA', 'MONTENEGRO', 'NORTH_MACEDONIA', 'SERBIA', 'GREECE']
 EU = EU_North + EU_West + EU_East + EU_South
 
+# Named groups of countries of the geographic hierarchy region (RRR) -> country (C) -> zone -> EU
+# A group name can be used instead of a list of countries, and the groups are precomputed by build_results_rollup
+geography_groups = {"EU_North": EU_North, "EU_West": EU_West, "EU_East": EU_East, "EU_South": EU_South, "EU": EU}
+
 RRR_to_CCC = {
     'DK1': 'DENMARK','DK2': 'DENMARK','FIN': 'FINLAND','NO1': 'NORWAY','NO2': 'NORWAY','NO3': 'NORWAY','NO4': 'NORWAY','NO5': 'NORWAY','SE1': 'SWEDEN',
     'SE2': 'SWEDEN', 'SE3': 'SWEDEN','SE4': 'SWEDEN','UK': 'UNITED_KINGDOM','EE': 'ESTONIA','LV': 'LATVIA','LT': 'LITHUANIA','PL': 'POLAND','BE': 'BELGIUM',
@@ -44,12 +63,50 @@ Parameters_names = [ "CO2_TAX","CO2_EFF","ELYS_ELEC_EFF","H2S_INVC","SMR_CCS_INV
                     "ONS_LIMIT_EAST","ONS_LIMIT_WEST","ONS_LIMIT_NORTH","ONS_LIMIT_SOUTH",
                     "TRANS_DEMAND_NORTH","TRANS_DEMAND_SOUTH", "TRANS_DEMAND_EAST", "TRANS_DEMAND_WEST", "NATGAS_P" ]
 
+# Symbols of the baseline input data file used in the analysis
+input_data_symbols = ['CCS_CO2CAPTEFF_G', 'DE', 'EMI_POL', 'FUELPRICE', 'GDATA_numerical', 'GDATA_categorical',
+                      'HYDROGEN_DH2', 'SUBTECHGROUPKPOT', 'XH2INVCOST', 'XINVCOST']
+
+# Symbols of the results files, with the name of the table and the columns of the scenario files
+results_symbols = {"PRO_YCRAGF": ("Generation Production", ['Scenarios', 'Y', 'C', 'RRR', 'AAA', 'G', 'FFF', 'COMMODITY', 'TECH_TYPE', 'UNITS', 'value']),
+                   "G_CAP_YCRAF": ("Generation Capacity", ['Scenarios', 'Y', 'C', 'RRR', 'AAA', 'G', 'FFF', 'COMMODITY', 'TECH_TYPE', 'VARIABLE_CATEGORY', 'UNITS', 'value']),
+                   "XH2_CAP_YCR": ("Hydrogen Transmission Capacity", ['Scenarios', 'Y', 'C', 'IRRRE', 'IRRRI', 'VARIABLE_CATEGORY', 'UNITS', 'value']),
+                   "XH2_FLOW_YCR": ("Hydrogen Transmission Flow", ['Scenarios', 'Y', 'C', 'IRRRE', 'IRRRI', 'UNITS', 'value']),
+                   "G_STO_YCRAF": ("Storage", ['Scenarios', 'Y', 'C', 'RRR', 'AAA', 'G', 'FFF', 'COMMODITY', 'TECH_TYPE', 'VARIABLE_CATEGORY', 'UNITS', 'value'])}
+
+# Version of the DataFrames built by results_from_records, to increase when their format changes so that the DataFrames
+# stored in the results cache by a previous version are read again from the GDX files
+results_format_version = 2
+
+# Columns of each table in the compact representation of the results
+results_tables = {table: columns for table, columns in results_symbols.values()}
+
 results_selections = ["Elec RE Capacity","Elec PV Capacity", "Elec ONSHORE Capacity", "Elec OFFSHORE Capacity",
                       "Elec RE Production","Elec PV Production", "Elec ONSHORE Production", "Elec OFFSHORE Production", 
                       "H2 Green Capacity", "H2 Blue Capacity", "H2 Green Production", "H2 Blue Production", 
                       "H2 Import Capacity", "H2 Import Production", "H2 Storage", 
                       "H2 Transmission Capacity", "H2 Transmission Flow"]
 
+# Table, commodities and technology types of each results selection, None if the selection is not filtered on this dimension
+# Used to find the rows of a selection in the index of the results, the other filters are applied by get_results
+results_selections_filters = {"Elec RE Capacity": ("Generation Capacity", ["ELECTRICITY"], ['WIND-ON', 'WIND-OFF', 'SOLAR-PV']),
+                              "Elec PV Capacity": ("Generation Capacity", ["ELECTRICITY"], ['SOLAR-PV']),
+                              "Elec ONSHORE Capacity": ("Generation Capacity", ["ELECTRICITY"], ['WIND-ON']),
+                              "Elec OFFSHORE Capacity": ("Generation Capacity", ["ELECTRICITY"], ['WIND-OFF']),
+                              "Elec RE Production": ("Generation Production", ["ELECTRICITY"], ['WIND-ON', 'WIND-OFF', 'SOLAR-PV']),
+                              "Elec PV Production": ("Generation Production", ["ELECTRICITY"], ['SOLAR-PV']),
+                              "Elec ONSHORE Production": ("Generation Production", ["ELECTRICITY"], ['WIND-ON']),
+                              "Elec OFFSHORE Production": ("Generation Production", ["ELECTRICITY"], ['WIND-OFF']),
+                              "H2 Green Capacity": ("Generation Capacity", ["HYDROGEN"], None),
+                              "H2 Blue Capacity": ("Generation Capacity", ["HYDROGEN"], ['STEAMREFORMING']),
+                              "H2 Green Production": ("Generation Production", ["HYDROGEN"], None),
+                              "H2 Blue Production": ("Generation Production", ["HYDROGEN"], ['STEAMREFORMING']),
+                              "H2 Import Capacity": ("Generation Capacity", ["HYDROGEN"], None),
+                              "H2 Import Production": ("Generation Production", ["HYDROGEN"], None),
+                              "H2 Storage": ("Storage", ["HYDROGEN"], None),
+                              "H2 Transmission Capacity": ("Hydrogen Transmission Capacity", None, None),
+                              "H2 Transmission Flow": ("Hydrogen Transmission Flow", None, None)}
+
 results_color = {"Elec RE Capacity":"green","Elec PV Capacity":"gold", "Elec ONSHORE Capacity":"lightblue", "Elec OFFSHORE Capacity":"darkblue",
                  "Elec RE Production":"green","Elec PV Production":"gold", "Elec ONSHORE Production":"lightblue", "Elec OFFSHORE Production":"darkblue", 
                  "H2 Green Capacity":"green", "H2 Blue Capacity":"blue", "H2 Green Production":"green", "H2 Blue Production":"blue", 
@@ -75,6 +132,16 @@ input_data_unit = {"NATGAS_P":"€/GJ", "CO2_TAX":"€/tCO2", "SMR_CCS_INVC":"
                    "ONS_LIMIT_EAST":"GW", "ONS_LIMIT_WEST":"GW", "ONS_LIMIT_NORTH":"GW", "ONS_LIMIT_SOUTH":"GW",
                    "OFF_LIMIT_EAST":"GW", "OFF_LIMIT_WEST":"GW", "OFF_LIMIT_NORTH":"GW", "OFF_LIMIT_SOUTH":"GW",}
 
+# Regions of the geography of each geography dependant input data selection
+input_data_regions = {selection: [key for key, value in RRR_to_CCC.items() if value in Geography] for selection, Geography in input_data_geography.items()}
+
+# Columns of the design matrix: the parameters of the sample and the input data selections
+design_matrix_columns = Parameters_names + [selection for selection in input_data_selections if selection not in Parameters_names]
+design_matrix_positions = {parameter: j for j, parameter in enumerate(design_matrix_columns)}
+
+# Number of scenarios above which the figures switch to their large ensemble mode (precomputed violins, WebGL scatter)
+large_ensemble_threshold = 2000
+
 results_and_input_data_selections = ["PV_POT_NORTH","PV_POT_SOUTH","PV_POT_EAST","PV_POT_WEST",
                                      "ONS_POT_EAST","ONS_POT_WEST","ONS_POT_NORTH","ONS_POT_SOUTH",
                                      "OFF_POT_EAST","OFF_POT_WEST","OFF_POT_NORTH","OFF_POT_SOUTH"]
@@ -123,83 +190,713 @@ class MainResults_GSA:
         
         if input_files is not None:
             self.input_files = input_files
+        
+        # Profiler of the stages of the analysis, disabled by default (see enable_profiling)
+        self.profiler = StageProfiler()
+        # Memoized queries of get_results and sample_input_data, disabled by default (see enable_query_cache)
+        self.query_cache = None
+        self.query_cache_size = None
+        # Named groups of countries, the custom groups are added with define_country_group
+        self.geography_groups = dict(geography_groups)
             
     ### ------------------------------- ###
     ###         1.1 Import data         ###
     ### ------------------------------- ###
     
     # Import all the results from the scenario and baseline files into a dictionnary used in the other functions
-    def import_results(self) -> None:
+    # If a cache directory is given, the data read from each GDX file is stored on disk and reused as long as the file is unchanged
+    # If workers is larger than 1, the files are read in parallel by a pool of processes
+    # If compact is True, the results are stored as one table per symbol with categorical columns (see compact_results)
+    # If index is True, the index used by get_results is built once the data is imported (see build_results_index)
+    # If a store directory is given, the results are not kept in memory but written file by file to an out-of-core store partitioned by
+    # table and by chunk_scenarios scenarios (see ResultsStore), which get_results and the plots read partition by partition
+    # If lazy is True, nothing is read at import: each table of a model is read from the symbol of the table in the files of the model
+    # when it is first used, and kept in memory as long as the tables in memory are below max_memory bytes (see TableCache)
+    def import_results(self, cache_dir: str = None, cache_max_size: float = None, verify_hash: bool = False, workers: int = 1,
+                       compact: bool = False, float32: bool = False, index: bool = True, store_dir: str = None, chunk_scenarios: int = 1000,
+                       lazy: bool = False, max_memory: float = None) -> None:
         
-        # Creating the data dictionnary
-        dict_results = {}
+        # Open the cache of the results if needed
+        if cache_dir is not None:
+            self.results_cache = ResultsCache(cache_dir, max_size=cache_max_size, format_version=results_format_version)
         
-        # Import the scenario data in the DataFrame
+        # List all the files to read, the scenario file and then the baseline file of each model
+        files = []
         for i, scenarios in enumerate(self.scenario_files):
-            scenarios_path = os.path.join(os.path.abspath(self.path), scenarios) # Path to the scenario file
-            df = gt.Container(scenarios_path) # Import the scenario file
-            # Find the data in the scenario file
-            if "PRO_YCRAGF" in df.data.keys():
-                df_PRO = pd.DataFrame(df.data["PRO_YCRAGF"].records)
-                df_PRO.columns = ['Scenarios', 'Y', 'C', 'RRR', 'AAA', 'G', 'FFF', 'COMMODITY', 'TECH_TYPE', 'UNITS', 'value']
-                df_PRO["Table"] = "Generation Production"
-                df_PRO['Scenarios'] = df_PRO['Scenarios'].str.extract(r'(\d+)').astype(int)
-            if "G_CAP_YCRAF" in df.data.keys():
-                df_CAP = pd.DataFrame(df.data["G_CAP_YCRAF"].records)
-                df_CAP.columns = ['Scenarios', 'Y', 'C', 'RRR', 'AAA', 'G', 'FFF', 'COMMODITY', 'TECH_TYPE', 'VARIABLE_CATEGORY', 'UNITS', 'value']
-                df_CAP["Table"] = "Generation Capacity"
-                df_CAP['Scenarios'] = df_CAP['Scenarios'].str.extract(r'(\d+)').astype(int)
-            if "XH2_CAP_YCR" in df.data.keys():
-                df_XH2_CAP = pd.DataFrame(df.data["XH2_CAP_YCR"].records)
-                df_XH2_CAP.columns = ['Scenarios', 'Y', 'C', 'IRRRE', 'IRRRI', 'VARIABLE_CATEGORY', 'UNITS', 'value']
-                df_XH2_CAP["Table"] = "Hydrogen Transmission Capacity"
-                df_XH2_CAP['Scenarios'] = df_XH2_CAP['Scenarios'].str.extract(r'(\d+)').astype(int)
-            if "XH2_FLOW_YCR" in df.data.keys():
-                df_XH2_FLOW = pd.DataFrame(df.data["XH2_FLOW_YCR"].records)
-                df_XH2_FLOW.columns = ['Scenarios', 'Y', 'C', 'IRRRE', 'IRRRI', 'UNITS', 'value']
-                df_XH2_FLOW["Table"] = "Hydrogen Transmission Flow"
-                df_XH2_FLOW['Scenarios'] = df_XH2_FLOW['Scenarios'].str.extract(r'(\d+)').astype(int)
-            if "G_STO_YCRAF" in df.data.keys():
-                df_PRO_STO = pd.DataFrame(df.data["G_STO_YCRAF"].records)
-                df_PRO_STO.columns = ['Scenarios', 'Y', 'C', 'RRR', 'AAA', 'G', 'FFF', 'COMMODITY', 'TECH_TYPE', 'VARIABLE_CATEGORY', 'UNITS', 'value']
-                df_PRO_STO["Table"] = "Storage"
-                df_PRO_STO['Scenarios'] = df_PRO_STO['Scenarios'].str.extract(r'(\d+)').astype(int)
-            # Concatenate all the dataframe together and add the model name
-            df_scenarios = pd.concat([df_PRO, df_CAP, df_XH2_CAP, df_XH2_FLOW, df_PRO_STO])
-            
+            files.append((os.path.join(os.path.abspath(self.path), scenarios), False, self.model_names[i])) # Path to the scenario file
             if len(self.baseline_files) != 0:
-                # Import the baseline data in the DataFrame
-                baseline = self.baseline_files[i]
-                baseline_path = os.path.join(os.path.abspath(self.path), baseline) # Path to the baseline file
-                df = gt.Container(baseline_path) # Import the baseline file
-                # Find the data in the baseline file
-                if "PRO_YCRAGF" in df.data.keys():
-                    df_PRO = pd.DataFrame(df.data["PRO_YCRAGF"].records)
-                    df_PRO["Table"] = "Generation Production"
-                if "G_CAP_YCRAF" in df.data.keys():
-                    df_CAP = pd.DataFrame(df.data["G_CAP_YCRAF"].records)
-                    df_CAP["Table"] = "Generation Capacity"
-                if "XH2_CAP_YCR" in df.data.keys():
-                    df_XH2_CAP = pd.DataFrame(df.data["XH2_CAP_YCR"].records)
-                    df_XH2_CAP["Table"] = "Hydrogen Transmission Capacity"
-                if "XH2_FLOW_YCR" in df.data.keys():
-                    df_XH2_FLOW = pd.DataFrame(df.data["XH2_FLOW_YCR"].records)
-                    df_XH2_FLOW["Table"] = "Hydrogen Transmission Flow"
-                if "G_STO_YCRAF" in df.data.keys():
-                    df_PRO_STO = pd.DataFrame(df.data["G_STO_YCRAF"].records)
-                    df_PRO_STO["Table"] = "Storage"
-                # Concatenate all the dataframe together and add the model name
-                df_baseline = pd.concat([df_PRO, df_CAP, df_XH2_CAP, df_XH2_FLOW, df_PRO_STO])
-                df_baseline["Scenarios"] = 0
-                df_scenarios = pd.concat([df_scenarios, df_baseline])
+                files.append((os.path.join(os.path.abspath(self.path), self.baseline_files[i]), True, self.model_names[i])) # Path to the baseline file
+        
+        if lazy:
+            self._import_results_lazy(files, max_memory=max_memory, float32=float32)
+            return
+        if store_dir is not None:
+            self._import_results_store(files, store_dir, chunk_scenarios, verify_hash=verify_hash, workers=workers, float32=float32)
+            return
+        
+        # Read the files
+        if workers > 1:
+            frames = self._read_results_files_parallel(files, workers, verify_hash=verify_hash)
+        else:
+            frames = [self._read_results_file(file_path, baseline, verify_hash=verify_hash, model=model) for file_path, baseline, model in files]
+        
+        self._save_results_cache()
+        
+        self.import_results_frames(frames, compact=compact, float32=float32, index=index)
+        # Files already ingested, the new files are added with append_results
+        self.ingested_files = {file_path: model for file_path, baseline, model in files}
+    
+    # Import the results from DataFrames already read (as returned by read_results_file or results_from_records),
+    # given in the order of the files: the scenario file and then the baseline file of each model
+    def import_results_frames(self, frames: list[pd.DataFrame], compact: bool = False, float32: bool = False, index: bool = True) -> None:
+        
+        files_per_model = 2 if len(self.baseline_files) != 0 else 1
+        if len(frames) != files_per_model * len(self.scenario_files):
+            raise ValueError("The number of DataFrames should be the number of scenario and baseline files.")
+        
+        # Creating the data dictionnary
+        dict_results = {}
+        
+        for i in range(len(self.scenario_files)):
+            # Concatenate the scenario data and the baseline data if any
+            model_frames = frames[i*files_per_model:(i+1)*files_per_model]
+            with self.profiler.stage("concat", model=self.model_names[i]) as stage:
+                if compact:
+                    # Split each file by table before concatenating, to never build the padded DataFrame of the model
+                    model_frames = [split_results_tables(df) for df in model_frames]
+                    df_scenarios = {Table: pd.concat([tables[Table] for tables in model_frames if Table in tables])
+                                    for Table in results_tables if any(Table in tables for tables in model_frames)}
+                    stage.rows = sum(len(df) for df in df_scenarios.values())
+                else:
+                    df_scenarios = pd.concat(model_frames) if len(model_frames) > 1 else model_frames[0]
+                    stage.rows = len(df_scenarios)
                 
             # Add the dataframe to the output dictionary
             dict_results[f"{self.model_names[i]}"] = df_scenarios
         
         self.dict_results = dict_results
-        print("Data imported successfully")
+        self.ingested_files = {}
+        # Scenario ids of each model, used to check that the appended files bring new scenarios
+        self.results_scenarios = {model: results_scenario_ids(df) for model, df in dict_results.items()}
+        # The convergence statistics, the queries and the structures built from previous results are not valid anymore
+        self.convergence = {}
+        self._clear_query_cache()
+        self._clear_derived_results()
+        log_event("Data imported successfully", "import_results", models=list(dict_results.keys()))
+        
+        if compact:
+            self.compact_results(float32=float32)
+        if index:
+            self.build_results_index()
+    
+    # Read the files and write them to the results store one after the other (or by groups of workers files), so that only the files
+    # being read are in memory. The models are written again from scratch.
+    def _import_results_store(self, files: list[tuple[str, bool, str]], store_dir: str, chunk_scenarios: int = 1000,
+                              verify_hash: bool = False, workers: int = 1, float32: bool = False) -> None:
+        
+        self.results_store = ResultsStore(store_dir, chunk_scenarios=chunk_scenarios)
+        for model in dict.fromkeys(model for _, _, model in files):
+            self.results_store.remove_model(model)
         
-    def import_input_data(self) -> None:
+        step = max(workers, 1)
+        for start in range(0, len(files), step):
+            group = files[start:start+step]
+            if workers > 1:
+                frames = self._read_results_files_parallel(group, workers, verify_hash=verify_hash)
+            else:
+                frames = [self._read_results_file(file_path, baseline, verify_hash=verify_hash, model=model) for file_path, baseline, model in group]
+            for (file_path, baseline, model), df in zip(group, frames):
+                with self.profiler.stage("store_write", model=model) as stage:
+                    self.results_store.write(model, split_results_tables(df), float32=float32)
+                    stage.rows = len(df)
+            del frames
+        self._save_results_cache()
+        
+        self._attach_results_store([model for _, _, model in files])
+        self.ingested_files = {file_path: model for file_path, baseline, model in files}
+    
+    # Results read lazily from the files, table by table (see LazyModel). The tables of all the models share the same memory budget.
+    # The results cache is not used, as a table is read from one symbol of the files and not from the whole files.
+    def _import_results_lazy(self, files: list[tuple[str, bool, str]], max_memory: float = None, float32: bool = False) -> None:
+        
+        self.results_tables_cache = TableCache(max_memory=max_memory)
+        dict_results = {}
+        for model in dict.fromkeys(model for _, _, model in files):
+            model_files = [(file_path, baseline) for file_path, baseline, other in files if other == model]
+            load = lambda Table, model=model, model_files=model_files: read_results_table(model_files, Table, float32=float32,
+                                                                                           profiler=self.profiler, model=model)
+            dict_results[model] = LazyModel(self.results_tables_cache, model, load, scenario_table="Generation Capacity")
+        
+        self.dict_results = dict_results
+        # The scenario ids of the models are read when they are first needed (see _model_scenarios)
+        self.results_scenarios = {}
+        self.convergence = {}
+        self._clear_query_cache()
+        self._clear_derived_results()
+        self.ingested_files = {file_path: model for file_path, baseline, model in files}
+        log_event("Data imported successfully", "import_results", models=list(dict_results.keys()), lazy=True)
+    
+    # Use the results of a store written by a previous import_results, without reading the GDX files again
+    # The models of the class which are in the store are used, or all the models of the store if the class has no model names
+    def open_results_store(self, store_dir: str, read_only: bool = False) -> None:
+        
+        if not os.path.exists(os.path.join(store_dir, "store_manifest.json")):
+            raise ValueError(f"There is no results store in {store_dir}.")
+        self.results_store = ResultsStore(store_dir, read_only=read_only)
+        models = [model for model in self.model_names if model in self.results_store.models()] if len(self.model_names) != 0 else self.results_store.models()
+        if len(models) == 0:
+            raise ValueError("None of the models is in the results store.")
+        self._attach_results_store(models)
+        self.ingested_files = {}
+    
+    # Publish the results and the input data once for worker processes: the results are written to a results store (if they are not
+    # already in one) in a shared directory, in shared memory by default (/dev/shm), and the sample and the design matrices are saved
+    # as numpy files. The returned handle is small and picklable, the workers attach to it with MainResults_GSA.from_shared.
+    def publish_shared(self, shared_dir: str = None, chunk_scenarios: int = 1000) -> dict:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        if shared_dir is None:
+            root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            shared_dir = os.path.join(root, f"gsa_{uuid.uuid4().hex}")
+        shared_dir = os.path.abspath(shared_dir)
+        os.makedirs(shared_dir, exist_ok=True)
+        
+        # Results, the models already in a store are not copied
+        stored = all(isinstance(df, StoredModel) for df in self.dict_results.values())
+        if stored:
+            store_dir = self.results_store.store_dir
+        else:
+            store_dir = os.path.join(shared_dir, "results")
+            store = ResultsStore(store_dir, chunk_scenarios=chunk_scenarios)
+            for model, df in self.dict_results.items():
+                with self.profiler.stage("store_write", model=model):
+                    store.remove_model(model)
+                    if isinstance(df, LazyModel):
+                        df = {Table: df.table(Table) for Table in results_tables}
+                    store.write(model, {Table: results_frame(table) for Table, table in df.items()} if isinstance(df, dict)
+                                else split_results_tables(results_frame(df)))
+        
+        handle = {"path": self.path, "scenario_files": list(self.scenario_files), "baseline_files": list(self.baseline_files),
+                  "model_names": list(self.dict_results.keys()), "shared_dir": shared_dir, "store_dir": store_dir}
+        
+        # Input data, the baseline input data is small and saved as parquet files
+        if hasattr(self, "baseline_input_data"):
+            np.save(os.path.join(shared_dir, "sample.npy"), self.df_scenarios_sample[Parameters_names].to_numpy(dtype=np.float64))
+            handle["design_matrix"] = {}
+            for YEAR, design_matrix in self.design_matrix.items():
+                file = os.path.join(shared_dir, f"design_matrix_{len(handle['design_matrix'])}.npy")
+                np.save(file, design_matrix)
+                handle["design_matrix"][YEAR] = file
+            handle["input_data"] = {}
+            for symbol, df in self.baseline_input_data.items():
+                file = os.path.join(shared_dir, f"input_{symbol}.parquet")
+                df.to_parquet(file)
+                handle["input_data"][symbol] = file
+        
+        self.shared_handle = handle
+        self.shared_owner = True
+        log_event(f"Results published in {shared_dir}", "publish_shared", **handle)
+        return handle
+    
+    # Attach to results published with publish_shared, read only and without copying the results: the partitions of the store and the
+    # numpy files are memory-mapped, so the cost of attaching does not depend on the size of the results
+    @classmethod
+    def from_shared(cls, handle: dict) -> "MainResults_GSA":
+        
+        results = cls(handle["path"], handle["scenario_files"], handle["baseline_files"], handle["model_names"])
+        results.open_results_store(handle["store_dir"], read_only=True)
+        if "input_data" in handle:
+            results.baseline_input_data = {symbol: pd.read_parquet(file) for symbol, file in handle["input_data"].items()}
+            results.df_scenarios_sample = pd.DataFrame(np.load(os.path.join(handle["shared_dir"], "sample.npy"), mmap_mode='r'), columns=Parameters_names, copy=False)
+            results.design_matrix = {YEAR: np.load(file, mmap_mode='r') for YEAR, file in handle["design_matrix"].items()}
+            results.input_data_baseline = {}
+        results.shared_handle = handle
+        return results
+    
+    # Remove the files published with publish_shared, once the workers are done
+    def release_shared(self) -> None:
+        
+        if not hasattr(self, "shared_handle"):
+            raise ValueError("The results have not been published. Please use the publish_shared() function.")
+        if not getattr(self, "shared_owner", False):
+            raise ValueError("The shared results can only be released by the process which published them.")
+        shutil.rmtree(self.shared_handle["shared_dir"], ignore_errors=True)
+        del self.shared_handle, self.shared_owner
+    
+    def _attach_results_store(self, models: list[str]) -> None:
+        
+        self.dict_results = {model: self.results_store.model(model) for model in dict.fromkeys(models)}
+        self.results_scenarios = {model: results_scenario_ids(df) for model, df in self.dict_results.items()}
+        self.convergence = {}
+        self._clear_query_cache()
+        self._clear_derived_results()
+        log_event("Data imported successfully", "import_results", models=list(self.dict_results.keys()), store=self.results_store.store_dir)
+    
+    # Remove the index, the cubes and the networks built from previous results
+    def _clear_derived_results(self) -> None:
+        
+        for attribute in ["results_index", "results_cube", "results_rollup", "h2_networks"]:
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+    
+    # Scenario ids of a model, read on first use for the lazy models
+    def _model_scenarios(self, model: str) -> np.ndarray:
+        
+        if model not in self.results_scenarios:
+            self.results_scenarios[model] = results_scenario_ids(self.dict_results[model])
+        return self.results_scenarios[model]
+    
+    # Convert the results to a compact representation: one tidy table per symbol for each model, without the padding columns,
+    # categorical dimensions sharing the same categories across all models, the smallest integer type for the scenario ids
+    # and optionally float32 values
+    @profiled("compact_results")
+    def compact_results(self, float32: bool = False) -> None:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        if any(isinstance(df, StoredModel) for df in self.dict_results.values()):
+            raise ValueError("The results are in a results store, they are already stored by table with categorical columns.")
+        if any(isinstance(df, LazyModel) for df in self.dict_results.values()):
+            raise ValueError("The results are read lazily, the tables are already read by table with categorical columns.")
+        
+        memory_before = self.results_memory_usage()
+        
+        # Split the padded DataFrames by table, the appended batches are concatenated first
+        for model, df in self.dict_results.items():
+            if not isinstance(df, dict):
+                self.dict_results[model] = split_results_tables(results_frame(df))
+            else:
+                self.dict_results[model] = {Table: results_frame(table) for Table, table in df.items()}
+        
+        # Shared categories for each dimension across all the models
+        categories = {}
+        max_scenario = 0
+        for tables in self.dict_results.values():
+            for df in tables.values():
+                for column in df.columns:
+                    if column not in ['Scenarios', 'value']:
+                        categories.setdefault(column, set()).update(df[column].dropna().unique())
+                if len(df) != 0:
+                    max_scenario = max(max_scenario, int(df['Scenarios'].max()))
+        self.results_categories = {column: pd.CategoricalDtype(sorted(values, key=str)) for column, values in categories.items()}
+        self.results_dtypes = {"Scenarios": np.int16 if max_scenario <= np.iinfo(np.int16).max else np.int32,
+                               "value": np.float32 if float32 else np.float64}
+        
+        # Convert the columns
+        for tables in self.dict_results.values():
+            for Table, df in tables.items():
+                tables[Table] = self._compact_table(df)
+        
+        memory_after = self.results_memory_usage()
+        self.memory_report = {"before": memory_before, "after": memory_after}
+        log_event(f"Results compacted from {memory_before/1e6:.1f} MB to {memory_after/1e6:.1f} MB", "compact_results", **self.memory_report)
+        
+        # The positions of the rows have changed, the index needs to be rebuilt
+        if hasattr(self, "results_index"):
+            self.build_results_index()
+    
+    # Convert a table to the categories and dtypes of the compact representation
+    def _compact_table(self, df: pd.DataFrame) -> pd.DataFrame:
+        
+        df = df.astype({column: self.results_categories[column] for column in df.columns if column in self.results_categories})
+        df['Scenarios'] = df['Scenarios'].astype(self.results_dtypes["Scenarios"])
+        df['value'] = df['value'].astype(self.results_dtypes["value"])
+        return df
+    
+    # Build the index of the results: for each model, the positions of the rows of each (Table, Year, Country) group,
+    # split by (Commodity, Tech type). The positions refer to the padded DataFrame of the model, or to the table in the compact representation.
+    @profiled("build_results_index")
+    def build_results_index(self) -> None:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        
+        self.results_index = {}
+        for model, df in self.dict_results.items():
+            # The results in a store are read partition by partition, and the lazy results table by table, without index
+            if isinstance(df, (StoredModel, LazyModel)):
+                continue
+            tables = [(Table, results_frame(table)) for Table, table in df.items()] if isinstance(df, dict) else [(None, results_frame(df))]
+            model_index = {}
+            with self.profiler.stage("index_rows", model=model) as stage:
+                for Table, df_table in tables:
+                    model_index.update(index_results_rows(df_table, Table))
+                stage.rows = sum(len(df_table) for _, df_table in tables)
+            self.results_index[model] = model_index
+    
+    # Memory used by the results in bytes
+    def results_memory_usage(self) -> int:
+        
+        # The tables of the lazy models in memory
+        memory = self.results_tables_cache.memory() if any(isinstance(df, LazyModel) for df in self.dict_results.values()) else 0
+        for df in self.dict_results.values():
+            if isinstance(df, (StoredModel, LazyModel)):
+                continue
+            tables = df.values() if isinstance(df, dict) else [df]
+            memory += sum(int(table.memory_usage(deep=True).sum()) for table in tables)
+        return memory
+    
+    # Return the rows of a table for a model, for the selected countries and year
+    # The index is used when it is available, otherwise the table is filtered
+    def _select_rows(self, model: str, selection: str, Countries: list[str], YEAR: int) -> pd.DataFrame:
+        
+        Table, commodities, tech_types = results_selections_filters[selection]
+        if not hasattr(self, "results_index") or model not in self.results_index:
+            df = self._results_table(model, Table)
+            df = df[df["C"].isin(Countries)]
+            # The years are compared as strings, as in the index, the cubes and the store
+            df = df[df["Y"].astype(str) == str(YEAR)]
+            return df
+        
+        # Gather the positions of the groups matching the selection
+        model_index = self.results_index[model]
+        positions = []
+        for country in dict.fromkeys(Countries):
+            for (commodity, tech_type), rows in model_index.get((Table, str(YEAR), country), {}).items():
+                if (commodities is None or commodity in commodities) and (tech_types is None or tech_type in tech_types):
+                    # The positions of the appended rows are kept as one array per append (see merge_results_index)
+                    positions.extend(rows if isinstance(rows, list) else [rows])
+        # Keep the order of the rows of the DataFrame
+        positions = np.sort(np.concatenate(positions)) if len(positions) != 0 else np.array([], dtype=np.int64)
+        
+        df = self.dict_results[model]
+        if isinstance(df, dict):
+            if Table not in df:
+                return pd.DataFrame(columns=results_tables[Table])
+            df = df[Table]
+        if isinstance(df, ChunkedTable):
+            return df.take(positions)
+        return df.iloc[positions]
+    
+    # Return the rows of a table for a model, for both the padded and the compact representation of the results
+    def _results_table(self, model: str, Table: str) -> pd.DataFrame:
+        
+        df = self.dict_results[model]
+        if isinstance(df, StoredModel):
+            df = df.table(Table)
+            return df if df is not None else pd.DataFrame(columns=results_tables[Table])
+        if isinstance(df, LazyModel):
+            return df.table(Table)
+        if isinstance(df, dict):
+            if Table not in df:
+                return pd.DataFrame(columns=results_tables[Table])
+            return results_frame(df[Table])
+        df = results_frame(df)
+        return df[df["Table"] == Table]
+    
+    # Functions returning the rows of a table for each part of the scenarios of a model, to build the cubes of a model part by part
+    # The results in a store are read chunk by chunk (see StoredModel.chunks), with only the tables of one chunk in memory. The chunks
+    # hold different scenarios, so the cube of each chunk is final. The other results are read in one part.
+    def _results_parts(self, model: str):
+        
+        df = self.dict_results[model]
+        if not isinstance(df, StoredModel) or len(df.chunks()) == 0:
+            yield lambda Table: self._results_table(model, Table)
+            return
+        for chunk in df.chunks():
+            tables = {}
+            for Table in results_tables:
+                frames = list(df.scan(Table, chunk=chunk))
+                tables[Table] = pd.concat(frames, ignore_index=True) if len(frames) != 0 else pd.DataFrame(columns=results_tables[Table])
+            yield lambda Table, tables=tables: tables[Table]
+    
+    # Function returning the partitions of a table of a model: the partitions of the results store, or the whole table for the other results
+    def _table_partitions(self, model: str, Table: str):
+        
+        df = self.dict_results[model]
+        if isinstance(df, StoredModel):
+            return lambda: df.scan(Table)
+        return lambda: [self._results_table(model, Table)]
+    
+    # Read the files with a pool of processes, the cached files are loaded directly and only the other ones are sent to the pool
+    def _read_results_files_parallel(self, files: list[tuple[str, bool, str]], workers: int, verify_hash: bool = False) -> list[pd.DataFrame]:
+        
+        frames = [None] * len(files)
+        if hasattr(self, "results_cache"):
+            for j, (file_path, baseline, model) in enumerate(files):
+                with self.profiler.stage("cache_load", model=model):
+                    frames[j] = self.results_cache.load(file_path, baseline, verify_hash=verify_hash)
+        to_read = [j for j in range(len(files)) if frames[j] is None]
+        
+        if len(to_read) != 0:
+            with ProcessPoolExecutor(max_workers=min(workers, len(to_read))) as executor:
+                if self.profiler.enabled:
+                    # The stages are measured in the workers and sent back with the DataFrames
+                    read_frames = executor.map(read_results_file_profiled, [files[j][0] for j in to_read], [files[j][1] for j in to_read],
+                                               [files[j][2] for j in to_read], [self.profiler.track_memory] * len(to_read))
+                else:
+                    read_frames = executor.map(read_results_file, [files[j][0] for j in to_read], [files[j][1] for j in to_read])
+                # The order of the results is the order of the files, so the merge is the same as the serial one
+                for j, df in zip(to_read, read_frames):
+                    if self.profiler.enabled:
+                        df, records = df
+                        self.profiler.extend(records)
+                    frames[j] = df
+                    if hasattr(self, "results_cache"):
+                        self.results_cache.store(files[j][0], df, files[j][1])
+        
+        return frames
+    
+    # Read one scenario or baseline file, from the cache if it is available and unchanged
+    def _read_results_file(self, file_path: str, baseline: bool, verify_hash: bool = False, model: str = None) -> pd.DataFrame:
+        
+        if not hasattr(self, "results_cache"):
+            return read_results_file(file_path, baseline, profiler=self.profiler, model=model)
+        
+        with self.profiler.stage("cache_load", model=model):
+            df = self.results_cache.load(file_path, baseline, verify_hash=verify_hash)
+        if df is None:
+            df = read_results_file(file_path, baseline, profiler=self.profiler, model=model)
+            self.results_cache.store(file_path, df, baseline)
+        return df
+    
+    # Write the index of the results cache once all the files are read, the cache hits are not written one by one
+    def _save_results_cache(self) -> None:
+        
+        if hasattr(self, "results_cache"):
+            self.results_cache.save_index()
+    
+    # Remove some files from the results cache, or the whole cache if no file is given
+    def clear_results_cache(self, files: list[str] = None) -> None:
+        
+        if not hasattr(self, "results_cache"):
+            raise ValueError("No results cache is used. Please give a cache directory to the import_results() function.")
+        if files is not None:
+            files = [os.path.join(os.path.abspath(self.path), file) for file in files]
+        self.results_cache.invalidate(files)
+    
+    # Append new scenario files to the imported results: new batches of scenarios of the existing models, or new models
+    # models gives the model of each scenario file (one model for all the files if it is a string). The baseline file of a new model
+    # is given in baseline_files, as {model: file}, and is needed if the other models have a baseline.
+    # Only the new files are read (from the cache if any), the files already ingested are skipped. Returns the appended files.
+    def append_results(self, scenario_files: list[str], models: Union[str, list[str]], baseline_files: dict[str, str] = {},
+                       verify_hash: bool = False, workers: int = 1) -> list[str]:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        if type(models) == str:
+            models = [models] * len(scenario_files)
+        if len(models) != len(scenario_files):
+            raise ValueError("The number of models should be the same as the number of scenario files.")
+        
+        # List the new files, with the baseline file of the new models
+        files = []
+        new_models = []
+        for scenarios, model in zip(scenario_files, models):
+            file_path = os.path.join(os.path.abspath(self.path), scenarios)
+            if file_path in self.ingested_files or any(file_path == other for other, _, _ in files):
+                log_event(f"The file {scenarios} has already been ingested", "append_results", file=scenarios, model=model)
+                continue
+            if model not in self.dict_results and model not in new_models:
+                new_models.append(model)
+                if model in baseline_files:
+                    files.append((os.path.join(os.path.abspath(self.path), baseline_files[model]), True, model))
+                elif len(self.baseline_files) != 0:
+                    raise ValueError(f"The baseline file of the new model {model} should be given, as the other models have a baseline.")
+            files.append((file_path, False, model))
+        if len(files) == 0:
+            return []
+        
+        # Read the new files
+        if workers > 1:
+            frames = self._read_results_files_parallel(files, workers, verify_hash=verify_hash)
+        else:
+            frames = [self._read_results_file(file_path, baseline, verify_hash=verify_hash, model=model) for file_path, baseline, model in files]
+        self._save_results_cache()
+        
+        self.append_results_frames(frames, [model for _, _, model in files])
+        
+        # Register the new files and models. The first scenario file of a new model becomes its scenario file for import_results.
+        for file_path, baseline, model in files:
+            self.ingested_files[file_path] = model
+        for model in new_models:
+            self.model_names = self.model_names + [model]
+            self.scenario_files = self.scenario_files + [os.path.relpath([file_path for file_path, baseline, other in files if other == model and not baseline][0], os.path.abspath(self.path))]
+            if model in baseline_files:
+                self.baseline_files = self.baseline_files + [baseline_files[model]]
+        self.nb_models = len(self.model_names)
+        
+        appended = [os.path.relpath(file_path, os.path.abspath(self.path)) for file_path, baseline, model in files if not baseline]
+        log_event(f"{len(appended)} files appended to the results", "append_results", files=appended, models=list(dict.fromkeys(models)))
+        return appended
+    
+    # Append the files of a directory matching a pattern for each model ({model: pattern}, glob patterns relative to the path)
+    # which have not been ingested yet, see append_results
+    def scan_results(self, patterns: dict[str, str], baseline_files: dict[str, str] = {}, verify_hash: bool = False, workers: int = 1) -> list[str]:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        
+        path = os.path.abspath(self.path)
+        excluded = set(self.ingested_files) | {os.path.join(path, file) for file in self.baseline_files} | {os.path.join(path, file) for file in baseline_files.values()}
+        scenario_files, models = [], []
+        for model, pattern in patterns.items():
+            for file_path in sorted(glob.glob(os.path.join(path, pattern))):
+                if file_path not in excluded:
+                    scenario_files.append(os.path.relpath(file_path, path))
+                    models.append(model)
+        
+        return self.append_results(scenario_files, models, baseline_files=baseline_files, verify_hash=verify_hash, workers=workers)
+    
+    # Append DataFrames already read (as returned by read_results_file or results_from_records) to the results, models gives the model of each DataFrame
+    # The rows of the existing models are kept: the new rows are added as a new batch at the end of their tables (see ChunkedTable), so that
+    # the index is extended with the positions of the new rows only, and the cube of the model (if any) is extended with the new scenarios.
+    # The cost of an append depends on the new rows, the existing rows are neither copied nor converted.
+    # For results in a results store, the new rows are written in new partitions of the store
+    def append_results_frames(self, frames: list[pd.DataFrame], models: list[str]) -> None:
+        
+        if len(frames) != len(models):
+            raise ValueError("The number of DataFrames should be the same as the number of models.")
+        if any(isinstance(df, LazyModel) for df in self.dict_results.values()):
+            raise ValueError("The results are read lazily, please import the results again with the new files.")
+        compact = isinstance(next(iter(self.dict_results.values())), dict)
+        stored = all(isinstance(df, StoredModel) for df in self.dict_results.values())
+        self._clear_query_cache()
+        
+        for model in dict.fromkeys(models):
+            model_frames = [df for df, other in zip(frames, models) if other == model]
+            # The H2 network of the model is built again with the new scenarios when needed
+            getattr(self, "h2_networks", {}).pop(model, None)
+            
+            # The scenarios of the new files should not be in the results already
+            scenarios = results_scenario_ids(pd.concat([df[['Scenarios']] for df in model_frames]))
+            if model in self.results_scenarios and np.isin(scenarios, self.results_scenarios[model]).any():
+                raise ValueError(f"Some scenarios of the new files are already in the results of {model}.")
+            
+            if stored:
+                new_results = [split_results_tables(df) for df in model_frames]
+                with self.profiler.stage("store_write", model=model) as stage:
+                    for tables in new_results:
+                        self.results_store.write(model, tables)
+                    stage.rows = sum(len(df) for df in model_frames)
+                new_results = {Table: pd.concat([tables[Table] for tables in new_results if Table in tables])
+                               for Table in results_tables if any(Table in tables for tables in new_results)}
+                self.dict_results[model] = self.results_store.model(model)
+                self.results_scenarios[model] = self.dict_results[model].scenarios()
+                table = lambda Table: new_results[Table] if Table in new_results else pd.DataFrame(columns=results_tables[Table])
+                self._extend_cubes(model, table)
+                self._update_convergence(model, table, scenarios)
+                continue
+            
+            with self.profiler.stage("concat", model=model) as stage:
+                if compact:
+                    model_frames = [split_results_tables(df) for df in model_frames]
+                    new_results = {Table: pd.concat([tables[Table] for tables in model_frames if Table in tables])
+                                   for Table in results_tables if any(Table in tables for tables in model_frames)}
+                    new_results = self._compact_new_tables(new_results)
+                    stage.rows = sum(len(df) for df in new_results.values())
+                else:
+                    new_results = pd.concat(model_frames) if len(model_frames) > 1 else model_frames[0]
+                    stage.rows = len(new_results)
+            
+            # Positions of the first new row of each table
+            if model not in self.dict_results:
+                self.dict_results[model] = new_results
+                offsets = {Table: 0 for Table in new_results} if compact else 0
+            elif compact:
+                tables = self.dict_results[model]
+                offsets = {Table: len(tables.get(Table, [])) for Table in new_results}
+                for Table, df in new_results.items():
+                    if Table not in tables:
+                        tables[Table] = df
+                        continue
+                    if not isinstance(tables[Table], ChunkedTable):
+                        tables[Table] = ChunkedTable([tables[Table]], align_dtypes=True)
+                    tables[Table].append(df)
+            else:
+                offsets = len(self.dict_results[model])
+                if not isinstance(self.dict_results[model], ChunkedTable):
+                    self.dict_results[model] = ChunkedTable([self.dict_results[model]])
+                self.dict_results[model].append(new_results)
+            self.results_scenarios[model] = np.union1d(self.results_scenarios.get(model, np.array([], dtype=np.int64)), scenarios)
+            
+            # Extend the index with the new rows
+            if hasattr(self, "results_index"):
+                model_index = self.results_index.setdefault(model, {})
+                with self.profiler.stage("index_rows", model=model) as stage:
+                    if compact:
+                        for Table, df in new_results.items():
+                            merge_results_index(model_index, index_results_rows(df, Table), offsets[Table])
+                    else:
+                        merge_results_index(model_index, index_results_rows(new_results, None), offsets)
+                    stage.rows = sum(len(df) for df in new_results.values()) if compact else len(new_results)
+            
+            # Rows of a table in the new results
+            if compact:
+                table = lambda Table: new_results[Table] if Table in new_results else pd.DataFrame(columns=results_tables[Table])
+            else:
+                table = lambda Table: new_results[new_results["Table"] == Table]
+            
+            self._extend_cubes(model, table)
+            self._update_convergence(model, table, scenarios)
+    
+    # Extend the cube and the roll-up of a model (if built) with the new scenarios, for the years of the cube
+    # table returns the new rows of a table. The cubes grow in place along the scenarios (see append_cube).
+    def _extend_cubes(self, model: str, table) -> None:
+        
+        if not hasattr(self, "results_cube") or model not in self.results_cube:
+            return
+        cube = self.results_cube[model]
+        years, dtype = cube["results"].coords["Y"], cube["results"].values.dtype
+        if hasattr(self, "results_rollup") and model in self.results_rollup:
+            rollup = self.results_rollup[model]
+            new_rollup = results_rollup_from_tables(table, self.geography_groups, years=years, dtype=dtype)
+            self.results_cube[model] = {kind: append_cube(cube[kind], new_rollup["countries"][kind]) for kind in cube}
+            self.results_rollup[model] = {level: {kind: append_cube(rollup[level][kind], new_rollup[level][kind]) for kind in rollup[level]}
+                                          for level in rollup}
+        else:
+            new_cube = results_cube_from_tables(table, years=years, dtype=dtype)
+            self.results_cube[model] = {kind: append_cube(cube[kind], new_cube[kind]) for kind in cube}
+    
+    # Update the convergence statistics of a model (if tracked) with new scenarios, one after the other
+    # table returns the new rows of a table, which are only used to compute the outputs of the new scenarios
+    def _update_convergence(self, model: str, table, scenarios: np.ndarray) -> None:
+        
+        if model not in self.convergence:
+            return
+        monitor = self.convergence[model]
+        new_cube = results_cube_from_tables(table, years=monitor.outputs['YEAR'].unique())
+        new_scenarios = scenarios[scenarios != 0]
+        with self.profiler.stage("convergence_update", model=model) as stage:
+            monitor.update_many(convergence_values(lambda selection, Countries, YEAR: results_from_cube(new_cube, selection, Countries, YEAR),
+                                                   monitor.outputs, self.convergence_groups[model], new_scenarios))
+            stage.rows = len(new_scenarios)
+    
+    # Convert new tables to the compact representation, the categories and the dtype of the scenarios are extended if needed
+    # The existing tables keep their dtypes: their rows are converted to the extended dtypes when they are taken with the new rows
+    def _compact_new_tables(self, new_tables: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+        
+        # New categories of each dimension, added at the end of the categories so that the existing codes are kept
+        new_categories = {}
+        max_scenario = 0
+        for df in new_tables.values():
+            for column in df.columns:
+                if column not in ['Scenarios', 'value']:
+                    known = self.results_categories[column].categories if column in self.results_categories else []
+                    values = set(df[column].dropna().unique()) - set(known)
+                    if len(values) != 0:
+                        new_categories.setdefault(column, set()).update(values)
+            if len(df) != 0:
+                max_scenario = max(max_scenario, int(df['Scenarios'].max()))
+        scenarios_dtype = self.results_dtypes["Scenarios"]
+        if max_scenario > np.iinfo(scenarios_dtype).max:
+            scenarios_dtype = np.int32
+        
+        for column, values in new_categories.items():
+            known = list(self.results_categories[column].categories) if column in self.results_categories else []
+            self.results_categories[column] = pd.CategoricalDtype(known + sorted(values, key=str))
+        self.results_dtypes["Scenarios"] = scenarios_dtype
+        
+        return {Table: self._compact_table(df) for Table, df in new_tables.items()}
+        
+    # If years are given, the design matrix of each year is built once the data is imported (see build_design_matrix)
+    def import_input_data(self, years: list[int] = None) -> None:
         
         # Check that input data files have been provided
         if not hasattr(self, "input_files"):
@@ -210,118 +907,74 @@ class MainResults_GSA:
         scenarios_sample_path = os.path.join(os.path.abspath(self.path), self.input_files[1])
         
         # Retrieve the parameters from the input data file ### Hard coded for the moment, could link it to GSA_parameters class
-        df = gt.Container(baseline_input_data_path)
-        df_CCS = pd.DataFrame(df.data["CCS_CO2CAPTEFF_G"].records)
-        df_DE = pd.DataFrame(df.data["DE"].records)
-        df_EMIPOL = pd.DataFrame(df.data["EMI_POL"].records)
-        df_FUELPRICE = pd.DataFrame(df.data["FUELPRICE"].records)
-        df_GDATA_categorical = pd.DataFrame(df.data["GDATA_categorical"].records)
-        df_GDATA_numerical = pd.DataFrame(df.data["GDATA_numerical"].records)
-        df_HYDROGEN_DH2 = pd.DataFrame(df.data["HYDROGEN_DH2"].records)
-        df_SUBTECHGROUPKPOT = pd.DataFrame(df.data["SUBTECHGROUPKPOT"].records)
-        df_XH2INVCOST = pd.DataFrame(df.data["XH2INVCOST"].records)
-        df_XINVCOST = pd.DataFrame(df.data["XINVCOST"].records)
-
-        baseline_input_data = {'CCS_CO2CAPTEFF_G': df_CCS, 'DE': df_DE, 'EMI_POL': df_EMIPOL, 'FUELPRICE': df_FUELPRICE, 'GDATA_numerical': df_GDATA_numerical, 'GDATA_categorical': df_GDATA_categorical,
-                               'HYDROGEN_DH2': df_HYDROGEN_DH2, 'SUBTECHGROUPKPOT': df_SUBTECHGROUPKPOT, 'XH2INVCOST': df_XH2INVCOST, 'XINVCOST': df_XINVCOST}
+        with self.profiler.stage("gdx_read", selection="input data") as stage:
+            df = gt.Container(baseline_input_data_path)
+            baseline_input_data = {symbol: pd.DataFrame(df.data[symbol].records) for symbol in input_data_symbols}
+            stage.rows = sum(len(records) for records in baseline_input_data.values())
 
         # Retrieve the sample data, which contains the values of each parameters in the scenarios
-        with open(scenarios_sample_path, 'r') as file:
-            sample_raw = file.read()
-        df_scenarios_sample = pd.read_csv(StringIO(sample_raw), header=None)
+        # The sample can be a csv file without header, a binary numpy file or a parquet file
+        with self.profiler.stage("sample_read", selection="sample") as stage:
+            extension = os.path.splitext(scenarios_sample_path)[1].lower()
+            if extension == ".npy":
+                df_scenarios_sample = pd.DataFrame(np.load(scenarios_sample_path))
+            elif extension == ".parquet":
+                df_scenarios_sample = pd.read_parquet(scenarios_sample_path)
+            else:
+                df_scenarios_sample = pd.read_csv(scenarios_sample_path, header=None)
+            stage.rows = len(df_scenarios_sample)
+        
+        self.import_input_data_frames(baseline_input_data, df_scenarios_sample, years=years)
+    
+    # Import the input data from DataFrames already read: the symbols of the baseline input data and the sample
+    def import_input_data_frames(self, baseline_input_data: dict[str, pd.DataFrame], df_scenarios_sample: pd.DataFrame, years: list[int] = None) -> None:
+        
         df_scenarios_sample.columns = Parameters_names
         
         self.baseline_input_data = baseline_input_data
         self.df_scenarios_sample = df_scenarios_sample
-        print("Input data imported successfully")    
+        # The design matrices and baseline values of a previous import are not valid anymore
+        self.design_matrix = {}
+        self.input_data_baseline = {}
+        self._clear_query_cache()
+        log_event("Input data imported successfully", "import_input_data", scenarios=len(df_scenarios_sample))
+        
+        if years is not None:
+            for YEAR in years:
+                self.build_design_matrix(YEAR)
     
-    ### ------------------------------- ###
-    ###      1.2 Extract information    ###
-    ### ------------------------------- ###
-           
-    # Extract the results of a specific information, for specific countries, on a specific year
-    def get_results(self, model: str, selection: str, Countries: list[str], YEAR: int) -> pd.DataFrame:
+    # Build the design matrix of a year: the value of each parameter in each scenario, in physical units
+    # The row i is the scenario i, with the baseline in the row 0, and the columns are given by design_matrix_columns
+    # The parameters of the sample which are not input data selections are kept as sampled, with 1 for the baseline
+    @profiled("build_design_matrix", rows=len)
+    def build_design_matrix(self, YEAR: int) -> np.ndarray:
         
         # Check that the data has been imported
-        if not hasattr(self, "dict_results"):
-            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
-        # Check that the selection is correct
-        if selection not in results_selections:
-            raise ValueError("The selection is not correct.")
-        
-        # identify the table needed
-        if selection in ["Elec RE Capacity","Elec PV Capacity", "Elec ONSHORE Capacity", "Elec OFFSHORE Capacity",
-                         "H2 Green Capacity", "H2 Blue Capacity", "H2 Import Capacity"] :
-            Table = "Generation Capacity"
-        if selection in ["Elec RE Production","Elec PV Production", "Elec ONSHORE Production", "Elec OFFSHORE Production",
-                         "H2 Green Production", "H2 Blue Production", "H2 Import Production"] :
-            Table = "Generation Production"
-        if selection == "H2 Storage" :
-            Table = "Storage"
-        if selection == "H2 Transmission Capacity" :
-            Table = "Hydrogen Transmission Capacity"
-        if selection == "H2 Transmission Flow" :
-            Table = "Hydrogen Transmission Flow"
-            
-        # Get the data for the correct model, the selected countries, the correct year and the correct table
-        df = self.dict_results[model]
-        df = df[df["Table"] == Table]
-        df = df[df["C"].isin(Countries)]
-        df = df[df["Y"] == YEAR]
-        
-        # Filter and transform the data as needed
-        # Commodity filtering
-        if selection in ["Elec RE Capacity","Elec PV Capacity", "Elec ONSHORE Capacity", "Elec OFFSHORE Capacity",
-                         "Elec RE Production","Elec PV Production", "Elec ONSHORE Production", "Elec OFFSHORE Production"]:
-            df = df[df['COMMODITY']=='ELECTRICITY']
-        elif selection in ["H2 Green Capacity", "H2 Blue Capacity", "H2 Green Production", "H2 Blue Production"]:
-            df = df[(df['COMMODITY']=='HYDROGEN') & (df['FFF'] != 'IMPORT_H2') & (df['TECH_TYPE'] != 'H2-STORAGE')]
-        elif selection in ["H2 Import Capacity", "H2 Import Production"]:
-            df = df[(df['COMMODITY']=='HYDROGEN') & (df['FFF'] == 'IMPORT_H2')]
-        elif selection in ["H2 Storage"]:
-            df = df[(df['COMMODITY']=='HYDROGEN')]
-        
-        # Tech type filtering
-        if selection in ["Elec RE Capacity","Elec RE Production"]:
-            df = df[df['TECH_TYPE'].isin(['WIND-ON', 'WIND-OFF', 'SOLAR-PV'])]
-        elif selection in ["Elec PV Capacity", "Elec PV Production"]:
-            df = df[(df['TECH_TYPE']=='SOLAR-PV')]
-        elif selection in ["Elec ONSHORE Capacity", "Elec ONSHORE Production"]:
-            df = df[(df['TECH_TYPE']=='WIND-ON')]
-        elif selection in ["Elec OFFSHORE Capacity", "Elec OFFSHORE Production"]:
-            df = df[(df['TECH_TYPE']=='WIND-OFF')]
-        if selection in ["H2 Green Capacity", "H2 Green Production"]:
-            df[(df['TECH_TYPE']=='ELECTROLYZER')]
-        elif selection in ["H2 Blue Capacity", "H2 Blue Production"]:
-            df = df[(df['G'].str.contains('CCS')) & ((df['TECH_TYPE']=='STEAMREFORMING'))]
-        
-        # Import and export regions filtering
-        if selection in ["H2 Transmission Capacity", "H2 Transmission Flow"]:
-            df['CI'] = df['IRRRI'].map(RRR_to_CCC)
-            df = df[~df["CI"].isin(Countries)]
-            
-        # Transformation of units if needed
-        if selection == "H2 Storage":
-            df['value'] = df['value'] / 1000
+        if not hasattr(self, "baseline_input_data"):
+            raise ValueError("The input data have not been imported yet. Please use the import_input_data() function.")
         
-        if selection in ["Elec RE Capacity","Elec PV Capacity", "Elec ONSHORE Capacity", "Elec OFFSHORE Capacity",
-                         "Elec RE Production","Elec PV Production", "Elec ONSHORE Production", "Elec OFFSHORE Production",
-                         "H2 Green Capacity", "H2 Blue Capacity", "H2 Green Production", "H2 Blue Production", "H2 Import Capacity", "H2 Import Production", "H2 Storage"]:
-            df = df.groupby('Scenarios')['value'].sum().reset_index()
-        elif selection in ["H2 Transmission Capacity", "H2 Transmission Flow"]:
-            df = df.groupby(['Scenarios', 'CI'])['value'].sum().reset_index()
+        nb_scenarios = len(self.df_scenarios_sample)
+        design_matrix = np.empty((nb_scenarios + 1, len(design_matrix_columns)))
+        for j, parameter in enumerate(design_matrix_columns):
+            if parameter in input_data_selections:
+                baseline = self._input_data_baseline(parameter, YEAR)
+            else:
+                baseline = 1
+            design_matrix[0, j] = baseline
+            if parameter in self.df_scenarios_sample.columns:
+                design_matrix[1:, j] = baseline * self.df_scenarios_sample[parameter].to_numpy()
+            else:
+                design_matrix[1:, j] = baseline
         
-        return df
+        self.design_matrix[YEAR] = design_matrix
+        return design_matrix
     
-    # Sammple the input data for a specific parameter
-    def sample_input_data(self, selection: str, Countries: list[str], YEAR: int) -> pd.DataFrame:
+    # Baseline value of an input data selection for a year, computed once
+    def _input_data_baseline(self, selection: str, YEAR: int) -> float:
         
-        # Check that the data has been imported
-        if not hasattr(self, "baseline_input_data"):
-            raise ValueError("The input data have not been imported yet. Please use the import_input_data() function.")
-        # Check that the selection is correct
-        if selection not in input_data_selections:
-            raise ValueError("The selection is not correct.")
+        key = (selection, YEAR)
+        if key in self.input_data_baseline:
+            return self.input_data_baseline[key]
         
         # Natural gas price 
         if selection == "NATGAS_P":
@@ -340,9 +993,7 @@ class MainResults_GSA:
         if selection in ["PV_LIMIT_NORTH","PV_LIMIT_SOUTH","PV_LIMIT_EAST","PV_LIMIT_WEST",
                          "ONS_LIMIT_EAST","ONS_LIMIT_WEST","ONS_LIMIT_NORTH","ONS_LIMIT_SOUTH",
                          "OFF_LIMIT_EAST","OFF_LIMIT_WEST","OFF_LIMIT_NORTH","OFF_LIMIT_SOUTH"]:
-            print("You have selected a geography dependant input data. The correct geography has been selected.")
-            Geography = input_data_geography[selection]
-            Regions = [key for key, value in RRR_to_CCC.items() if value in Geography] # To get the regions associated to the countries
+            Regions = input_data_regions[selection] # The regions associated to the countries
             df = self.baseline_input_data["SUBTECHGROUPKPOT"]
             if selection in ["PV_LIMIT_NORTH","PV_LIMIT_SOUTH","PV_LIMIT_EAST","PV_LIMIT_WEST"]:
                 df = df[(df["TECH_GROUP"]=="SOLARPV") & (df['CCCRRRAAA'].isin(Regions))]
@@ -351,32 +1002,316 @@ class MainResults_GSA:
             elif selection in ["OFF_LIMIT_EAST","OFF_LIMIT_WEST","OFF_LIMIT_NORTH","OFF_LIMIT_SOUTH"]:
                 df = df[(df["TECH_GROUP"]=="WINDTURBINE_OFFSHORE") & (df['CCCRRRAAA'].isin(Regions))]
             df_baseline = df['value'].sum() / 1000
-        else :
+        elif len(df) != 0:
             df_baseline = df.iloc[0]['value']
-        
-        # Sample the data
-        if selection in self.df_scenarios_sample.columns:
-            df = df_baseline * self.df_scenarios_sample[selection] 
         else :
-            df = pd.Series(df_baseline, index=self.df_scenarios_sample.index)
-            print("Your selection is not one of the changing parameter in the GSA. The baseline value has been used for all scenarios.")
-        df.index = df.index + 1
-        df.loc[0] = df_baseline
-        df = df.sort_index().reset_index(drop=True)
-        df = df.to_frame(name=selection)
-        df.rename(columns={selection: 'value'}, inplace=True)
-        df['Scenarios'] = df.index
+            df_baseline = np.nan # The value is not in the baseline input data, sample_input_data raises an error for this selection
+        
+        self.input_data_baseline[key] = df_baseline
+        return df_baseline
+    
+    ### ------------------------------- ###
+    ###      1.2 Extract information    ###
+    ### ------------------------------- ###
+           
+    # Extract the results of a specific information, for specific countries, on a specific year
+    # Countries can be a list of countries or the name of a group of countries (see geography_groups and define_country_group)
+    @profiled("get_results")
+    def get_results(self, model: str, selection: str, Countries: Union[list[str], str], YEAR: int) -> pd.DataFrame:
+        
+        if self.query_cache is None:
+            return self._get_results(model, selection, Countries, YEAR)
+        return self._cached_query(query_key("results", selection, Countries, YEAR, model), lambda: self._get_results(model, selection, Countries, YEAR))
+    
+    def _get_results(self, model: str, selection: str, Countries: Union[list[str], str], YEAR: int) -> pd.DataFrame:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        # Check that the selection is correct
+        if selection not in results_selections:
+            raise ValueError("The selection is not correct.")
+        
+        # A named group of countries is looked up in the geographic roll-up if it has been built for this model and year
+        group = self.country_group_name(Countries)
+        if group is not None and hasattr(self, "results_rollup") and model in self.results_rollup:
+            df = results_from_cube(self.results_rollup[model]["groups"], selection, group, YEAR, dim="G")
+            if df is not None:
+                return df
+        Countries = self.group_countries(Countries)
+        
+        # Use the results cube if it has been built for this model and year
+        if hasattr(self, "results_cube") and model in self.results_cube:
+            df = self._results_from_cube(model, selection, Countries, YEAR)
+            if df is not None:
+                return df
+        
+        # Stream over the partitions of the results store
+        if isinstance(self.dict_results[model], StoredModel):
+            return self._results_from_store(model, selection, Countries, YEAR)
+        
+        with self.profiler.stage("get_results_filter", model=model, selection=selection) as stage:
+            # Get the data for the correct model, the selected countries, the correct year and the correct table
+            df = self._select_rows(model, selection, Countries, YEAR)
+            
+            # Filter and transform the data as needed
+            df = filter_results_rows(df, selection)
+            
+            # Import and export regions filtering
+            if selection in ["H2 Transmission Capacity", "H2 Transmission Flow"]:
+                df = df[~df["CI"].isin(Countries)]
+            stage.rows = len(df)
+        
+        return aggregate_results(df, selection)
+    
+    # Get the results of a selection from the results store, the partitions are read one after the other and only the rows of the
+    # countries and the year are loaded. The partitions hold different scenarios, so the sums by scenario of the partitions are final.
+    def _results_from_store(self, model: str, selection: str, Countries: list[str], YEAR: int) -> pd.DataFrame:
+        
+        Table = results_selections_filters[selection][0]
+        frames = []
+        with self.profiler.stage("store_scan", model=model, selection=selection) as stage:
+            stage.rows = 0
+            for df in self.dict_results[model].scan(Table, Countries=Countries, YEAR=YEAR):
+                stage.rows += len(df)
+                df = filter_results_rows(df, selection)
+                if selection in ["H2 Transmission Capacity", "H2 Transmission Flow"]:
+                    df = df[~df["CI"].isin(Countries)]
+                frames.append(aggregate_results(df, selection))
+        
+        if len(frames) == 0:
+            return aggregate_results(filter_results_rows(pd.DataFrame(columns=results_tables[Table]), selection), selection)
+        df = pd.concat(frames, ignore_index=True)
+        # Same order as the sums of get_results, the importing countries of a scenario are already sorted in its partition
+        return df.sort_values('Scenarios', kind='stable', ignore_index=True)
+    
+    # Build the results cube of each model: all the selections for all the countries, years and scenarios in one pass
+    # "results" has the dimensions (Scenarios, selection, C, Y) and "transmission" the dimensions (Scenarios, selection, C, CI, Y),
+    # with C the exporting country and CI the importing country for the H2 transmission. Missing combinations are NaN.
+    # The results in a store are read chunk by chunk, and the cube of each chunk is appended to the cube of the model.
+    @profiled("build_results_cube")
+    def build_results_cube(self, models: list[str] = None, years: list = None, dtype: type = np.float64) -> None:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        if models is None:
+            models = list(self.dict_results.keys())
+        if not hasattr(self, "results_cube"):
+            self.results_cube = {}
+        
+        for model in models:
+            if model not in self.dict_results:
+                raise ValueError(f"The model {model} is not in the results.")
+            cube = None
+            for table in self._results_parts(model):
+                part = results_cube_from_tables(table, years=years, dtype=dtype)
+                cube = part if cube is None else {kind: append_cube(cube[kind], part[kind]) for kind in cube}
+            self.results_cube[model] = cube
         
+        log_event("Results cube built successfully", "build_results_cube", models=models)
+    
+    # Get the results of a selection from the results cube, in the same format as get_results
+    # Return None if the cube does not contain the year
+    def _results_from_cube(self, model: str, selection: str, Countries: list[str], YEAR: int) -> pd.DataFrame:
+        
+        return results_from_cube(self.results_cube[model], selection, Countries, YEAR)
+    
+    # Build the geographic roll-up of each model: the results of each region (RRR), each country (C) and each named group of countries
+    # for all the selections, years and scenarios. The regions are read from the tables once, the countries are the sums of their
+    # regions and the groups the sums of their countries. The cube of the countries is used as the results cube of the model.
+    # The groups have the dimensions (Scenarios, selection, G, Y) and (Scenarios, selection, G, CI, Y) for the H2 transmission, without
+    # the flows between the countries of a group, so that get_results of a named group is a lookup in the cube.
+    # The results in a store are read chunk by chunk, as for build_results_cube.
+    @profiled("build_results_rollup")
+    def build_results_rollup(self, models: list[str] = None, years: list = None, dtype: type = np.float64) -> None:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        if models is None:
+            models = list(self.dict_results.keys())
+        for attribute in ["results_cube", "results_rollup"]:
+            if not hasattr(self, attribute):
+                setattr(self, attribute, {})
+        
+        for model in models:
+            if model not in self.dict_results:
+                raise ValueError(f"The model {model} is not in the results.")
+            rollup = None
+            for table in self._results_parts(model):
+                part = results_rollup_from_tables(table, self.geography_groups, years=years, dtype=dtype)
+                rollup = part if rollup is None else {level: {kind: append_cube(rollup[level][kind], part[level][kind]) for kind in rollup[level]}
+                                                      for level in rollup}
+            self.results_cube[model] = rollup.pop("countries")
+            self.results_rollup[model] = rollup
+        
+        log_event("Results roll-up built successfully", "build_results_rollup", models=models, groups=list(self.geography_groups.keys()))
+    
+    # Add a custom group of countries, or replace a group, which can then be used by name in get_results and the plots
+    # If the roll-up has been built, the groups of each model are summed again from the cube of the countries, without reading the tables
+    def define_country_group(self, name: str, Countries: list[str]) -> None:
+        
+        if isinstance(Countries, str) or len(Countries) == 0:
+            raise ValueError("The group should be a non empty list of countries.")
+        self.geography_groups[name] = list(Countries)
+        for model in getattr(self, "results_rollup", {}):
+            self.results_rollup[model]["groups"] = results_group_cubes(self.results_cube[model], self.geography_groups)
+        self._clear_query_cache()
+    
+    # Countries of a group name, a list of countries is returned as it is and any other name is a single country
+    def group_countries(self, Countries: Union[list[str], str]) -> list[str]:
+        
+        if isinstance(Countries, str):
+            return list(self.geography_groups.get(Countries, [Countries]))
+        return Countries
+    
+    # Name of the group of some countries: the name itself or the group with the same countries, None if there is no such group
+    def country_group_name(self, Countries: Union[list[str], str]) -> str:
+        
+        if isinstance(Countries, str):
+            return Countries if Countries in self.geography_groups else None
+        members = frozenset(Countries)
+        for name, countries in self.geography_groups.items():
+            if frozenset(countries) == members:
+                return name
+        return None
+    
+    # Country groups of the plots and the analyses, the group names are replaced by their countries
+    def _country_groups(self, Countries: Union[list[str], dict, str]) -> dict[str, list[str]]:
+        
+        if isinstance(Countries, str):
+            return {Countries: self.group_countries(Countries)}
+        if isinstance(Countries, dict):
+            return {name: self.group_countries(countries) for name, countries in Countries.items()}
+        return country_groups(Countries)
+    
+    # Extract the results of a selection for some regions, from the geographic roll-up, in the same format as get_results
+    # The H2 transmission to the countries of the regions is removed
+    def get_results_regions(self, model: str, selection: str, Regions: list[str], YEAR: int) -> pd.DataFrame:
+        
+        if not hasattr(self, "results_rollup") or model not in self.results_rollup:
+            raise ValueError("The roll-up has not been built for this model. Please use the build_results_rollup() function.")
+        if selection not in results_selections:
+            raise ValueError("The selection is not correct.")
+        excluded = [RRR_to_CCC.get(region, region) for region in Regions]
+        df = results_from_cube(self.results_rollup[model]["regions"], selection, Regions, YEAR, dim="RRR", excluded=excluded)
+        if df is None:
+            raise ValueError(f"The year {YEAR} is not in the roll-up of {model}.")
         return df
+    
+    # H2 transmission network of a model: the capacities and flows as batches of sparse region x region matrices per scenario and year,
+    # for the net imports, cross-border totals of country groups, utilisation and top corridors (see H2Network). Built once per model.
+    def h2_network(self, model: str) -> H2Network:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        if model not in self.dict_results:
+            raise ValueError(f"The model {model} is not in the results.")
+        if not hasattr(self, "h2_networks"):
+            self.h2_networks = {}
+        if model not in self.h2_networks:
+            with self.profiler.stage("h2_network", model=model) as stage:
+                # The tables of a results store are read partition by partition
+                capacity = self._table_partitions(model, "Hydrogen Transmission Capacity")
+                flow = self._table_partitions(model, "Hydrogen Transmission Flow")
+                # The country of an exporting region is in the results, the importing regions are mapped with RRR_to_CCC as in get_results
+                region_countries = dict(RRR_to_CCC)
+                stage.rows = 0
+                for partitions in [capacity, flow]:
+                    for df in partitions():
+                        pairs = df[['IRRRE', 'C']].dropna().drop_duplicates()
+                        region_countries.update(zip(pairs['IRRRE'].astype(str), pairs['C'].astype(str)))
+                        stage.rows += len(df)
+                self.h2_networks[model] = H2Network(capacity, flow, region_countries, self.geography_groups)
+        return self.h2_networks[model]
+    
+    # Sammple the input data for a specific parameter
+    @profiled("sample_input_data")
+    def sample_input_data(self, selection: str, Countries: list[str], YEAR: int) -> pd.DataFrame:
+        
+        if self.query_cache is None:
+            return self._sample_input_data(selection, Countries, YEAR)
+        return self._cached_query(query_key("input", selection, Countries, YEAR), lambda: self._sample_input_data(selection, Countries, YEAR))
+    
+    def _sample_input_data(self, selection: str, Countries: list[str], YEAR: int) -> pd.DataFrame:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "baseline_input_data"):
+            raise ValueError("The input data have not been imported yet. Please use the import_input_data() function.")
+        # Check that the selection is correct
+        if selection not in input_data_selections:
+            raise ValueError("The selection is not correct.")
+        
+        if selection in ["PV_LIMIT_NORTH","PV_LIMIT_SOUTH","PV_LIMIT_EAST","PV_LIMIT_WEST",
+                         "ONS_LIMIT_EAST","ONS_LIMIT_WEST","ONS_LIMIT_NORTH","ONS_LIMIT_SOUTH",
+                         "OFF_LIMIT_EAST","OFF_LIMIT_WEST","OFF_LIMIT_NORTH","OFF_LIMIT_SOUTH"]:
+            log_event("You have selected a geography dependant input data. The correct geography has been selected.", "sample_input_data", selection=selection)
+        if selection not in self.df_scenarios_sample.columns:
+            log_event("Your selection is not one of the changing parameter in the GSA. The baseline value has been used for all scenarios.", "sample_input_data", selection=selection)
+        
+        # Sample the data from the design matrix of the year, the baseline is in the row 0
+        if YEAR not in self.design_matrix:
+            self.build_design_matrix(YEAR)
+        values = self.design_matrix[YEAR][:, design_matrix_positions[selection]]
+        if np.isnan(values[0]):
+            raise ValueError(f"The baseline value of {selection} has not been found in the input data for the year {YEAR}.")
+        df = pd.DataFrame({'value': values, 'Scenarios': np.arange(len(values))})
+        
+        return df
+
+    # Memoize the queries of get_results and sample_input_data, so that the figures sharing a query compute it once
+    # The cache is emptied when the results or the input data change. If max_size is given, only the max_size most recently
+    # used queries are kept.
+    def enable_query_cache(self, max_size: int = None) -> None:
+        
+        if max_size is not None and max_size < 1:
+            raise ValueError("The size of the query cache should be positive or None.")
+        self.query_cache_size = max_size
+        if self.query_cache is None:
+            self.query_cache = OrderedDict()
+        self._evict_queries()
+    
+    def disable_query_cache(self) -> None:
+        
+        self.query_cache = None
+    
+    def _clear_query_cache(self) -> None:
+        
+        if self.query_cache is not None:
+            self.query_cache = OrderedDict()
+    
+    # Result of a query from the query cache, computed with compute() if it is not in the cache
+    def _cached_query(self, key: tuple, compute) -> pd.DataFrame:
+        
+        if key in self.query_cache:
+            self.query_cache.move_to_end(key)
+        else:
+            self.query_cache[key] = compute()
+            self._evict_queries()
+        return self.query_cache[key].copy()
+    
+    # Drop the least recently used queries above the size of the query cache
+    def _evict_queries(self) -> None:
+        
+        if self.query_cache_size is None:
+            return
+        while len(self.query_cache) > self.query_cache_size:
+            self.query_cache.popitem(last=False)
 
     ### ------------------------------- ###
     ###      1.3 Plotting functions     ###
     ### ------------------------------- ###
     
     # Plot the violin plot of a specific information, for specific countries, on a specific year
+    # For large ensembles (large_ensemble True, or None and a plotted model with more than large_ensemble_threshold scenarios), the violins
+    # are precomputed: the density and the quartiles are computed with numpy and only the shapes are sent to the figure
+    @profiled("figure_assembly", rows=lambda fig: figure_points(fig))
     def violin_plot(self, selection: Union[str,dict], Countries: Union[list[str], dict], YEAR: int,
-                    model_filter: list[str] = None, show_baseline = False) -> go.Figure:
+                    model_filter: list[str] = None, show_baseline = False, large_ensemble: bool = None) -> go.Figure:
         
+        start = time.perf_counter()
         if type(selection) == dict:
             selection_keys = list(selection.keys())
             column_widths = []
@@ -402,29 +1337,31 @@ class MainResults_GSA:
             selection_keys = list(selection.keys())
             
         # Iterate over the countries if defined as a dictionnary
-        if type(Countries) == list :
-            if len(Countries) == 0:
-                raise ValueError("The list of countries is empty.")
-            elif len(Countries) == 1:
-                Countries = {Countries[0] : Countries}
-            else :
-                Countries = {f"{len(Countries)} countries" : Countries}   
+        Countries = self._country_groups(Countries)
+        
+        # Filter the models we want to plot, without changing the models of the class
+        if model_filter is not None:
+            for model_name in model_filter:
+                if model_name not in self.model_names:
+                    raise ValueError(f"The model {model_name} is not in the list of models.")
+        models = model_filter if model_filter is not None else self.model_names
+        
+        # The mode is chosen once for the figure, from the largest model, so that a subplot never mixes precomputed violins on a
+        # numeric axis with categorical violins
+        if large_ensemble is None:
+            large_ensemble = max([np.count_nonzero(self._model_scenarios(model)) for model in models if model in getattr(self, "dict_results", {})],
+                                 default=0) > large_ensemble_threshold
         
         for column, key in enumerate(selection_keys, start=1):
+            # Positions of the precomputed violins on the x axis
+            tick_names = []
             for select in selection[key]:
                 # Color of the violin plots
                 color = results_color[select]
                 # Iterate over the countries
                 for country in Countries.keys():
-                    # Filter the models we want to plot
-                    if model_filter is not None:
-                        for model_name in model_filter:
-                            if model_name not in self.model_names:
-                                raise ValueError(f"The model {model_name} is not in the list of models.")
-                        self.model_names = model_filter
-                        self.nb_models = len(model_filter)
                     # Iterate over the model names
-                    for model in self.model_names:
+                    for model in models:
                         # Choose name adequatly
                         model_name = model # Name of the model to be put on the graph
                         if len(Countries.keys()) != 1: # If we put more than one geography, we add the name
@@ -445,16 +1382,26 @@ class MainResults_GSA:
                                 baseline = df[df['Scenarios'] == 0]['value'].values[0]
                             df = df[df['Scenarios'] != 0]
                             # Plot the data
-                            fig.add_trace(go.Violin(y=df['value'], name=violin_name, box_visible=True, line_color=color), row=1, col=column)
+                            if large_ensemble:
+                                position = len(tick_names)
+                                tick_names.append(violin_name)
+                                for trace in precomputed_violin(df['value'].to_numpy(), position, violin_name, color):
+                                    fig.add_trace(trace, row=1, col=column)
+                                x_baseline = position
+                            else:
+                                fig.add_trace(go.Violin(y=df['value'], name=violin_name, box_visible=True, line_color=color), row=1, col=column)
+                                x_baseline = violin_name
                             if show_baseline:
-                                fig.add_trace(go.Scatter(x=[violin_name], y=[baseline], mode='markers',
+                                fig.add_trace(go.Scatter(x=[x_baseline], y=[baseline], mode='markers',
                                                         marker=dict(color='#3C3D37', size=10), name=violin_name + ' Baseline'), row=1, col=column)
                         except :
-                            print(f"No {selection} data for {model_name} - {country}")   
+                            log_event(f"No {selection} data for {model_name} - {country}", "violin_plot", level=logging.WARNING, model=model_name, country=country)
                                                            
             fig.update_yaxes(title_text=f"{key}", range=[0, None], showgrid=True, gridcolor='black', gridwidth=1,
                              tickfont=dict(size=16), title_font=dict(size=16), row=1, col=column)
             fig.update_xaxes(tickangle=0, row=1, col=column)    
+            if len(tick_names) != 0:
+                fig.update_xaxes(tickvals=list(range(len(tick_names))), ticktext=tick_names, row=1, col=column)
             
         fig.update_layout(
             title={
@@ -462,17 +1409,21 @@ class MainResults_GSA:
                 'font': {'size': 16}
             },
             height=600,
-            width=max(600,200*self.nb_models*len(Countries)*sum([len(selection[key]) for key in selection_keys])),
+            width=max(600,200*len(models)*len(Countries)*sum([len(selection[key]) for key in selection_keys])),
             legend=dict(orientation='h', x=0.5, y=1.04, xanchor='center', yanchor='bottom'),  # Adjust legend position
             margin=dict(t=150, b=150),  # Adjust top and bottom margins to accommodate title and legend
             plot_bgcolor='white',  # Set background color to white
         )
+        self._figure_report(fig, start)
             
         return fig
     
+    # For large ensembles (large_ensemble True, or None and more than large_ensemble_threshold scenarios), the scatter is drawn with WebGL
+    @profiled("figure_assembly", rows=lambda fig: figure_points(fig))
     def correlation_plot(self, model: str, selection: list[str], Countries: list[str], YEAR: int, color_selection: str = None,
-                         show_baseline = False, show_regression = True) -> go.Figure:
+                         show_baseline = False, show_regression = True, large_ensemble: bool = None) -> go.Figure:
         
+        start = time.perf_counter()
         # Verify that the selection list has two elements
         if len(selection) != 2:
             raise ValueError("The selection list should contain two elements. One for the x-axis and one for the y-axis.")
@@ -544,22 +1495,29 @@ class MainResults_GSA:
             reg = LinearRegression().fit(X, y)
             y_pred = reg.predict(X)
             r2 = r2_score(y, y_pred)
+            # The regression line only needs its two end points
+            x_line = np.array([X.min(), X.max()])
+            y_line = reg.predict(x_line.reshape(-1, 1))
         
         # Create plot
         fig = go.Figure()
+        if large_ensemble or (large_ensemble is None and len(df_x) > large_ensemble_threshold):
+            Scatter = go.Scattergl
+        else:
+            Scatter = go.Scatter
         
         # Plot the data
         if color_selection is None:
-            fig.add_trace(go.Scatter(x=df_x['value'], y=df_y['value'], mode='markers',
+            fig.add_trace(Scatter(x=df_x['value'], y=df_y['value'], mode='markers',
                                     showlegend=False))
         else :
-            fig.add_trace(go.Scatter(x=df_x['value'], y=df_y['value'], mode='markers',
+            fig.add_trace(Scatter(x=df_x['value'], y=df_y['value'], mode='markers',
                                     marker=dict(color=df_color['value'], colorscale='Portland', size=8, showscale=True,
                                                 colorbar=dict(title=f"{color_selection} [{color_unit}]", len=0.6)),
                                     showlegend=False))
         
         if show_regression:
-            fig.add_trace(go.Scatter(x=df_x['value'], y=y_pred, mode='lines', name='Trendline', line=dict(color='red'),showlegend=False))
+            fig.add_trace(go.Scatter(x=x_line, y=y_line, mode='lines', name='Trendline', line=dict(color='red'),showlegend=False))
             
         if show_baseline:
             fig.add_trace(go.Scatter(x=[baseline_x], y=[baseline_y], mode='markers',
@@ -572,9 +1530,902 @@ class MainResults_GSA:
             width=800,
             height=600,
         )
+        self._figure_report(fig, start)
+        
+        return fig
+    
+    # Report the time to build the last figure and the size of its JSON payload, the size is only computed for large figures
+    # or if report_figures is True, as the serialization of the figure takes time
+    def _figure_report(self, fig: go.Figure, start: float) -> None:
+        
+        self.figure_report = {"build_time": time.perf_counter() - start}
+        points = figure_points(fig)
+        if getattr(self, "report_figures", False) or points > large_ensemble_threshold:
+            with self.profiler.stage("figure_serialization") as stage:
+                self.figure_report["payload_bytes"] = len(fig.to_json())
+                stage.rows = points
+            log_event(f"Figure built in {self.figure_report['build_time']:.2f} s, payload of {self.figure_report['payload_bytes']/1e6:.2f} MB",
+                      "figure_report", points=points, **self.figure_report)
+    
+    ### ------------------------------- ###
+    ### 1.4 Global sensitivity analysis ###
+    ### ------------------------------- ###
+    
+    # Matrix of outputs of a model, one column per (selection, country group, year) and one row per scenario of the sample
+    # The row i is the scenario i+1, aligned with df_scenarios_sample. A scenario without data for an output has the value 0.
+    # The H2 transmission is summed over the importing countries, as in violin_plot.
+    def _output_matrix(self, model: str, selections: list[str], Countries: Union[list[str], dict], YEAR: Union[int, list]) -> tuple[np.ndarray, pd.DataFrame]:
+        
+        # Check that the sample has been imported
+        if not hasattr(self, "df_scenarios_sample"):
+            raise ValueError("The input data have not been imported yet. Please use the import_input_data() function.")
+        
+        Countries = self._country_groups(Countries)
+        years = YEAR if type(YEAR) == list else [YEAR]
+        scenarios = np.arange(1, len(self.df_scenarios_sample) + 1)
+        
+        outputs = pd.DataFrame([(selection, country, year) for selection in selections for country in Countries.keys() for year in years],
+                               columns=['Selection', 'Countries', 'YEAR'])
+        Y = convergence_values(lambda selection, Countries, YEAR: self.get_results(model, selection, Countries, YEAR), outputs, Countries, scenarios)
+        
+        return Y, outputs
+    
+    # Sensitivity indices of all the parameters of the sample for a set of results selections, country groups and years
+    # The methods are the first order variance-based index ("first_order") and the PAWN index ("pawn"), with bootstrap confidence intervals
+    def sensitivity_analysis(self, model: str, selections: list[str], Countries: Union[list[str], dict], YEAR: Union[int, list],
+                             methods: list[str] = ["first_order", "pawn"], n_bins: int = 10, n_boot: int = 100,
+                             confidence: float = 0.95, workers: int = None, seed: int = None) -> pd.DataFrame:
+        
+        Y, outputs = self._output_matrix(model, selections, Countries, YEAR)
+        X = self.df_scenarios_sample[Parameters_names].to_numpy(dtype=np.float64)
+        
+        indices = sensitivity_indices(X, Y, methods=methods, n_bins=n_bins, n_boot=n_boot, confidence=confidence, workers=workers, seed=seed)
+        df = sensitivity_table(indices, Parameters_names, outputs)
+        df.insert(0, 'Model', model)
+        
+        return df
+    
+    # Pearson, Spearman and partial rank correlation coefficients (PRCC) with their p-values, of all the parameters of the sample
+    # and the ratios of results_and_input_data_selections (if include_ratios) against all the results selections, for each country group and year
+    # The PRCC of a parameter is controlled for the other parameters of the sample, it is not computed for the ratios
+    def correlation_matrix(self, model: str, Countries: Union[list[str], dict], YEAR: Union[int, list], selections: list[str] = results_selections,
+                           include_ratios: bool = True) -> pd.DataFrame:
+        
+        Countries = self._country_groups(Countries)
+        years = YEAR if type(YEAR) == list else [YEAR]
+        X_parameters = self.df_scenarios_sample[Parameters_names].to_numpy(dtype=np.float64)
+        
+        tables = []
+        # The ratios depend on the countries and the year, the coefficients are computed for each country group and year
+        for country in Countries.keys():
+            for year in years:
+                Y, outputs = self._output_matrix(model, selections, {country: Countries[country]}, year)
+                X = X_parameters
+                inputs = list(Parameters_names)
+                if include_ratios:
+                    ratios = []
+                    for ratio in results_and_input_data_selections:
+                        df_results = self.get_results(model, results_and_input_data_selections_dict[ratio][0], Countries[country], year)
+                        df_results = df_results.groupby('Scenarios')['value'].sum().reindex(np.arange(1, len(X) + 1), fill_value=0)
+                        df_input = self.sample_input_data(results_and_input_data_selections_dict[ratio][1], Countries[country], year)
+                        ratios.append(df_results.to_numpy() / df_input['value'].to_numpy()[1:])
+                    X = np.column_stack([X] + ratios)
+                    inputs += results_and_input_data_selections
+                
+                coefficients = correlation_coefficients(X, Y, prcc_columns=len(Parameters_names))
+                df = outputs.iloc[np.tile(np.arange(len(outputs)), len(inputs))].reset_index(drop=True)
+                df["Parameter"] = np.repeat(inputs, len(outputs))
+                for name, values in coefficients.items():
+                    df[name] = values.reshape(-1)
+                tables.append(df)
+        
+        df = pd.concat(tables, ignore_index=True)
+        df.insert(0, 'Model', model)
+        
+        return df
+    
+    # Heatmap of one coefficient of a table computed by correlation_matrix, parameters against outputs
+    def correlation_heatmap(self, df: pd.DataFrame, coefficient: str = "spearman") -> go.Figure:
+        
+        if coefficient not in ["pearson", "spearman", "prcc"]:
+            raise ValueError("The coefficient should be pearson, spearman or prcc.")
+        
+        df = df.assign(Output=df['Selection'] + " - " + df['Countries'].astype(str) + " (" + df['YEAR'].astype(str) + ")")
+        df = df.pivot_table(index='Parameter', columns='Output', values=coefficient, sort=False, dropna=False)
+        
+        fig = px.imshow(df, color_continuous_scale='RdBu_r', zmin=-1, zmax=1, aspect='auto')
+        fig.update_layout(
+            title=f'{coefficient.capitalize()} correlation between the parameters and the results',
+            height=max(600, 20*len(df.index)),
+            width=max(800, 40*len(df.columns)),
+        )
+        
+        return fig
+    
+    # Train one gradient boosting emulator per (selection, country group, year) output of a model, with the parameters of the sample as features
+    # The emulators are trained in parallel and stored in the cache directory if given (see SurrogateModels)
+    def build_surrogates(self, model: str, selections: list[str], Countries: Union[list[str], dict], YEAR: Union[int, list],
+                         cache_dir: str = None, workers: int = None, **params) -> SurrogateModels:
+        
+        Y, outputs = self._output_matrix(model, selections, Countries, YEAR)
+        X = self.df_scenarios_sample[Parameters_names].to_numpy(dtype=np.float64)
+        
+        surrogates = SurrogateModels(Parameters_names, outputs, cache_dir=cache_dir, **params).fit(X, Y, workers=workers)
+        if not hasattr(self, "surrogates"):
+            self.surrogates = {}
+        self.surrogates[model] = surrogates
+        
+        return surrogates
+    
+    ### ------------------------------- ###
+    ###         1.5 Convergence         ###
+    ### ------------------------------- ###
+    
+    # Track the convergence of the mean, the standard deviation and some quantiles of the outputs (selection, country group, year) of a model
+    # The statistics are streamed: they are updated scenario by scenario with the scenarios already imported, and then with the scenarios
+    # of the files appended with append_results, with a memory which does not depend on the number of scenarios (see ConvergenceMonitor)
+    # The H2 transmission is summed over the importing countries and a scenario without data for an output has the value 0, as in _output_matrix.
+    def track_convergence(self, model: str, selections: list[str], Countries: Union[list[str], dict], YEAR: Union[int, list],
+                          quantiles: list[float] = [0.05, 0.95], growth: float = 1.05) -> ConvergenceMonitor:
+        
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        if model not in self.dict_results:
+            raise ValueError(f"The model {model} is not in the results.")
+        for selection in selections:
+            if selection not in results_selections:
+                raise ValueError(f"The selection {selection} is not correct.")
+        
+        Countries = self._country_groups(Countries)
+        years = YEAR if type(YEAR) == list else [YEAR]
+        outputs = pd.DataFrame([(selection, country, year) for selection in selections for country in Countries.keys() for year in years],
+                               columns=['Selection', 'Countries', 'YEAR'])
+        monitor = ConvergenceMonitor(outputs, quantiles=quantiles, growth=growth)
+        if not hasattr(self, "convergence_groups"):
+            self.convergence_groups = {}
+        self.convergence_groups[model] = Countries
+        self.convergence[model] = monitor
+        
+        # Stream the scenarios already imported
+        scenarios = self._model_scenarios(model)
+        scenarios = scenarios[scenarios != 0]
+        with self.profiler.stage("convergence_update", model=model) as stage:
+            monitor.update_many(convergence_values(lambda selection, Countries, YEAR: self.get_results(model, selection, Countries, YEAR),
+                                                   outputs, Countries, scenarios))
+            stage.rows = len(scenarios)
+        
+        return monitor
+    
+    def _convergence_monitor(self, model: str) -> ConvergenceMonitor:
+        
+        if model not in getattr(self, "convergence", {}):
+            raise ValueError(f"The convergence of {model} is not tracked. Please use the track_convergence() function.")
+        return self.convergence[model]
+    
+    # Stop criteria of the tracked outputs of a model: the statistics have changed by less than rtol over the last window fraction
+    # of the scenarios and the confidence interval of the mean is smaller than rtol times the mean (see ConvergenceMonitor.status)
+    def convergence_status(self, model: str, rtol: float = 0.01, window: float = 0.2, min_scenarios: int = 50) -> pd.DataFrame:
+        
+        df = self._convergence_monitor(model).status(rtol=rtol, window=window, min_scenarios=min_scenarios)
+        df.insert(0, 'Model', model)
+        return df
+    
+    # Convergence curves of the tracked outputs of a model: the statistics at each checkpoint
+    def convergence_curves(self, model: str) -> pd.DataFrame:
+        
+        df = self._convergence_monitor(model).curves_table()
+        df.insert(0, 'Model', model)
+        return df
+    
+    # Plot the convergence curves of the tracked outputs of a model, the mean with its confidence interval and the quantiles
+    def convergence_plot(self, model: str, selection: str = None, Countries: str = None, YEAR: int = None) -> go.Figure:
+        
+        df = self.convergence_curves(model)
+        for column, value in [('Selection', selection), ('Countries', Countries), ('YEAR', YEAR)]:
+            if value is not None:
+                df = df[df[column] == value]
+        if len(df) == 0:
+            raise ValueError("No tracked output matches the selection.")
+        quantiles = [column for column in df.columns if column.startswith("q")]
+        
+        fig = go.Figure()
+        for (output_selection, country, year), df_output in df.groupby(['Selection', 'Countries', 'YEAR'], sort=False):
+            name = f"{output_selection} - {country} ({year})"
+            color = results_color[output_selection]
+            ci = 1.96 * df_output['std'].fillna(0) / np.sqrt(df_output['n'])
+            fig.add_trace(go.Scatter(x=np.concatenate([df_output['n'], df_output['n'][::-1]]), y=np.concatenate([df_output['mean'] + ci, (df_output['mean'] - ci)[::-1]]),
+                                     fill='toself', line=dict(width=0), fillcolor=color, opacity=0.2, legendgroup=name, showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=df_output['n'], y=df_output['mean'], mode='lines', line=dict(color=color), name=f"{name} mean", legendgroup=name))
+            for quantile in quantiles:
+                fig.add_trace(go.Scatter(x=df_output['n'], y=df_output[quantile], mode='lines', line=dict(color=color, dash='dash'),
+                                         name=f"{name} {quantile}", legendgroup=name))
+        
+        fig.update_layout(
+            title=f'Convergence of the statistics of {model}',
+            xaxis_title="Number of scenarios",
+            yaxis_title="Value",
+            width=800,
+            height=600,
+            plot_bgcolor='white',
+        )
         
         return fig
+    
+    ### ------------------------------- ###
+    ###      1.6 Scenario discovery     ###
+    ### ------------------------------- ###
+    
+    # Bitmap index of the scenarios of a model over the parameters and the outputs, to query the scenarios with compound predicates
+    # and to search the parameter boxes explaining an outcome with PRIM (see ScenarioIndex). The parameters are the columns of the
+    # design matrix of the first year, in physical units, and the outputs are named "selection|country group|year".
+    def scenario_index(self, model: str, selections: list[str], Countries: Union[list[str], dict, str], YEAR: Union[int, list],
+                       n_bins: int = 32) -> ScenarioIndex:
+        
+        Y, outputs = self._output_matrix(model, selections, Countries, YEAR)
+        years = YEAR if type(YEAR) == list else [YEAR]
+        if years[0] not in self.design_matrix:
+            self.build_design_matrix(years[0])
+        X = self.design_matrix[years[0]][1:]
+        
+        columns = design_matrix_columns + [f"{selection}|{country}|{year}" for selection, country, year in outputs.itertuples(index=False)]
+        with self.profiler.stage("scenario_index", model=model) as stage:
+            index = ScenarioIndex(np.column_stack([X, Y]), columns, scenarios=np.arange(1, len(X) + 1), parameters=Parameters_names, n_bins=n_bins)
+            stage.rows = index.n
+        return index
+    
+    ### ------------------------------- ###
+    ###      1.7 Model comparison       ###
+    ### ------------------------------- ###
+
+    # Values of the outputs (selection, country group, year) of several models on their common scenarios, as an array
+    # models x scenarios x outputs, and the values of the baselines (scenario 0) as an array models x outputs (None if a model has no baseline)
+    # The H2 transmission is summed over the importing countries and a scenario without data for an output has the value 0, as in _output_matrix.
+    def _comparison_values(self, models: list[str], selections: list[str], Countries: Union[list[str], dict, str],
+                           YEAR: Union[int, list]) -> tuple[np.ndarray, np.ndarray, np.ndarray, pd.DataFrame]:
+
+        # Check that the data has been imported
+        if not hasattr(self, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        for model in models:
+            if model not in self.dict_results:
+                raise ValueError(f"The model {model} is not in the results.")
+        for selection in selections:
+            if selection not in results_selections:
+                raise ValueError(f"The selection {selection} is not correct.")
+
+        Countries = self._country_groups(Countries)
+        years = YEAR if type(YEAR) == list else [YEAR]
+        outputs = pd.DataFrame([(selection, country, year) for selection in selections for country in Countries.keys() for year in years],
+                               columns=['Selection', 'Countries', 'YEAR'])
+
+        # The models are compared on the scenarios they all have
+        scenarios = self._model_scenarios(models[0])
+        for model in models[1:]:
+            scenarios = np.intersect1d(scenarios, self._model_scenarios(model))
+        baseline = bool((scenarios == 0).any())
+        scenarios = scenarios[scenarios != 0]
+        union = np.concatenate([self._model_scenarios(model) for model in models])
+        dropped = len(np.setdiff1d(union[union != 0], scenarios))
+        if dropped > 0:
+            log_event(f"{dropped} scenarios are not in all the models and are not compared", "compare_models", models=models)
+
+        with self.profiler.stage("comparison_values") as stage:
+            Y = np.stack([convergence_values(lambda selection, Countries, YEAR: self.get_results(model, selection, Countries, YEAR),
+                                             outputs, Countries, np.concatenate([[0], scenarios]) if baseline else scenarios)
+                          for model in models])
+            stage.rows = Y.size
+        if baseline:
+            return Y[:, 1:], Y[:, 0], scenarios, outputs
+        return Y, None, scenarios, outputs
+
+    # Paired comparison of models run on the same scenario sample, for all the outputs (selection, country group, year) at once
+    # For each pair of models (all the pairs of models by default, or the given pairs (A, B)), the per-scenario differences A - B and
+    # ratios A / B are summarised by their mean and median, the confidence interval of the mean difference, the win rate of A, and the
+    # p-values of the paired t-test and of the sign test (see paired_statistics). Each model is also compared to its baseline (Model_B
+    # is "Baseline") if baseline is True and the models have one. Returns a table with one row per (pair, output).
+    def compare_models(self, selections: list[str], Countries: Union[list[str], dict, str], YEAR: Union[int, list], models: list[str] = None,
+                       pairs: list[tuple[str, str]] = None, baseline: bool = True, confidence: float = 0.95) -> pd.DataFrame:
+
+        models = list(self.dict_results.keys()) if models is None and hasattr(self, "dict_results") else models
+        if pairs is not None:
+            models = list(dict.fromkeys([model for pair in pairs for model in pair]))
+        if models is None or len(models) == 0:
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+
+        Y, Y0, scenarios, outputs = self._comparison_values(models, selections, Countries, YEAR)
+        positions = {model: i for i, model in enumerate(models)}
+        pairs = list(zip(*np.triu_indices(len(models), 1))) if pairs is None else [(positions[A], positions[B]) for A, B in pairs]
 
+        with self.profiler.stage("compare_models") as stage:
+            statistics = pairwise_statistics(Y, pairs, confidence=confidence)
+            tables = [comparison_table(statistics, [models[A] for A, B in pairs], [models[B] for A, B in pairs], outputs)]
+            if Y0 is not None:
+                # Difference of the baselines of the two models of each pair
+                tables[0]['baseline_difference'] = np.concatenate([Y0[A] - Y0[B] for A, B in pairs]) if len(pairs) != 0 else []
+                if baseline:
+                    tables.append(comparison_table(baseline_statistics(Y, Y0, confidence=confidence), models, [baseline_name] * len(models), outputs))
+            stage.rows = len(pairs) * Y.shape[1] * Y.shape[2]
 
+        return pd.concat(tables, ignore_index=True)
 
-#%% ------------------------------- ###
\ No newline at end of file
+    # Win rates of the models against each other for one output of a table computed by compare_models, as a matrix Model_A x Model_B
+    # The value of (A, B) is the share of the scenarios where A is larger than B
+    def win_rate_table(self, df: pd.DataFrame, selection: str, Countries: str, YEAR: int) -> pd.DataFrame:
+
+        df = df[(df['Selection'] == selection) & (df['Countries'] == Countries) & (df['YEAR'].astype(str) == str(YEAR))]
+        if len(df) == 0:
+            raise ValueError(f"The output {selection}, {Countries}, {YEAR} is not in the comparison.")
+        return win_rate_matrix(df)
+
+    ### ------------------------------- ###
+    ###          1.8 Profiling          ###
+    ### ------------------------------- ###
+    
+    # Start recording the wall time, calls and rows processed of each stage (GDX read, extraction of the scenario ids, concatenation,
+    # filters of get_results, figures...) per model and selection. The peak memory of the stages is only recorded if track_memory is True.
+    def enable_profiling(self, track_memory: bool = False, reset: bool = True) -> None:
+        
+        if reset:
+            self.profiler.reset()
+        self.profiler.enable(track_memory=track_memory)
+    
+    def disable_profiling(self) -> None:
+        
+        self.profiler.disable()
+    
+    # Summary table of the stages recorded since profiling was enabled
+    def profiling_summary(self) -> pd.DataFrame:
+        
+        return self.profiler.summary()
+    
+    # Export the profiling to a JSON file (records and summary) or a CSV file (records)
+    def export_profiling(self, file_path: str) -> None:
+        
+        self.profiler.export(file_path)
+
+#%% ------------------------------- ###
+###       2. Utility functions      ###
+### ------------------------------- ###
+
+# Read the results symbols of one scenario or baseline file into a single DataFrame
+def read_results_file(file_path: str, baseline: bool = False, profiler: StageProfiler = no_profiler, model: str = None) -> pd.DataFrame:
+    
+    with profiler.stage("gdx_read", model=model) as stage:
+        df = gt.Container(file_path) # Import the file
+        records = {symbol: df.data[symbol].records for symbol in results_symbols if symbol in df.data.keys()}
+        stage.rows = sum(len(df_symbol) for df_symbol in records.values())
+    
+    return results_from_records(records, baseline, profiler=profiler, model=model)
+
+# Read one table of the results of a model from the symbol of the table in each file (scenario and baseline files) of the model
+# The other symbols are not read. The dimensions are categorical, and a table whose symbol is in none of the files is empty.
+def read_results_table(files: list[tuple[str, bool]], Table: str, float32: bool = False, profiler: StageProfiler = no_profiler,
+                       model: str = None) -> pd.DataFrame:
+    
+    symbol = [symbol for symbol, (other, columns) in results_symbols.items() if other == Table][0]
+    frames = []
+    for file_path, baseline in files:
+        with profiler.stage("gdx_read", model=model, selection=symbol) as stage:
+            try:
+                df = gt.Container(file_path, symbols=[symbol]) # Import only the symbol of the table
+            except ValueError:
+                # The symbol is not in the file
+                continue
+            records = {symbol: df.data[symbol].records} if symbol in df.data.keys() else {}
+            stage.rows = sum(len(df_symbol) for df_symbol in records.values())
+        tables = split_results_tables(results_from_records(records, baseline, profiler=profiler, model=model))
+        if Table in tables:
+            frames.append(tables[Table])
+    
+    return results_table_from_frames(frames, Table, float32=float32)
+
+# Table of the results of a model from the rows of the table in each of its files, with categorical dimensions as read lazily
+def results_table_from_frames(frames: list[pd.DataFrame], Table: str, float32: bool = False) -> pd.DataFrame:
+    
+    if len(frames) == 0:
+        return pd.DataFrame(columns=results_tables[Table])
+    df = pd.concat(frames, ignore_index=True)
+    df = df.astype({column: 'category' for column in df.columns if column not in ['Scenarios', 'value']})
+    df['Scenarios'] = df['Scenarios'].astype(np.int64)
+    df['value'] = df['value'].astype(np.float32 if float32 else np.float64)
+    return df
+
+# Read one file in a worker process with a profiler, the records of the profiler are returned with the DataFrame
+def read_results_file_profiled(file_path: str, baseline: bool, model: str, track_memory: bool = False) -> tuple[pd.DataFrame, list[dict]]:
+    
+    profiler = StageProfiler(enabled=True, track_memory=track_memory)
+    df = read_results_file(file_path, baseline, profiler=profiler, model=model)
+    profiler.disable()
+    return df, profiler.records
+
+# Build the DataFrame of one scenario or baseline file from the records of its symbols
+def results_from_records(records: dict[str, pd.DataFrame], baseline: bool = False, profiler: StageProfiler = no_profiler, model: str = None) -> pd.DataFrame:
+    
+    frames = []
+    # Find the data in the file
+    for symbol, (table, columns) in results_symbols.items():
+        if symbol in records:
+            df_symbol = pd.DataFrame(records[symbol])
+            if not baseline:
+                df_symbol.columns = columns
+            df_symbol["Table"] = table
+            if not baseline:
+                with profiler.stage("extract_scenarios", model=model, selection=symbol) as stage:
+                    df_symbol['Scenarios'] = scenario_ids(df_symbol['Scenarios'])
+                    stage.rows = len(df_symbol)
+            frames.append(df_symbol)
+    # Concatenate all the dataframe together, a file without any of the symbols gives an empty DataFrame
+    with profiler.stage("concat", model=model) as stage:
+        df = pd.concat(frames) if len(frames) != 0 else pd.DataFrame(columns=['Scenarios', 'value', 'Table'])
+        stage.rows = len(df)
+    if baseline:
+        df["Scenarios"] = 0
+    
+    return df
+
+# Scenario ids of the labels of a Scenarios column (the first number in the label)
+# For a categorical column, as read by GAMS Transfer, the ids are extracted once per category instead of once per row
+def scenario_ids(scenarios: pd.Series) -> np.ndarray:
+    
+    if isinstance(scenarios.dtype, pd.CategoricalDtype):
+        categories = pd.Series(scenarios.cat.categories.astype(str))
+        ids = categories.str.extract(r'(\d+)')[0].astype(float).to_numpy()
+        ids = ids[scenarios.cat.codes.to_numpy()]
+        if np.isnan(ids).any() or (scenarios.cat.codes.to_numpy() == -1).any():
+            raise ValueError("Some scenarios do not have an id.")
+        return ids.astype(int)
+    return scenarios.str.extract(r'(\d+)')[0].astype(int).to_numpy()
+
+# Split a padded DataFrame of results into one DataFrame per table, keeping only the columns used by each table
+def split_results_tables(df: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    
+    tables = {}
+    for Table, df_table in df.groupby("Table", sort=False):
+        columns = [column for column in results_tables[Table] if column in df_table.columns]
+        # Keep the columns that are not in the schema but are used by this table
+        columns += [column for column in df_table.columns if column not in columns and column != "Table" and df_table[column].notna().any()]
+        tables[Table] = df_table[columns]
+    
+    return tables
+
+# Positions of the rows of a DataFrame of results for each (Table, Year, Country) group, split by (Commodity, Tech type)
+# If Table is None, the DataFrame is a padded DataFrame with a Table column
+def index_results_rows(df: pd.DataFrame, Table: str = None) -> dict[tuple, dict[tuple, np.ndarray]]:
+    
+    columns = ['Table', 'Y', 'C', 'COMMODITY', 'TECH_TYPE'] if Table is None else ['Y', 'C', 'COMMODITY', 'TECH_TYPE']
+    keys = pd.DataFrame({column: df[column].to_numpy(dtype=object) if column in df.columns else None for column in columns}, index=range(len(df)))
+    
+    index = {}
+    for key, positions in keys.groupby(columns, dropna=False, sort=False).indices.items():
+        key = [None if pd.isna(value) else str(value) for value in key]
+        if Table is not None:
+            key = [Table] + key
+        index.setdefault(tuple(key[:3]), {})[tuple(key[3:])] = positions
+    
+    return index
+
+# Add the index of new rows to an index of results, the positions of the new rows start at offset
+# The positions of a group are not concatenated with the positions already there: a group holds a list of arrays, one per append
+def merge_results_index(index: dict, new_index: dict, offset: int = 0) -> None:
+    
+    for key, groups in new_index.items():
+        target = index.setdefault(key, {})
+        for group, positions in groups.items():
+            positions = positions + offset
+            if group not in target:
+                target[group] = positions
+            elif isinstance(target[group], list):
+                target[group].append(positions)
+            else:
+                target[group] = [target[group], positions]
+
+# Rows of a table of the results as a DataFrame, the batches of an appended table are concatenated (see ChunkedTable)
+def results_frame(df: Union[pd.DataFrame, ChunkedTable]) -> pd.DataFrame:
+    
+    return df.frame() if isinstance(df, ChunkedTable) else df
+
+# Sorted scenario ids of the results of a model, for both the padded and the compact representation
+def results_scenario_ids(df: Union[pd.DataFrame, dict]) -> np.ndarray:
+    
+    if isinstance(df, (StoredModel, LazyModel)):
+        return df.scenarios()
+    tables = df.values() if isinstance(df, dict) else [df]
+    tables = [chunk for table in tables for chunk in (table.chunks if isinstance(table, ChunkedTable) else [table])]
+    return np.unique(np.concatenate([np.asarray(table['Scenarios'], dtype=np.int64) for table in tables] + [np.array([], dtype=np.int64)]))
+
+# Values of the outputs (Selection, Countries, YEAR) of a model for some scenarios, as a matrix scenarios x outputs
+# results returns the results of a selection as get_results (or None if there is no data for the year), the missing values are 0
+def convergence_values(results, outputs: pd.DataFrame, Countries: dict[str, list[str]], scenarios: np.ndarray) -> np.ndarray:
+    
+    columns = []
+    for selection, country, year in outputs.itertuples(index=False):
+        df = results(selection, Countries[country], year)
+        if df is None:
+            columns.append(np.zeros(len(scenarios)))
+            continue
+        df = df.groupby('Scenarios')['value'].sum()
+        columns.append(df.reindex(scenarios, fill_value=0).to_numpy(dtype=np.float64))
+    return np.column_stack(columns) if len(columns) != 0 else np.empty((len(scenarios), 0))
+
+# Sum the filtered rows of a selection by scenario (and importing country for the H2 transmission)
+def aggregate_results(df: pd.DataFrame, selection: str) -> pd.DataFrame:
+    
+    if selection in ["Elec RE Capacity","Elec PV Capacity", "Elec ONSHORE Capacity", "Elec OFFSHORE Capacity",
+                     "Elec RE Production","Elec PV Production", "Elec ONSHORE Production", "Elec OFFSHORE Production",
+                     "H2 Green Capacity", "H2 Blue Capacity", "H2 Green Production", "H2 Blue Production", "H2 Import Capacity", "H2 Import Production", "H2 Storage"]:
+        df = df.groupby('Scenarios')['value'].sum().reset_index()
+    elif selection in ["H2 Transmission Capacity", "H2 Transmission Flow"]:
+        df = df.groupby(['Scenarios', 'CI'], observed=True)['value'].sum().reset_index()
+    
+    return df
+
+# Results attached by a worker process, see init_shared_worker
+_shared_results = None
+
+# Initializer of the worker processes of a pool (ProcessPoolExecutor(initializer=init_shared_worker, initargs=(handle,))):
+# the results published with publish_shared are attached once per worker and returned by shared_results
+def init_shared_worker(handle: dict) -> None:
+    
+    global _shared_results
+    _shared_results = MainResults_GSA.from_shared(handle)
+
+def shared_results() -> "MainResults_GSA":
+    
+    if _shared_results is None:
+        raise ValueError("No shared results are attached in this process. Please use init_shared_worker as initializer of the pool.")
+    return _shared_results
+
+# Key of a query in the query cache, the countries are ignored by sample_input_data and the years are compared as strings
+def query_key(kind: str, selection: str, Countries: list[str], YEAR: int, model: str = None) -> tuple:
+    
+    if kind == "input":
+        return ("input", None, selection, (), str(YEAR))
+    return ("results", model, selection, Countries if isinstance(Countries, str) else tuple(Countries), str(YEAR))
+
+# Number of points of the traces of a figure
+def figure_points(fig: go.Figure) -> int:
+    
+    return sum(len(trace.y) for trace in fig.data if getattr(trace, "y", None) is not None)
+
+# Country groups as a dictionnary {name: countries}, a list of countries is named after its country or its number of countries
+def country_groups(Countries: Union[list[str], dict]) -> dict[str, list[str]]:
+    
+    if type(Countries) == dict:
+        return Countries
+    if len(Countries) == 0:
+        raise ValueError("The list of countries is empty.")
+    elif len(Countries) == 1:
+        return {Countries[0] : Countries}
+    else :
+        return {f"{len(Countries)} countries" : Countries}
+
+# Filter the rows of a results selection and transform the values as needed
+# The rows are not filtered on the countries and the year, and the importing country is added in the CI column for the transmission
+def filter_results_rows(df: pd.DataFrame, selection: str) -> pd.DataFrame:
+    
+    # Commodity filtering
+    if selection in ["Elec RE Capacity","Elec PV Capacity", "Elec ONSHORE Capacity", "Elec OFFSHORE Capacity",
+                     "Elec RE Production","Elec PV Production", "Elec ONSHORE Production", "Elec OFFSHORE Production"]:
+        df = df[df['COMMODITY']=='ELECTRICITY']
+    elif selection in ["H2 Green Capacity", "H2 Blue Capacity", "H2 Green Production", "H2 Blue Production"]:
+        df = df[(df['COMMODITY']=='HYDROGEN') & (df['FFF'] != 'IMPORT_H2') & (df['TECH_TYPE'] != 'H2-STORAGE')]
+    elif selection in ["H2 Import Capacity", "H2 Import Production"]:
+        df = df[(df['COMMODITY']=='HYDROGEN') & (df['FFF'] == 'IMPORT_H2')]
+    elif selection in ["H2 Storage"]:
+        df = df[(df['COMMODITY']=='HYDROGEN')]
+    
+    # Tech type filtering
+    if selection in ["Elec RE Capacity","Elec RE Production"]:
+        df = df[df['TECH_TYPE'].isin(['WIND-ON', 'WIND-OFF', 'SOLAR-PV'])]
+    elif selection in ["Elec PV Capacity", "Elec PV Production"]:
+        df = df[(df['TECH_TYPE']=='SOLAR-PV')]
+    elif selection in ["Elec ONSHORE Capacity", "Elec ONSHORE Production"]:
+        df = df[(df['TECH_TYPE']=='WIND-ON')]
+    elif selection in ["Elec OFFSHORE Capacity", "Elec OFFSHORE Production"]:
+        df = df[(df['TECH_TYPE']=='WIND-OFF')]
+    if selection in ["H2 Green Capacity", "H2 Green Production"]:
+        df[(df['TECH_TYPE']=='ELECTROLYZER')]
+    elif selection in ["H2 Blue Capacity", "H2 Blue Production"]:
+        df = df[(df['G'].str.contains('CCS')) & ((df['TECH_TYPE']=='STEAMREFORMING'))]
+    
+    # Country of the importing region
+    if selection in ["H2 Transmission Capacity", "H2 Transmission Flow"]:
+        df = df.assign(CI=df['IRRRI'].map(RRR_to_CCC))
+        
+    # Transformation of units if needed
+    if selection == "H2 Storage":
+        df = df.assign(value=df['value'] / 1000)
+    
+    return df
+
+#%% ------------------------------- ###
+###         3. Results cube         ###
+### ------------------------------- ###
+
+# Get the results of a selection from the cubes of a model, in the same format as get_results
+# The cubes can be the cubes of the countries (dim C), of the regions (dim RRR, the flows to the excluded countries are removed)
+# or of the groups of the geographic roll-up (dim G, Countries is the name of the group). Return None if the cubes do not contain the year.
+def results_from_cube(cubes: dict[str, "ResultsCube"], selection: str, Countries: Union[list[str], str], YEAR: int,
+                      dim: str = "C", excluded: list[str] = None) -> pd.DataFrame:
+    
+    transmission = selection in ["H2 Transmission Capacity", "H2 Transmission Flow"]
+    cube = cubes["transmission" if transmission else "results"]
+    if str(YEAR) not in cube.index["Y"]:
+        return None
+    
+    if dim == "G":
+        # The group is summed in the cube and its internal flows are already removed
+        if Countries not in cube.index["G"]:
+            return None
+        values = np.expand_dims(cube.sel(selection=selection, G=Countries, Y=str(YEAR)), axis=1)
+        excluded = []
+    else:
+        # Countries without any data are not in the cube
+        countries = [country for country in dict.fromkeys(Countries) if country in cube.index[dim]]
+        values = cube.sel(selection=selection, Y=str(YEAR), **{dim: countries})
+        excluded = Countries if excluded is None else excluded
+    scenarios = cube.coords["Scenarios"]
+    
+    if not transmission:
+        # values has the dimensions (Scenarios, C)
+        present = ~np.isnan(values).all(axis=1)
+        return pd.DataFrame({'Scenarios': scenarios[present], 'value': np.nansum(values, axis=1)[present]})
+    
+    # values has the dimensions (Scenarios, C, CI), the flows to the selected countries are removed
+    importers = [j for j, importer in enumerate(cube.coords["CI"]) if importer not in excluded]
+    values = values[:, :, importers]
+    present = ~np.isnan(values).all(axis=1)
+    sums = np.nansum(values, axis=1)
+    scenarios_positions, importers_positions = np.nonzero(present)
+    return pd.DataFrame({'Scenarios': scenarios[scenarios_positions],
+                         'CI': np.array(cube.coords["CI"], dtype=object)[importers][importers_positions],
+                         'value': sums[scenarios_positions, importers_positions]})
+
+# Build the results cube of a model from its tables, given by a function returning the rows of a table
+# If years is None, the cube contains all the years of the tables. The cube is by country (level C) or by region (level RRR),
+# the region of the H2 transmission is the exporting region.
+def results_cube_from_tables(table, years: list = None, dtype: type = np.float64, level: str = "C") -> dict[str, "ResultsCube"]:
+    
+    transmission_selections = ["H2 Transmission Capacity", "H2 Transmission Flow"]
+    other_selections = [selection for selection in results_selections if selection not in transmission_selections]
+    
+    # Filter the rows of each selection once, for all the countries and years
+    selection_rows = {}
+    for selection in results_selections:
+        df = filter_results_rows(table(results_selections_filters[selection][0]), selection)
+        df = df.assign(C=df['C'].astype(str), Y=df['Y'].astype(str))
+        if level == "RRR":
+            df = df.assign(RRR=df['IRRRE' if selection in transmission_selections else 'RRR'].astype(str))
+        if selection in transmission_selections:
+            df = df[df['CI'].notna()].assign(CI=lambda df: df['CI'].astype(str))
+        selection_rows[selection] = df
+    
+    # Coordinates of the cube
+    scenarios = np.unique(np.concatenate([df['Scenarios'].to_numpy() for df in selection_rows.values()]))
+    countries = sorted(set().union(*[df[level].unique() for df in selection_rows.values()]))
+    importers = sorted(set().union(*[selection_rows[selection]['CI'].unique() for selection in transmission_selections]))
+    if years is None:
+        years = sorted(set().union(*[df['Y'].unique() for df in selection_rows.values()]))
+    else:
+        years = [str(year) for year in years]
+    
+    results = ResultsCube(np.full((len(scenarios), len(other_selections), len(countries), len(years)), np.nan, dtype=dtype),
+                          {"Scenarios": scenarios, "selection": other_selections, level: countries, "Y": years})
+    transmission = ResultsCube(np.full((len(scenarios), len(transmission_selections), len(countries), len(importers), len(years)), np.nan, dtype=dtype),
+                               {"Scenarios": scenarios, "selection": transmission_selections, level: countries, "CI": importers, "Y": years})
+    
+    # Sum the values of each group and put them in the cube
+    for cube, selections, group in [(results, other_selections, ['Scenarios', level, 'Y']), (transmission, transmission_selections, ['Scenarios', level, 'CI', 'Y'])]:
+        for j, selection in enumerate(selections):
+            df = selection_rows[selection]
+            df = df[df['Y'].isin(years)]
+            df = df.groupby(group, observed=True)['value'].sum().reset_index()
+            positions = tuple(cube.positions(dim, df[dim].to_numpy()) for dim in group)
+            cube.values[positions[:1] + (j,) + positions[1:]] = df['value'].to_numpy()
+    
+    return {"results": results, "transmission": transmission}
+
+# Countries of the regions of the tables, the region of the H2 transmission is the exporting region
+def results_region_countries(table) -> dict[str, str]:
+    
+    region_countries = {}
+    for Table, columns in results_tables.items():
+        region = 'IRRRE' if 'IRRRE' in columns else 'RRR'
+        df = table(Table)[[region, 'C']].dropna().drop_duplicates()
+        region_countries.update(zip(df[region].astype(str), df['C'].astype(str)))
+    return region_countries
+
+# Build the geographic roll-up of a model from its tables: the cubes of the regions, of the countries summed from the regions
+# and of the groups summed from the countries, each with the kinds of results_cube_from_tables
+def results_rollup_from_tables(table, groups: dict[str, list[str]], years: list = None, dtype: type = np.float64) -> dict[str, dict[str, "ResultsCube"]]:
+    
+    regions = results_cube_from_tables(table, years=years, dtype=dtype, level="RRR")
+    country_regions = {}
+    for region, country in results_region_countries(table).items():
+        country_regions.setdefault(country, []).append(region)
+    country_regions = dict(sorted(country_regions.items()))
+    countries = {kind: rollup_cube(cube, country_regions, "RRR", "C") for kind, cube in regions.items()}
+    return {"regions": regions, "countries": countries, "groups": results_group_cubes(countries, groups)}
+
+# Cubes of the groups of countries summed from the cubes of the countries, the flows between the countries of a group are removed
+def results_group_cubes(countries: dict[str, "ResultsCube"], groups: dict[str, list[str]]) -> dict[str, "ResultsCube"]:
+    
+    cubes = {kind: rollup_cube(cube, groups, "C", "G") for kind, cube in countries.items()}
+    transmission = cubes["transmission"]
+    for g, members in enumerate(groups.values()):
+        importers = [j for j, importer in enumerate(transmission.coords["CI"]) if importer in members]
+        transmission.values[:, :, g, importers, :] = np.nan
+    return cubes
+
+# Sum the labels of a dimension of a cube by groups, the groups replace the dimension. The labels of a group which are not in the
+# cube are ignored and the sum is NaN if all the values of the group are NaN, as for the countries without data in results_from_cube.
+def rollup_cube(cube: "ResultsCube", groups: dict[str, list[str]], dim: str, new_dim: str) -> "ResultsCube":
+    
+    axis = cube.dims.index(dim)
+    shape = list(cube.values.shape)
+    shape[axis] = len(groups)
+    values = np.full(shape, np.nan, dtype=cube.values.dtype)
+    for g, members in enumerate(groups.values()):
+        members = [member for member in dict.fromkeys(members) if member in cube.index[dim]]
+        if len(members) == 0:
+            continue
+        member_values = np.take(cube.values, cube.positions(dim, members), axis=axis)
+        sums = np.nansum(member_values, axis=axis)
+        sums[np.isnan(member_values).all(axis=axis)] = np.nan
+        values[(slice(None),) * axis + (g,)] = sums
+    return ResultsCube(values, {new_dim if other == dim else other: list(groups.keys()) if other == dim else cube.coords[other] for other in cube.dims})
+
+# Dense array of results with labelled dimensions
+class ResultsCube:
+    def __init__(self, values: np.ndarray, coords: dict[str, list]):
+        
+        if values.shape != tuple(len(labels) for labels in coords.values()):
+            raise ValueError("The shape of the values should match the length of the coordinates.")
+        
+        self.values = values
+        self.dims = tuple(coords.keys())
+        self.coords = {dim: np.asarray(labels) if dim == "Scenarios" else list(labels) for dim, labels in coords.items()}
+        self.index = {dim: pd.Index(labels) for dim, labels in coords.items()}
+        # Preallocated arrays holding the values and the scenarios of the cube in their first rows, see append_cube
+        self.buffers = None
+    
+    # Positions of labels along a dimension
+    def positions(self, dim: str, labels) -> np.ndarray:
+        
+        positions = self.index[dim].get_indexer(labels)
+        if (positions == -1).any():
+            raise ValueError(f"Some labels are not in the dimension {dim} of the cube.")
+        return positions
+    
+    # Select values by label, a scalar label removes the dimension and a list of labels keeps it
+    def sel(self, **labels) -> np.ndarray:
+        
+        values = self.values
+        # Select the dimensions from the last one, so that the axis of the other dimensions do not move
+        for axis in reversed(range(len(self.dims))):
+            dim = self.dims[axis]
+            if dim not in labels:
+                continue
+            if np.ndim(labels[dim]) == 0:
+                values = np.take(values, self.positions(dim, [labels[dim]])[0], axis=axis)
+            else:
+                values = np.take(values, self.positions(dim, labels[dim]), axis=axis)
+        return values
+    
+    # Cube with new coordinates for some dimensions, containing all the labels of the cube. The new combinations are NaN.
+    def reindex(self, **coords) -> "ResultsCube":
+        
+        coords = {dim: coords.get(dim, self.coords[dim]) for dim in self.dims}
+        targets = [pd.Index(coords[dim]).get_indexer(self.coords[dim]) for dim in self.dims]
+        if any((positions == -1).any() for positions in targets):
+            raise ValueError("The new coordinates should contain all the labels of the cube.")
+        values = np.full(tuple(len(labels) for labels in coords.values()), np.nan, dtype=self.values.dtype)
+        values[np.ix_(*targets)] = self.values
+        return ResultsCube(values, coords)
+    
+    # Convert the cube to a labelled xarray DataArray, xarray is only needed for this conversion
+    def to_xarray(self):
+        
+        import xarray as xr
+        return xr.DataArray(self.values, coords=self.coords, dims=self.dims)
+
+# Concatenate cubes along a dimension, the other dimensions take the union of the labels of the cubes (sorted, except the selections)
+def concat_cubes(cubes: list[ResultsCube], dim: str = "Scenarios") -> ResultsCube:
+    
+    dims = cubes[0].dims
+    coords = union_coords(cubes, dim)
+    cubes = [cube.reindex(**coords) for cube in cubes]
+    labels = np.concatenate([cube.coords[dim] for cube in cubes])
+    if len(np.unique(labels)) != len(labels):
+        raise ValueError(f"The cubes have common labels in the dimension {dim}.")
+    values = np.concatenate([cube.values for cube in cubes], axis=dims.index(dim))
+    return ResultsCube(values, {other: labels if other == dim else coords[other] for other in dims})
+
+# Union of the labels of the cubes for each dimension except dim (sorted, except the selections)
+def union_coords(cubes: list[ResultsCube], dim: str = "Scenarios") -> dict[str, list]:
+    
+    coords = {}
+    for other in cubes[0].dims:
+        if other == dim:
+            continue
+        labels = [cube.coords[other] for cube in cubes]
+        if all(list(label) == list(labels[0]) for label in labels):
+            coords[other] = labels[0]
+        elif other == "selection":
+            coords[other] = list(dict.fromkeys(label for cube_labels in labels for label in cube_labels))
+        else:
+            coords[other] = sorted(set().union(*labels))
+    return coords
+
+# Append the scenarios of a cube to a cube with the same dimensions, Scenarios being the first one. The values are written in place
+# in arrays preallocated with growth times the needed capacity, so that the cost of an append is the cost of the new scenarios (and of
+# the copy of the cube when the capacity is reached). The other dimensions take the union of their labels as in concat_cubes,
+# which copies the cube when a new label appears. The cube given is still valid, but only the returned cube can be appended to.
+def append_cube(cube: ResultsCube, new_cube: ResultsCube, growth: float = 1.5) -> ResultsCube:
+    
+    if cube.dims[0] != "Scenarios" or new_cube.dims != cube.dims:
+        raise ValueError("The cubes should have the same dimensions, with the scenarios first.")
+    if any(list(cube.coords[dim]) != list(new_cube.coords[dim]) for dim in cube.dims[1:]):
+        coords = union_coords([cube, new_cube])
+        if any(list(cube.coords[dim]) != list(coords[dim]) for dim in coords):
+            cube = cube.reindex(**coords)
+        new_cube = new_cube.reindex(**coords)
+    
+    n, m = len(cube.coords["Scenarios"]), len(new_cube.coords["Scenarios"])
+    buffers = cube.buffers
+    if buffers is None or buffers["size"] != n or len(buffers["scenarios"]) < n + m:
+        # Move the cube to new arrays with some free capacity
+        capacity = max(n + m, int(growth * (n + m)))
+        buffers = {"values": np.empty((capacity,) + cube.values.shape[1:], dtype=cube.values.dtype),
+                   "scenarios": np.empty(capacity, dtype=cube.coords["Scenarios"].dtype), "size": n}
+        buffers["values"][:n] = cube.values
+        buffers["scenarios"][:n] = cube.coords["Scenarios"]
+    buffers["values"][n:n+m] = new_cube.values
+    buffers["scenarios"][n:n+m] = new_cube.coords["Scenarios"]
+    buffers["size"] = n + m
+    
+    appended = ResultsCube(buffers["values"][:n+m], {dim: buffers["scenarios"][:n+m] if dim == "Scenarios" else cube.coords[dim] for dim in cube.dims})
+    appended.buffers = buffers
+    return appended
+
+# Traces of a precomputed violin at a position of a numeric x axis: the outline of the density estimated with numpy and
+# a box with the precomputed quartiles and fences. Only a fixed number of points is sent to the figure whatever the number of values.
+def precomputed_violin(values: np.ndarray, position: float, name: str, color: str, n_points: int = 200, width: float = 0.8) -> list:
+    
+    values = values[~np.isnan(values)]
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    lowerfence = values[values >= q1 - 1.5*iqr].min()
+    upperfence = values[values <= q3 + 1.5*iqr].max()
+    
+    grid, density = kde_curve(values, n_points)
+    half_width = width / 2 * density / density.max() if density.max() > 0 else np.zeros_like(density)
+    outline = go.Scatter(x=np.concatenate([position - half_width, (position + half_width)[::-1]]), y=np.concatenate([grid, grid[::-1]]),
+                         mode='lines', fill='toself', line=dict(color=color), name=name, legendgroup=name, hoverinfo='name')
+    box = go.Box(x=[position], q1=[q1], median=[median], q3=[q3], lowerfence=[lowerfence], upperfence=[upperfence],
+                 width=width/6, line_color=color, fillcolor='white', name=name, legendgroup=name, showlegend=False)
+    
+    return [outline, box]
+
+# Gaussian kernel density of values (Scott bandwidth) evaluated on a grid between the minimum and the maximum
+# The values are binned on a fine grid and the kernel is applied by convolution, so the cost is linear in the number of values
+def kde_curve(values: np.ndarray, n_points: int = 200, n_bins: int = 1024) -> tuple[np.ndarray, np.ndarray]:
+    
+    low, high = values.min(), values.max()
+    bandwidth = 1.06 * values.std() * len(values) ** (-1 / 5)
+    if bandwidth == 0 or high == low:
+        return np.array([low, high]), np.array([1.0, 1.0])
+    
+    # Bin the values on a grid extended by the kernel, then convolve with the gaussian kernel
+    edges = np.linspace(low - 3*bandwidth, high + 3*bandwidth, n_bins + 1)
+    counts, _ = np.histogram(values, bins=edges)
+    step = edges[1] - edges[0]
+    half_length = min(int(np.ceil(3*bandwidth/step)), n_bins//2 - 1)
+    offsets = np.arange(-half_length, half_length + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth)**2)
+    density = np.convolve(counts, kernel, mode='same') / (len(values) * bandwidth * np.sqrt(2*np.pi))
+    
+    centers = (edges[:-1] + edges[1:]) / 2
+    grid = np.linspace(low, high, n_points)
+    return grid, np.interp(grid, centers, density)
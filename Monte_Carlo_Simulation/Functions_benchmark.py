@@ -0,0 +1,282 @@
+import pandas as pd
+import numpy as np
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import gams.transfer as gt
+import logging
+from Functions_analysis import (MainResults_GSA, results_symbols, results_from_records, input_data_symbols, Parameters_names,
+                                RRR_to_CCC, EU, EU_North, EU_West, results_selections)
+from Functions_profiling import logger
+
+#%% ------------------------------- ###
+###    1. Synthetic data generator  ###
+### ------------------------------- ###
+
+# Technologies of the synthetic results (G, TECH_TYPE, COMMODITY, FFF), chosen to be found by all the results selections
+synthetic_technologies = [('GNR_PV', 'SOLAR-PV', 'ELECTRICITY', 'SUN'),
+                          ('GNR_WT_ONS', 'WIND-ON', 'ELECTRICITY', 'WIND'),
+                          ('GNR_WT_OFF', 'WIND-OFF', 'ELECTRICITY', 'WIND'),
+                          ('GNR_ELYS', 'ELECTROLYZER', 'HYDROGEN', 'ELECTRIC'),
+                          ('GNR_STEAM-REFORMING-CCS', 'STEAMREFORMING', 'HYDROGEN', 'NATGAS'),
+                          ('GNR_STEAM-REFORMING', 'STEAMREFORMING', 'HYDROGEN', 'NATGAS'),
+                          ('GNR_H2S', 'H2-STORAGE', 'HYDROGEN', 'HYDROGEN'),
+                          ('GNR_IMPORT_H2', 'IMPORT', 'HYDROGEN', 'IMPORT_H2'),
+                          ('GNR_CCGT', 'CONDENSING', 'ELECTRICITY', 'NATGAS')]
+
+synthetic_years = ['2030', '2040', '2050']
+
+# Regions of the synthetic results: one region of each EU country first, so that all the country groups have data, then the other regions
+def synthetic_regions(n_regions: int) -> list[str]:
+    first_regions = list({country: region for region, country in reversed(RRR_to_CCC.items()) if country in EU}.values())[::-1]
+    regions = first_regions + [region for region in RRR_to_CCC if region not in first_regions]
+    if n_regions > len(regions):
+        raise ValueError(f"The number of regions should be at most {len(regions)}.")
+    return regions[:n_regions]
+
+# Technologies of the synthetic results, the list is repeated with a suffix if more technologies than the list are asked
+def synthetic_tech_list(n_techs: int) -> list[tuple]:
+    techs = []
+    for k in range(n_techs):
+        G, tech_type, commodity, fuel = synthetic_technologies[k % len(synthetic_technologies)]
+        if k >= len(synthetic_technologies):
+            G = f"{G}_{k // len(synthetic_technologies)}"
+        techs.append((G, tech_type, commodity, fuel))
+    return techs
+
+# Records of the results symbols of one scenario file (or baseline file if n_scenarios is None), with the same schema as the
+# Balmorel results: the records are categorical columns and a value column, like the records of GAMS Transfer
+def synthetic_results_records(n_scenarios: int = None, n_regions: int = 10, n_techs: int = 9, density: float = 0.7,
+                              seed: int = 0) -> dict[str, pd.DataFrame]:
+
+    rng = np.random.default_rng(seed)
+    regions = np.array(synthetic_regions(n_regions))
+    countries = np.array([RRR_to_CCC[region] for region in regions])
+    techs = synthetic_tech_list(n_techs)
+    years = np.array(synthetic_years)
+    scenarios = np.array([f"scenario_{i}" for i in range(1, n_scenarios + 1)]) if n_scenarios is not None else np.array([None])
+
+    records = {}
+    for symbol, (table, columns) in results_symbols.items():
+        columns = columns if n_scenarios is not None else columns[1:]
+        if table in ["Hydrogen Transmission Capacity", "Hydrogen Transmission Flow"]:
+            # All the links between two different regions
+            s, y, e, i = [a.reshape(-1) for a in np.indices((len(scenarios), len(years), len(regions), len(regions)))]
+            keep = (e != i) & (rng.random(len(s)) < density / 2)
+            s, y, e, i = s[keep], y[keep], e[keep], i[keep]
+            data = {'Scenarios': scenarios[s], 'Y': years[y], 'C': countries[e], 'IRRRE': regions[e], 'IRRRI': regions[i],
+                    'VARIABLE_CATEGORY': 'ENDOGENOUS', 'UNITS': 'GW' if table == "Hydrogen Transmission Capacity" else 'TWh',
+                    'value': rng.gamma(2.0, 2.0, len(s))}
+        else:
+            s, y, r, t = [a.reshape(-1) for a in np.indices((len(scenarios), len(years), len(regions), len(techs)))]
+            keep = rng.random(len(s)) < density
+            s, y, r, t = s[keep], y[keep], r[keep], t[keep]
+            tech_columns = np.array(techs, dtype=object)[t]
+            data = {'Scenarios': scenarios[s], 'Y': years[y], 'C': countries[r], 'RRR': regions[r], 'AAA': np.char.add(regions[r], '_A'),
+                    'G': tech_columns[:, 0], 'FFF': tech_columns[:, 3], 'COMMODITY': tech_columns[:, 2], 'TECH_TYPE': tech_columns[:, 1],
+                    'VARIABLE_CATEGORY': 'ENDOGENOUS', 'UNITS': 'GW' if table != "Generation Production" else 'TWh',
+                    'value': rng.gamma(2.0, 5.0, len(s))}
+        df = pd.DataFrame({column: data[column] for column in columns})
+        for column in columns:
+            if column != 'value':
+                df[column] = df[column].astype('category')
+        records[symbol] = df
+
+    return records
+
+# Records of the symbols of the baseline input data file used by sample_input_data
+def synthetic_input_records(n_regions: int = 10, seed: int = 0) -> dict[str, pd.DataFrame]:
+
+    rng = np.random.default_rng(seed)
+    regions = synthetic_regions(n_regions)
+    years = synthetic_years
+    records = {
+        'CCS_CO2CAPTEFF_G': pd.DataFrame({'GGG': ['GNR_STEAM-REFORMING-CCS'], 'value': [0.9]}),
+        'DE': pd.DataFrame({'YYY': years, 'RRR': regions[0], 'DEUSER': 'RESE', 'value': rng.uniform(1e6, 2e6, len(years))}),
+        'EMI_POL': pd.DataFrame({'YYY': years, 'CCC': 'ALL', 'EMIPOLSET': 'TAX_CO2', 'value': np.linspace(80, 200, len(years))}),
+        'FUELPRICE': pd.DataFrame({'YYY': years, 'AAA': 'ALL', 'FFF': 'NATGAS', 'value': np.linspace(7, 10, len(years))}),
+        'GDATA_numerical': pd.DataFrame({'GGG': ['GNR_STEAM-REFORMING-CCS', 'GNR_STEAM-REFORMING'], 'GDATASET': 'GDINVCOST0', 'value': [1.5, 1.0]}),
+        'GDATA_categorical': pd.DataFrame({'GGG': ['GNR_STEAM-REFORMING-CCS'], 'GDATASET': 'GDTECHGROUP', 'value': ['STEAMREFORMING']}),
+        'HYDROGEN_DH2': pd.DataFrame({'YYY': years, 'CCCRRRAAA': regions[0], 'value': rng.uniform(1e5, 2e5, len(years))}),
+        'SUBTECHGROUPKPOT': pd.DataFrame({'CCCRRRAAA': np.repeat(regions, 3), 'TECH_GROUP': ['SOLARPV', 'WINDTURBINE_ONSHORE', 'WINDTURBINE_OFFSHORE'] * len(regions),
+                                          'value': rng.uniform(1e3, 5e4, 3 * len(regions))}),
+        'XH2INVCOST': pd.DataFrame({'YYY': years, 'IRRRE': regions[0], 'IRRRI': regions[-1], 'value': rng.uniform(0.5, 1.5, len(years))}),
+        'XINVCOST': pd.DataFrame({'YYY': years, 'IRRRE': regions[0], 'IRRRI': regions[-1], 'value': rng.uniform(0.5, 1.5, len(years))}),
+    }
+    return {symbol: records[symbol] for symbol in input_data_symbols}
+
+# Sample of the parameters (multipliers of the baseline), one row per scenario and one column per parameter
+def synthetic_sample(n_scenarios: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.uniform(0.5, 1.5, (n_scenarios, len(Parameters_names))))
+
+# Whether a GAMS installation is available to write GDX files
+def gams_available() -> bool:
+
+    try:
+        gt.Container()
+    except Exception:
+        return False
+    return True
+
+# Write records to a GDX file, return False if no GAMS installation is available to write it
+def write_synthetic_gdx(file_path: str, records: dict[str, pd.DataFrame]) -> bool:
+
+    try:
+        container = gt.Container()
+    except Exception:
+        return False
+    for symbol, df in records.items():
+        gt.Parameter(container, symbol, domain=['*'] * (df.shape[1] - 1), records=df)
+    container.write(file_path)
+    return True
+
+# Write a complete synthetic ensemble to a directory: one scenario and one baseline GDX file per model, the baseline input data
+# GDX file and the csv sample. Return the MainResults_GSA reading these files, or None if the GDX files cannot be written.
+def write_synthetic_ensemble(directory: str, n_scenarios: int, n_models: int = 2, n_regions: int = 10, n_techs: int = 9, seed: int = 0) -> MainResults_GSA:
+
+    if not gams_available():
+        return None
+    os.makedirs(directory, exist_ok=True)
+    scenario_files, baseline_files = [], []
+    for m in range(n_models):
+        scenario_files.append(f"synthetic_model_{m+1}.gdx")
+        baseline_files.append(f"synthetic_model_{m+1}_baseline.gdx")
+        if not write_synthetic_gdx(os.path.join(directory, scenario_files[-1]), synthetic_results_records(n_scenarios, n_regions, n_techs, seed=seed + 2*m)):
+            return None
+        write_synthetic_gdx(os.path.join(directory, baseline_files[-1]), synthetic_results_records(None, n_regions, n_techs, seed=seed + 2*m + 1))
+    write_synthetic_gdx(os.path.join(directory, "synthetic_input.gdx"), synthetic_input_records(n_regions, seed=seed))
+    synthetic_sample(n_scenarios, seed=seed).to_csv(os.path.join(directory, "synthetic_sample.csv"), header=False, index=False)
+
+    return MainResults_GSA(directory, scenario_files, baseline_files, [f"Model {m+1}" for m in range(n_models)],
+                           input_files=["synthetic_input.gdx", "synthetic_sample.csv"])
+
+# Records of a complete synthetic ensemble kept in memory: the results records of the scenario and baseline files of each model,
+# the records of the baseline input data and the sample
+def synthetic_ensemble_records(n_scenarios: int, n_models: int = 2, n_regions: int = 10, n_techs: int = 9, seed: int = 0) -> dict:
+
+    return {"results": [synthetic_results_records(n_scenarios if baseline is False else None, n_regions, n_techs, seed=seed + 2*m + baseline)
+                        for m in range(n_models) for baseline in [False, True]],
+            "input": synthetic_input_records(n_regions, seed=seed),
+            "sample": synthetic_sample(n_scenarios, seed=seed),
+            "model_names": [f"Model {m+1}" for m in range(n_models)]}
+
+# MainResults_GSA fed in memory with a synthetic ensemble, without any GDX file
+def synthetic_results(ensemble: dict, **import_options) -> MainResults_GSA:
+
+    model_names = ensemble["model_names"]
+    results = MainResults_GSA(".", [f"{name}.gdx" for name in model_names], [f"{name}_baseline.gdx" for name in model_names], model_names)
+    results.import_results_frames([results_from_records(records, baseline=k % 2 == 1) for k, records in enumerate(ensemble["results"])], **import_options)
+    results.import_input_data_frames(ensemble["input"], ensemble["sample"].copy())
+    return results
+
+#%% ------------------------------- ###
+###          2. Benchmarks          ###
+### ------------------------------- ###
+
+# Time a function (best of the repeats) and measure its peak memory with tracemalloc in a separate run
+def measure(function, repeats: int = 3) -> dict:
+
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"time": min(times), "peak_memory": peak}
+
+# Run the benchmarks of the main functions of MainResults_GSA for an ensemble size
+def run_benchmarks(n_scenarios: int, n_models: int = 2, n_regions: int = 10, n_techs: int = 9, repeats: int = 3, seed: int = 0) -> dict:
+
+    ensemble = synthetic_ensemble_records(n_scenarios, n_models, n_regions, n_techs, seed=seed)
+    results = synthetic_results(ensemble)
+    model = ensemble["model_names"][0]
+    countries = {"EU_North": EU_North, "EU_West": EU_West}
+
+    benchmarks = {
+        "import_results": lambda: synthetic_results(ensemble),
+        "get_results": lambda: [results.get_results(model, selection, EU, '2050') for selection in results_selections],
+        "sample_input_data": lambda: [results.sample_input_data(selection, EU, '2050') for selection in ["CO2_TAX", "NATGAS_P", "PV_LIMIT_NORTH"]],
+        "violin_plot": lambda: results.violin_plot("H2 Green Capacity", countries, '2050', show_baseline=True),
+        "correlation_plot": lambda: results.correlation_plot(model, ["CO2_TAX", "H2 Blue Capacity"], EU, '2050', color_selection="PV_POT_NORTH"),
+    }
+    measures = {name: measure(function, repeats=repeats) for name, function in benchmarks.items()}
+
+    # The GDX reading is only benchmarked if GAMS is available to write the files, in a temporary directory removed afterwards
+    if gams_available():
+        with tempfile.TemporaryDirectory(prefix="gsa_benchmark_") as directory:
+            gdx_results = write_synthetic_ensemble(directory, n_scenarios, n_models, n_regions, n_techs, seed=seed)
+            if gdx_results is not None:
+                measures["import_results_gdx"] = measure(gdx_results.import_results, repeats=repeats)
+
+    return measures
+
+# Compare benchmark results with a baseline, return the list of regressions
+def compare_benchmarks(results: dict, baseline: dict, time_tolerance: float = 1.5, memory_tolerance: float = 1.2) -> list[str]:
+
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, measures in benchmarks.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference is None:
+                continue
+            if measures["time"] > time_tolerance * reference["time"]:
+                regressions.append(f"{name} ({size} scenarios): {measures['time']:.3f} s against {reference['time']:.3f} s")
+            if measures["peak_memory"] > memory_tolerance * reference["peak_memory"]:
+                regressions.append(f"{name} ({size} scenarios): {measures['peak_memory']/1e6:.1f} MB against {reference['peak_memory']/1e6:.1f} MB")
+    return regressions
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmarks of MainResults_GSA on synthetic Balmorel-like results.")
+    parser.add_argument("--scenarios", type=int, nargs="+", default=[100, 1000, 10000], help="Numbers of scenarios to benchmark")
+    parser.add_argument("--models", type=int, default=2)
+    parser.add_argument("--regions", type=int, default=10)
+    parser.add_argument("--techs", type=int, default=9)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--baseline", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "benchmark_baseline.json"))
+    parser.add_argument("--output", default=None, help="File to write the results to")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=1.5)
+    parser.add_argument("--memory-tolerance", type=float, default=1.2)
+    args = parser.parse_args()
+    # Only the warnings of the analysis are printed during the benchmarks
+    logger.setLevel(logging.WARNING)
+
+    results = {}
+    for n_scenarios in args.scenarios:
+        results[str(n_scenarios)] = run_benchmarks(n_scenarios, args.models, args.regions, args.techs, repeats=args.repeats)
+        for name, measures in results[str(n_scenarios)].items():
+            print(f"{n_scenarios:>6} scenarios | {name:<20} | {measures['time']:8.3f} s | {measures['peak_memory']/1e6:9.1f} MB")
+
+    output = {"environment": {"python": sys.version.split()[0], "pandas": pd.__version__, "numpy": np.__version__, "machine": platform.machine(),
+                              "models": args.models, "regions": args.regions, "techs": args.techs},
+              "results": results}
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=1)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as file:
+            json.dump(output, file, indent=1)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare_benchmarks(results, baseline["results"], args.time_tolerance, args.memory_tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if len(regressions) != 0:
+            sys.exit(1)
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+#%% ------------------------------- ###
+###          0. Hard coded          ###
+### ------------------------------- ###
+
+# Statistics of the paired comparisons, in the order of the columns of the comparison tables
+comparison_statistics = ["n", "mean_A", "mean_B", "mean_difference", "std_difference", "CI_low", "CI_high", "median_difference",
+                         "ratio_of_means", "mean_ratio", "median_ratio", "win_rate", "tie_rate", "loss_rate", "t_pvalue", "sign_pvalue"]
+
+# Name of the reference of the comparisons of a model against its baseline (scenario 0)
+baseline_name = "Baseline"
+
+#%% ------------------------------- ###
+###       1. Paired statistics      ###
+### ------------------------------- ###
+
+# Median along an axis ignoring the NaN, with a sort of the whole array instead of one np.nanmedian call per slice
+def nan_median(values: np.ndarray, axis: int = -2) -> np.ndarray:
+
+    values = np.sort(values, axis=axis)
+    count = np.expand_dims((~np.isnan(values)).sum(axis=axis), axis)
+    low = np.take_along_axis(values, np.maximum((count - 1) // 2, 0), axis=axis)
+    high = np.take_along_axis(values, np.maximum(count // 2, 0), axis=axis)
+    return np.squeeze(np.where(count > 0, (low + high) / 2, np.nan), axis=axis)
+
+# Statistics of the paired differences A - B and ratios A / B over the scenarios, for arrays ... x scenarios x outputs
+# B can be broadcasted against A (for instance a baseline of size ... x 1 x outputs). Returns a dictionnary with, for each statistic
+# of comparison_statistics, an array ... x outputs:
+# - the mean difference with its confidence interval and the two-sided p-value of the paired t-test
+# - the win rate (share of the scenarios where A > B), the tie rate and the loss rate, with the two-sided p-value of the sign test
+#   (binomial test of the wins against the losses, the ties are discarded)
+# - the ratio of the means and the mean and median of the ratios over the scenarios where B is not 0
+def paired_statistics(A: np.ndarray, B: np.ndarray, confidence: float = 0.95) -> dict[str, np.ndarray]:
+
+    A, B = np.broadcast_arrays(np.asarray(A, dtype=np.float64), np.asarray(B, dtype=np.float64))
+    n = A.shape[-2]
+    if n < 2:
+        raise ValueError("At least 2 scenarios are needed to compare the models.")
+    D = A - B
+
+    output = {"n": np.full(D.shape[:-2] + D.shape[-1:], n), "mean_A": A.mean(axis=-2), "mean_B": B.mean(axis=-2)}
+    mean, std = D.mean(axis=-2), D.std(axis=-2, ddof=1)
+    se = std / np.sqrt(n)
+    half_width = stats.t.ppf(0.5 + confidence / 2, n - 1) * se
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.abs(mean) / se
+    # Without variance, the difference is significant if it is not 0
+    t_pvalue = np.where(se > 0, 2 * stats.t.sf(t, n - 1), np.where(mean == 0, 1.0, 0.0))
+    output.update({"mean_difference": mean, "std_difference": std, "CI_low": mean - half_width, "CI_high": mean + half_width,
+                   "median_difference": nan_median(D)})
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratios = np.where(B != 0, A / np.where(B != 0, B, 1), np.nan)
+        valid = (B != 0).sum(axis=-2)
+        output["ratio_of_means"] = np.where(output["mean_B"] != 0, output["mean_A"] / output["mean_B"], np.nan)
+        output["mean_ratio"] = np.where(valid > 0, np.nansum(ratios, axis=-2) / valid, np.nan)
+    output["median_ratio"] = nan_median(ratios)
+
+    wins, losses = (D > 0).sum(axis=-2), (D < 0).sum(axis=-2)
+    output.update({"win_rate": wins / n, "tie_rate": (n - wins - losses) / n, "loss_rate": losses / n,
+                   "t_pvalue": t_pvalue,
+                   "sign_pvalue": np.minimum(1.0, 2 * stats.binom.cdf(np.minimum(wins, losses), wins + losses, 0.5))})
+    return output
+
+# Paired statistics of pairs of models, for the values Y of size models x scenarios x outputs (the same scenarios for all the models)
+# pairs is a list of (A, B) positions of models, all the pairs A < B by default. The pairs are computed in chunks of at most
+# chunk_size values, each chunk in one vectorized pass. Returns a dictionnary of arrays pairs x outputs.
+def pairwise_statistics(Y: np.ndarray, pairs: list[tuple[int, int]] = None, confidence: float = 0.95,
+                        chunk_size: int = 2**24) -> dict[str, np.ndarray]:
+
+    if pairs is None:
+        pairs = list(zip(*np.triu_indices(Y.shape[0], 1)))
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    step = max(1, chunk_size // max(1, Y.shape[1] * Y.shape[2]))
+
+    chunks = []
+    for start in range(0, len(pairs), step):
+        chunk = pairs[start:start + step]
+        chunks.append(paired_statistics(Y[chunk[:, 0]], Y[chunk[:, 1]], confidence=confidence))
+    if len(chunks) == 0:
+        return {statistic: np.empty((0, Y.shape[2])) for statistic in comparison_statistics}
+    return {statistic: np.concatenate([chunk[statistic] for chunk in chunks]) for statistic in comparison_statistics}
+
+# Paired statistics of each model against its baseline, for the values Y of size models x scenarios x outputs and the baseline
+# values Y0 of size models x outputs. Returns a dictionnary of arrays models x outputs.
+def baseline_statistics(Y: np.ndarray, Y0: np.ndarray, confidence: float = 0.95) -> dict[str, np.ndarray]:
+    return paired_statistics(Y, np.asarray(Y0)[:, None, :], confidence=confidence)
+
+#%% ------------------------------- ###
+###       2. Comparison tables      ###
+### ------------------------------- ###
+
+# Tidy table of paired statistics, one row per (pair, output), with the models A and B of each pair and the outputs as columns
+def comparison_table(statistics: dict[str, np.ndarray], models_A: list[str], models_B: list[str], outputs: pd.DataFrame) -> pd.DataFrame:
+
+    p, m = statistics["n"].shape
+    table = outputs.iloc[np.tile(np.arange(m), p)].reset_index(drop=True)
+    table.insert(0, 'Model_B', np.repeat(models_B, m))
+    table.insert(0, 'Model_A', np.repeat(models_A, m))
+    for statistic in comparison_statistics:
+        table[statistic] = statistics[statistic].reshape(-1)
+    return table
+
+# Win rates of the models against each other for one output of a comparison table, as a matrix Model_A x Model_B
+# The win rate of B against A is the loss rate of A against B, so each pair is only needed in one direction
+def win_rate_matrix(table: pd.DataFrame, models: list[str] = None) -> pd.DataFrame:
+
+    table = table[table['Model_B'] != baseline_name]
+    if models is None:
+        models = list(dict.fromkeys(list(table['Model_A']) + list(table['Model_B'])))
+    if table.duplicated(['Model_A', 'Model_B']).any():
+        raise ValueError("The comparison table should be filtered on one output.")
+
+    index = pd.Index(models)
+    table = table[table['Model_A'].isin(models) & table['Model_B'].isin(models)]
+    A, B = index.get_indexer(table['Model_A']), index.get_indexer(table['Model_B'])
+    values = np.full((len(models), len(models)), np.nan)
+    values[A, B] = table['win_rate'].to_numpy()
+    values[B, A] = table['loss_rate'].to_numpy()
+    return pd.DataFrame(values, index=index.rename('Model_A'), columns=index.rename('Model_B'))
@@ -0,0 +1,192 @@
+import pandas as pd
+import numpy as np
+
+#%% ------------------------------- ###
+###       1. Streaming statistics   ###
+### ------------------------------- ###
+
+# Running mean and variance of several outputs with the Welford algorithm, updated with one scenario at a time
+class RunningMoments:
+    def __init__(self, n_outputs: int):
+
+        self.count = 0
+        self.mean = np.zeros(n_outputs)
+        self.M2 = np.zeros(n_outputs)
+
+    def update(self, values: np.ndarray) -> None:
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.M2 += delta * (values - self.mean)
+
+    def variance(self) -> np.ndarray:
+        if self.count < 2:
+            return np.full(self.mean.shape, np.nan)
+        return self.M2 / (self.count - 1)
+
+# Approximate quantiles of several outputs with the P-square algorithm (Jain and Chlamtac, 1985), updated with one scenario at a time
+# Each (output, quantile) pair is estimated with 5 markers, so the memory does not depend on the number of scenarios.
+# The markers of all the pairs are updated at once with arrays of size outputs x quantiles x 5.
+class P2Quantiles:
+    def __init__(self, n_outputs: int, quantiles: list[float]):
+
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        if ((self.quantiles <= 0) | (self.quantiles >= 1)).any():
+            raise ValueError("The quantiles should be between 0 and 1.")
+        p = self.quantiles[:, None]
+        self.count = 0
+        self.first_values = np.empty((n_outputs, 5))
+        self.heights = np.empty((n_outputs, len(self.quantiles), 5))
+        self.positions = np.tile(np.arange(1, 6, dtype=np.float64), (n_outputs, len(self.quantiles), 1))
+        self.desired = np.tile(np.hstack([np.ones_like(p), 1 + 2*p, 1 + 4*p, 3 + 2*p, 5 * np.ones_like(p)]), (n_outputs, 1, 1))
+        self.increments = np.hstack([np.zeros_like(p), p/2, p, (1 + p)/2, np.ones_like(p)])
+
+    def update(self, values: np.ndarray) -> None:
+
+        # The first 5 values of each output are the initial markers
+        if self.count < 5:
+            self.first_values[:, self.count] = values
+            self.count += 1
+            if self.count == 5:
+                self.heights[:] = np.sort(self.first_values, axis=1)[:, None, :]
+            return
+        self.count += 1
+
+        x = np.broadcast_to(values[:, None], self.heights.shape[:2])
+        q, n = self.heights, self.positions
+        # Cell of the new value, the extreme markers are moved if the value is outside of them
+        q[..., 0] = np.minimum(q[..., 0], x)
+        q[..., 4] = np.maximum(q[..., 4], x)
+        cell = np.clip((x[..., None] >= q[..., 1:4]).sum(axis=-1), 0, 3)
+        n += np.arange(5) > cell[..., None]
+        self.desired += self.increments
+
+        # Adjust the heights of the middle markers if they are too far from their desired positions
+        for i in range(1, 4):
+            d = self.desired[..., i] - n[..., i]
+            move = ((d >= 1) & (n[..., i+1] - n[..., i] > 1)) | ((d <= -1) & (n[..., i-1] - n[..., i] < -1))
+            if not move.any():
+                continue
+            ds = np.sign(d) * move
+            with np.errstate(invalid='ignore', divide='ignore'):
+                parabolic = q[..., i] + ds / (n[..., i+1] - n[..., i-1]) * ((n[..., i] - n[..., i-1] + ds) * (q[..., i+1] - q[..., i]) / (n[..., i+1] - n[..., i])
+                                                                          + (n[..., i+1] - n[..., i] - ds) * (q[..., i] - q[..., i-1]) / (n[..., i] - n[..., i-1]))
+                neighbour = np.where(ds > 0, i + 1, i - 1)
+                q_neighbour = np.take_along_axis(q, neighbour[..., None], axis=-1)[..., 0]
+                n_neighbour = np.take_along_axis(n, neighbour[..., None], axis=-1)[..., 0]
+                linear = q[..., i] + ds * (q_neighbour - q[..., i]) / (n_neighbour - n[..., i])
+            parabolic_ok = (q[..., i-1] < parabolic) & (parabolic < q[..., i+1])
+            q[..., i] = np.where(move, np.where(parabolic_ok, parabolic, linear), q[..., i])
+            n[..., i] += ds
+
+    # Current estimates, an array outputs x quantiles. The exact quantiles are used for less than 5 scenarios.
+    def estimates(self) -> np.ndarray:
+        if self.count == 0:
+            return np.full(self.heights.shape[:2], np.nan)
+        if self.count < 5:
+            return np.quantile(self.first_values[:, :self.count], self.quantiles, axis=1).T
+        return self.heights[..., 2].copy()
+
+#%% ------------------------------- ###
+###     2. Convergence monitor      ###
+### ------------------------------- ###
+
+# Convergence of the mean, the standard deviation and some quantiles of the outputs of a model, updated scenario by scenario
+# The statistics are recorded at checkpoints spaced geometrically (growth), so the curves have O(log n) points and the memory
+# of the statistics is constant. outputs describes the outputs, one row per output.
+class ConvergenceMonitor:
+    def __init__(self, outputs: pd.DataFrame, quantiles: list[float] = [0.05, 0.95], growth: float = 1.05, min_step: int = 10):
+
+        if growth <= 1:
+            raise ValueError("The growth of the checkpoints should be larger than 1.")
+
+        self.outputs = outputs.reset_index(drop=True)
+        self.quantiles = list(quantiles)
+        self.growth = growth
+        self.min_step = min_step
+        self.moments = RunningMoments(len(self.outputs))
+        self.sketch = P2Quantiles(len(self.outputs), self.quantiles)
+        self.next_checkpoint = 1
+        self.curves = []
+
+    @property
+    def count(self) -> int:
+        return self.moments.count
+
+    # Update the statistics with the outputs of one scenario
+    def update(self, values: np.ndarray) -> None:
+
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != (len(self.outputs),):
+            raise ValueError("The number of values should be the number of outputs.")
+        self.moments.update(values)
+        self.sketch.update(values)
+        if self.count >= self.next_checkpoint:
+            self.checkpoint()
+            self.next_checkpoint = max(self.count + 1, int(np.ceil(self.count * self.growth)), min(self.count + self.min_step, self.count * 2))
+
+    # Update the statistics with several scenarios, one after the other, the rows of values are the scenarios
+    def update_many(self, values: np.ndarray) -> None:
+        for row in values:
+            self.update(row)
+
+    # Record the current statistics in the convergence curves
+    def checkpoint(self) -> None:
+        if len(self.curves) != 0 and self.curves[-1]["n"] == self.count:
+            return
+        self.curves.append({"n": self.count, "mean": self.moments.mean.copy(), "std": np.sqrt(self.moments.variance()),
+                            "quantiles": self.sketch.estimates()})
+
+    # Current statistics of each output
+    def statistics(self) -> pd.DataFrame:
+        df = self.outputs.copy()
+        df["n"] = self.count
+        df["mean"] = self.moments.mean
+        df["std"] = np.sqrt(self.moments.variance())
+        df["mean_CI"] = 1.96 * df["std"] / np.sqrt(max(self.count, 1))
+        for j, quantile in enumerate(self.quantiles):
+            df[f"q{quantile:g}"] = self.sketch.estimates()[:, j]
+        return df
+
+    # Convergence curves: the statistics of each output at each checkpoint, in a long table
+    def curves_table(self) -> pd.DataFrame:
+        self.checkpoint()
+        tables = []
+        for curve in self.curves:
+            df = self.outputs.copy()
+            df["n"] = curve["n"]
+            df["mean"] = curve["mean"]
+            df["std"] = curve["std"]
+            for j, quantile in enumerate(self.quantiles):
+                df[f"q{quantile:g}"] = curve["quantiles"][:, j]
+            tables.append(df)
+        return pd.concat(tables, ignore_index=True)
+
+    # Stop criteria of each output: the mean and the quantiles have changed by less than rtol (relative to their current value, or to the
+    # standard deviation if it is larger) over the checkpoints of the last window fraction of the scenarios, and the 95% confidence
+    # interval of the mean is smaller than rtol times the mean. converged_at is the number of scenarios since which the criteria hold.
+    def status(self, rtol: float = 0.01, window: float = 0.2, min_scenarios: int = 50) -> pd.DataFrame:
+        self.checkpoint()
+        n = np.array([curve["n"] for curve in self.curves])
+        stats = np.stack([np.column_stack([curve["mean"], curve["quantiles"]]) for curve in self.curves]) # checkpoints x outputs x statistics
+        std = np.stack([curve["std"] for curve in self.curves])
+
+        criteria = np.zeros((len(n), len(self.outputs)), dtype=bool)
+        for t in range(len(n)):
+            if n[t] < min_scenarios:
+                continue
+            recent = n >= (1 - window) * n[t]
+            recent[t+1:] = False
+            scale = np.maximum(np.abs(stats[t]), np.nan_to_num(std[t])[:, None]) + 1e-12
+            change = (np.abs(stats[recent] - stats[t]) / scale).max(axis=(0, 2))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ci = 1.96 * np.nan_to_num(std[t]) / np.sqrt(n[t]) / (np.abs(stats[t, :, 0]) + 1e-12)
+            criteria[t] = (change <= rtol) & (ci <= rtol)
+
+        df = self.statistics()
+        df["converged"] = criteria[-1]
+        # Checkpoint from which the criteria hold until now
+        since = len(n) - np.argmax(~criteria[::-1], axis=0)
+        since[criteria.all(axis=0)] = 0
+        df["converged_at"] = np.where(criteria[-1], n[np.minimum(since, len(n) - 1)], np.nan)
+        return df
@@ -0,0 +1,266 @@
+import pandas as pd
+import numpy as np
+
+#%% ------------------------------- ###
+###            1. Bitmaps           ###
+### ------------------------------- ###
+
+# A bitmap of n scenarios is an array of (n + 63) // 64 unsigned 64 bits words, the bit i of the word w is the scenario w * 64 + i
+# The bitmaps are combined with the numpy operators & and |, and inverted with ScenarioIndex.invert (to keep the padding bits at 0)
+
+def bitmap_from_mask(mask: np.ndarray) -> np.ndarray:
+
+    packed = np.packbits(np.asarray(mask, dtype=bool), bitorder='little')
+    words = np.zeros(((len(mask) + 63) // 64) * 8, dtype=np.uint8)
+    words[:len(packed)] = packed
+    return words.view('<u8')
+
+def mask_from_bitmap(bitmap: np.ndarray, n: int) -> np.ndarray:
+
+    return np.unpackbits(bitmap.view(np.uint8), bitorder='little', count=n).astype(bool)
+
+# Set the bits of some positions in a copy of a bitmap
+def bitmap_set(bitmap: np.ndarray, positions: np.ndarray) -> np.ndarray:
+
+    mask = np.zeros(len(bitmap) * 64, dtype=bool)
+    mask[positions] = True
+    return bitmap | np.packbits(mask, bitorder='little').view('<u8')
+
+# Number of scenarios of a bitmap, np.bitwise_count needs NumPy 2.0 or later and the bits are unpacked with older versions
+def bitmap_count(bitmap: np.ndarray) -> int:
+
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(bitmap).sum())
+    return int(np.unpackbits(bitmap.view(np.uint8)).sum(dtype=np.int64))
+
+#%% ------------------------------- ###
+###         2. Scenario index       ###
+### ------------------------------- ###
+
+# Operators of the predicates of ScenarioIndex.query
+predicate_operators = ["<", "<=", ">", ">=", "==", "!=", "between"]
+
+# Bitmap index of the scenarios over the columns of a table (parameters and outputs), to answer compound predicates on the columns
+# Each column is sorted once and split in n_bins bins of the same number of scenarios, with the bitmap of the scenarios below each bin.
+# A threshold on a column is the bitmap below its bin, plus the few scenarios of the bin below the threshold (found in the sorted
+# values), so a predicate costs a binary search and the setting of at most n / n_bins bits. The bitmaps of the predicates are cached.
+class ScenarioIndex:
+    def __init__(self, values: np.ndarray, columns: list[str], scenarios: np.ndarray = None, parameters: list[str] = None, n_bins: int = 32):
+
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != len(columns):
+            raise ValueError("The values should be a matrix with one column per column name.")
+        self.n = values.shape[0]
+        self.columns = list(columns)
+        self.positions = {column: j for j, column in enumerate(self.columns)}
+        self.scenarios = np.arange(self.n) if scenarios is None else np.asarray(scenarios)
+        self.parameters = [column for column in self.columns if parameters is None or column in parameters]
+        self.values = values
+        self.all = bitmap_from_mask(np.ones(self.n, dtype=bool))
+        self.cache = {}
+
+        # Sorted values of each column (NaN at the end), and bitmaps of the scenarios below the start of each bin
+        self.order = np.argsort(values, axis=0, kind='stable')
+        self.sorted_values = np.take_along_axis(values, self.order, axis=0)
+        self.valid_counts = (~np.isnan(values)).sum(axis=0)
+        self.bin_starts = np.unique(np.linspace(0, self.n, max(n_bins, 1) + 1).astype(np.int64))[:-1]
+        self.below = np.empty((len(self.columns), len(self.bin_starts), len(self.all)), dtype=np.uint64)
+        for j in range(len(self.columns)):
+            ranks = np.empty(self.n, dtype=np.int64)
+            ranks[self.order[:, j]] = np.arange(self.n)
+            for b, start in enumerate(self.bin_starts):
+                self.below[j, b] = bitmap_from_mask(ranks < start)
+        # Scenarios with a value (not NaN) in each column
+        self.valid = np.stack([self._first_sorted(j, self.valid_counts[j]) for j in range(len(self.columns))]) if len(self.columns) != 0 else None
+
+    # Position of a column: its exact name, or the only output whose name starts with it ("H2 Blue Capacity|EU_West")
+    def column(self, name: str) -> int:
+
+        if name in self.positions:
+            return self.positions[name]
+        matches = [column for column in self.columns if column.startswith(f"{name}|")]
+        if len(matches) != 1:
+            raise ValueError(f"The column {name} is not in the index." if len(matches) == 0 else
+                             f"The column {name} is ambiguous, please use one of {', '.join(matches)}.")
+        return self.positions[matches[0]]
+
+    # Bitmap of the scenarios among the first k scenarios of the sorted column j
+    def _first_sorted(self, j: int, k: int) -> np.ndarray:
+
+        b = np.searchsorted(self.bin_starts, k, side='right') - 1
+        return bitmap_set(self.below[j, b], self.order[self.bin_starts[b]:k, j])
+
+    # Bitmap of the scenarios satisfying a predicate on a column, the scenarios with a NaN value never satisfy it
+    def predicate(self, column: str, operator: str, value) -> np.ndarray:
+
+        key = (column, operator, value if np.ndim(value) == 0 else tuple(value))
+        if key in self.cache:
+            return self.cache[key]
+        if operator not in predicate_operators:
+            raise ValueError(f"The operator {operator} is not available. Please use one of {', '.join(predicate_operators)}.")
+        j = self.column(column)
+        sorted_values = self.sorted_values[:, j]
+        valid = self.valid[j]
+        below = lambda value: self._first_sorted(j, np.searchsorted(sorted_values, value, side='left'))
+        below_or_equal = lambda value: self._first_sorted(j, np.searchsorted(sorted_values, value, side='right'))
+
+        if operator == "<":
+            bitmap = below(value)
+        elif operator == "<=":
+            bitmap = below_or_equal(value)
+        elif operator == ">":
+            bitmap = valid & ~below_or_equal(value)
+        elif operator == ">=":
+            bitmap = valid & ~below(value)
+        elif operator == "==":
+            bitmap = below_or_equal(value) & ~below(value)
+        elif operator == "!=":
+            bitmap = valid & ~(below_or_equal(value) & ~below(value))
+        else:
+            low, high = value
+            bitmap = below_or_equal(high) & ~below(low)
+        self.cache[key] = bitmap
+        return bitmap
+
+    # Bitmap of the scenarios satisfying all (combine "and") or any (combine "or") of the conditions
+    # A condition is a predicate (column, operator, value), with a (low, high) value for "between", or a bitmap
+    def query(self, conditions: list, combine: str = "and") -> np.ndarray:
+
+        if combine not in ["and", "or"]:
+            raise ValueError("The conditions should be combined with and or or.")
+        bitmap = self.all.copy() if combine == "and" else np.zeros_like(self.all)
+        for condition in conditions:
+            condition_bitmap = condition if isinstance(condition, np.ndarray) else self.predicate(*condition)
+            if combine == "and":
+                bitmap &= condition_bitmap
+            else:
+                bitmap |= condition_bitmap
+        return bitmap
+
+    def invert(self, bitmap: np.ndarray) -> np.ndarray:
+
+        return self.all & ~bitmap
+
+    def count(self, bitmap: np.ndarray) -> int:
+
+        return bitmap_count(bitmap)
+
+    def mask(self, bitmap: np.ndarray) -> np.ndarray:
+
+        return mask_from_bitmap(bitmap, self.n)
+
+    # Scenario ids of a bitmap
+    def scenarios_of(self, bitmap: np.ndarray) -> np.ndarray:
+
+        return self.scenarios[self.mask(bitmap)]
+
+    # Rows of the values of the scenarios of a bitmap
+    def frame(self, bitmap: np.ndarray = None) -> pd.DataFrame:
+
+        mask = np.ones(self.n, dtype=bool) if bitmap is None else self.mask(bitmap)
+        df = pd.DataFrame(self.values[mask], columns=self.columns)
+        df.insert(0, 'Scenarios', self.scenarios[mask])
+        return df
+
+    # Boxes of the parameters which best explain a target, with PRIM (see prim_boxes). The target is a bitmap, some conditions
+    # of query or a boolean array of the scenarios.
+    def prim(self, target, parameters: list[str] = None, alpha: float = 0.05, min_support: float = 0.05, min_coverage: float = 0.5,
+             n_boxes: int = 1) -> tuple[pd.DataFrame, pd.DataFrame]:
+
+        if isinstance(target, list):
+            target = self.query(target)
+        y = self.mask(target) if target.dtype != bool else target
+        parameters = self.parameters if parameters is None else parameters
+        X = self.values[:, [self.column(parameter) for parameter in parameters]]
+        return prim_boxes(X, y, parameters, alpha=alpha, min_support=min_support, min_coverage=min_coverage, n_boxes=n_boxes)
+
+#%% ------------------------------- ###
+###              3. PRIM            ###
+### ------------------------------- ###
+
+# Peeling trajectory of the Patient Rule Induction Method (Friedman and Fisher, 1999) for a boolean target y
+# At each step, the box is peeled by the fraction alpha of its scenarios on the low or the high side of one parameter, the peel which
+# gives the highest density of the target in the remaining box. All the candidate peels of a step are evaluated at once: the boxes of
+# the 2 x parameters candidates are the columns of a boolean matrix and their densities a matrix product with the target.
+# The peeling stops when the box would hold less than min_support of the scenarios. Returns the boxes (low and high limits) of each step.
+def prim_peel(X: np.ndarray, y: np.ndarray, alpha: float = 0.05, min_support: float = 0.05, n_total: int = None) -> list[dict]:
+
+    n, p = X.shape
+    n_total = n if n_total is None else n_total
+    inside = np.ones(n, dtype=bool)
+    low, high = np.full(p, -np.inf), np.full(p, np.inf)
+    y = y.astype(np.float64)
+    trajectory = [{"low": low.copy(), "high": high.copy(), "inside": inside.copy()}]
+
+    while True:
+        X_inside, y_inside = X[inside], y[inside]
+        q_low, q_high = np.quantile(X_inside, [alpha, 1 - alpha], axis=0)
+        candidates = np.concatenate([X_inside >= q_low, X_inside <= q_high], axis=1)
+        counts = candidates.sum(axis=0)
+        # A peel should remove some scenarios and keep at least min_support of all the scenarios
+        valid = (counts < len(y_inside)) & (counts >= min_support * n_total) & (counts > 0)
+        if not valid.any():
+            break
+        with np.errstate(invalid='ignore', divide='ignore'):
+            densities = np.where(valid, y_inside @ candidates / counts, -np.inf)
+        best = np.argmax(densities)
+        j = best % p
+        if best < p:
+            low[j] = q_low[j]
+        else:
+            high[j] = q_high[j]
+        inside[inside] = candidates[:, best]
+        trajectory.append({"low": low.copy(), "high": high.copy(), "inside": inside.copy()})
+    return trajectory
+
+# Boxes of the parameters which best explain a boolean target, found with PRIM. For each box, the peeling trajectory is computed and the
+# box with the highest density among the boxes covering at least min_coverage of the target (left to explain) is selected. The next
+# boxes are searched in the scenarios outside the previous boxes (covering), until n_boxes or no target is left.
+# The coverage is the fraction of the target scenarios in the box, the density the fraction of the scenarios of the box in the target
+# and the support the fraction of all the scenarios in the box. Returns the limits of the restricted parameters of the selected boxes
+# (one row per box and parameter) and the trajectories (one row per box and step).
+def prim_boxes(X: np.ndarray, y: np.ndarray, parameters: list[str], alpha: float = 0.05, min_support: float = 0.05,
+               min_coverage: float = 0.5, n_boxes: int = 1) -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=bool)
+    if X.shape[0] != len(y):
+        raise ValueError("The parameters and the target should have the same number of scenarios.")
+    if not 0 < alpha < 0.5:
+        raise ValueError("The peeling fraction alpha should be between 0 and 0.5.")
+    n, total_target = len(y), y.sum()
+    if total_target == 0:
+        raise ValueError("No scenario satisfies the target.")
+
+    remaining = np.ones(n, dtype=bool)
+    limits, trajectories = [], []
+    for box in range(1, n_boxes + 1):
+        if y[remaining].sum() == 0:
+            break
+        trajectory = prim_peel(X[remaining], y[remaining], alpha=alpha, min_support=min_support, n_total=n)
+        y_remaining = y[remaining]
+        stats = pd.DataFrame({"Box": box, "step": np.arange(len(trajectory)),
+                              "support": [step["inside"].sum() / n for step in trajectory],
+                              "coverage": [y_remaining[step["inside"]].sum() / total_target for step in trajectory],
+                              "density": [y_remaining[step["inside"]].mean() for step in trajectory],
+                              "restricted": [int((np.isfinite(step["low"]) | np.isfinite(step["high"])).sum()) for step in trajectory]})
+        # Box with the highest density covering enough of the target left, the largest one in case of a tie
+        left_coverage = stats["coverage"] * total_target / y_remaining.sum()
+        eligible = stats[left_coverage >= min_coverage] if (left_coverage >= min_coverage).any() else stats.iloc[:1]
+        selected = int(eligible.sort_values(["density", "support"], ascending=False, kind='stable')["step"].iloc[0])
+        stats["selected"] = stats["step"] == selected
+        trajectories.append(stats)
+
+        step = trajectory[selected]
+        restricted = np.isfinite(step["low"]) | np.isfinite(step["high"])
+        box_stats = stats.loc[selected, ["support", "coverage", "density"]].to_dict()
+        for j in np.flatnonzero(restricted):
+            limits.append({"Box": box, "Parameter": parameters[j], "low": step["low"][j], "high": step["high"][j], **box_stats})
+        if not restricted.any():
+            break
+        # The next box explains the scenarios outside of this box
+        positions = np.flatnonzero(remaining)
+        remaining[positions[step["inside"]]] = False
+
+    limits = pd.DataFrame(limits, columns=["Box", "Parameter", "low", "high", "support", "coverage", "density"])
+    return limits, pd.concat(trajectories, ignore_index=True)
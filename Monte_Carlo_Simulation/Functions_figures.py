@@ -0,0 +1,339 @@
+import pandas as pd
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+from Functions_analysis import (MainResults_GSA, geography_groups, results_selections, input_data_selections,
+                                results_and_input_data_selections_dict, country_groups, query_key)
+from Functions_profiling import log_event
+
+#%% ------------------------------- ###
+###          0. Hard coded          ###
+### ------------------------------- ###
+
+# Keys of the specs of each plot which are expanded when they are lists: one figure per combination of their values
+# The other keys are passed to the plotting function (show_baseline, large_ensemble, ...)
+plot_grid_axes = {"violin": ["selection", "countries", "year"],
+                  "correlation": ["model", "x", "y", "color", "countries", "year"]}
+
+# Keys needed by the specs of each plot
+plot_grid_required = {"violin": ["selection", "countries", "year"],
+                      "correlation": ["model", "x", "y", "countries", "year"]}
+
+plot_grid_formats = ["html", "json"]
+
+# File of the fingerprints of the figures of the previous runs, in the output directory
+plot_grid_manifest = "plot_grid_manifest.json"
+
+#%% ------------------------------- ###
+###          1. Plot grid           ###
+### ------------------------------- ###
+
+# A plot grid is a JSON or YAML file (or dictionnary) such as
+#   {"output_dir": "figures", "formats": ["html", "json"],
+#    "figures": [{"plot": "violin", "selection": ["H2 Green Capacity", "H2 Blue Capacity"], "countries": ["EU_North", "EU_West"],
+#                 "year": [2030, 2050], "show_baseline": true},
+#                {"plot": "correlation", "model": "Model 1", "x": "CO2_TAX", "y": ["H2 Green Production", "H2 Blue Production"],
+#                 "countries": "EU", "year": 2050}]}
+# The lists are expanded in one figure per combination. A dictionnary is not expanded: for violin plots, a selection dictionnary gives
+# the subplots and a countries dictionnary {name: group or list of countries} gives several groups in the same figure.
+# An optional "name" gives the file name of the figures, formatted with the values of the spec ("{selection}_{year}").
+# An optional "results" section is used by the command line to load the results (see results_from_grid).
+
+# Read a JSON or a YAML file as a dictionnary, YAML needs pyyaml
+def load_config_file(file_path: str) -> dict:
+
+    with open(file_path, 'r') as file:
+        if file_path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Reading a YAML file requires pyyaml. Please install it or use a JSON file.")
+            config = yaml.safe_load(file)
+        elif file_path.lower().endswith(".json"):
+            config = json.load(file)
+        else:
+            raise ValueError("The file should be a .json or a .yaml file.")
+    if not isinstance(config, dict):
+        raise ValueError("The file should contain a dictionnary.")
+    return config
+
+# Read a plot grid from a JSON or a YAML file
+def load_plot_grid(file_path: str) -> dict:
+
+    grid = load_config_file(file_path)
+    if "figures" not in grid:
+        raise ValueError("The plot grid should contain a list of figures.")
+    return grid
+
+# Expand the specs of a plot grid in the specs of single figures, with their name
+def expand_plot_grid(grid: Union[dict, list]) -> list[dict]:
+
+    figures = grid["figures"] if isinstance(grid, dict) else grid
+    specs = []
+    for figure in figures:
+        plot = figure.get("plot")
+        if plot not in plot_grid_axes:
+            raise ValueError(f"The plot {plot} is not available. Please use violin or correlation.")
+        missing = [key for key in plot_grid_required[plot] if key not in figure]
+        if len(missing) != 0:
+            raise ValueError(f"The {plot} specs should contain {', '.join(missing)}.")
+        axes = [axis for axis in plot_grid_axes[plot] if isinstance(figure.get(axis), list)]
+        for values in itertools.product(*[figure[axis] for axis in axes]):
+            spec = dict(figure)
+            spec.update(zip(axes, values))
+            # The years of the results are strings
+            spec["year"] = str(spec["year"])
+            spec["name"] = figure_name(spec)
+            specs.append(spec)
+
+    names = [spec["name"] for spec in specs]
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if len(duplicates) != 0:
+        raise ValueError(f"Several figures of the plot grid have the same name: {', '.join(duplicates)}. Please give them a name.")
+    return specs
+
+# File name of a figure, from the name template of the spec or from its plot and expanded values
+def figure_name(spec: dict) -> str:
+
+    label = lambda value: "-".join(value.keys()) if isinstance(value, dict) else str(value)
+    if "name" in spec:
+        name = spec["name"].format(**{key: label(value) for key, value in spec.items() if key != "name"})
+    else:
+        name = "_".join([spec["plot"]] + [label(spec[axis]) for axis in plot_grid_axes[spec["plot"]] if spec.get(axis) is not None])
+    return re.sub(r"[^A-Za-z0-9.-]+", "_", name).strip("_")
+
+# Countries of a spec: a named group (the groups of the results, see geography_groups) or a country,
+# or a dictionnary of groups, countries or lists of countries
+def resolve_countries(value: Union[str, list, dict], groups: dict[str, list[str]] = geography_groups) -> Union[list[str], dict]:
+
+    if isinstance(value, dict):
+        return {name: resolve_countries(countries, groups) for name, countries in value.items()}
+    if isinstance(value, list):
+        return list(value)
+    return list(groups.get(value, [value]))
+
+#%% ------------------------------- ###
+###            2. Queries           ###
+### ------------------------------- ###
+
+# Queries of get_results and sample_input_data needed by a figure, as (key, method, arguments), models are the models of the results
+def figure_queries(spec: dict, models: list[str], groups: dict[str, list[str]] = geography_groups) -> list[tuple]:
+
+    Countries = resolve_countries(spec["countries"], groups)
+    YEAR = spec["year"]
+    queries = []
+    if spec["plot"] == "violin":
+        selection = spec["selection"]
+        selections = [select for selects in selection.values() for select in selects] if isinstance(selection, dict) else [selection]
+        for select in selections:
+            for countries in country_groups(Countries).values():
+                for model in spec.get("models", models):
+                    queries.append(results_query(model, select, countries, YEAR))
+    else:
+        groups = country_groups(Countries)
+        if len(groups) != 1:
+            raise ValueError("The correlation plots should have one group of countries.")
+        countries = next(iter(groups.values()))
+        for axis in ["x", "y", "color"]:
+            select = spec.get(axis)
+            if select is None:
+                continue
+            if select in input_data_selections:
+                queries.append(input_query(select, countries, YEAR))
+            elif select in results_selections:
+                queries.append(results_query(spec["model"], select, countries, YEAR))
+            elif select in results_and_input_data_selections_dict:
+                results_select, input_select = results_and_input_data_selections_dict[select]
+                queries.append(results_query(spec["model"], results_select, countries, YEAR))
+                queries.append(input_query(input_select, countries, YEAR))
+            else:
+                raise ValueError(f"The selection {select} is not correct.")
+    return list({query[0]: query for query in queries}.values())
+
+def results_query(model: str, selection: str, Countries: list[str], YEAR: str) -> tuple:
+    return (query_key("results", selection, Countries, YEAR, model), "get_results", (model, selection, list(Countries), YEAR))
+
+def input_query(selection: str, Countries: list[str], YEAR: str) -> tuple:
+    return (query_key("input", selection, Countries, YEAR), "sample_input_data", (selection, list(Countries), YEAR))
+
+# Run each query once, the queries which fail are missing from the output and the figures log that their data is missing
+def run_queries(results: MainResults_GSA, queries: list[tuple]) -> dict[tuple, pd.DataFrame]:
+
+    outputs = {}
+    for key, method, arguments in queries:
+        if key in outputs:
+            continue
+        try:
+            outputs[key] = getattr(results, method)(*arguments)
+        except ValueError as error:
+            log_event(f"The query {method}{arguments} failed: {error}", "plot_grid_query", model=key[1], selection=key[2])
+    return outputs
+
+# Fingerprint of a figure: its spec, the output formats and the data of its queries
+def figure_fingerprint(spec: dict, formats: list[str], keys: list[tuple], hashes: dict[tuple, str]) -> str:
+
+    fingerprint = hashlib.sha256(json.dumps([spec, formats], sort_keys=True, default=str).encode())
+    for key in keys:
+        fingerprint.update(repr(key).encode())
+        fingerprint.update(hashes.get(key, "missing").encode())
+    return fingerprint.hexdigest()
+
+def frame_hash(df: pd.DataFrame) -> str:
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+
+#%% ------------------------------- ###
+###       3. Batch rendering        ###
+### ------------------------------- ###
+
+# Render the figures of a plot grid in output_dir, as HTML and/or JSON files
+# The queries of all the figures are deduplicated and run once in this process, then the figures are built and written by a pool
+# of workers processes which only receive the data of their queries. The figures whose spec and data are the same as in the previous
+# run (see plot_grid_manifest) are skipped, unless force is True. Returns one row per figure with its status.
+def batch_figures(results: MainResults_GSA, grid: Union[str, dict], output_dir: str = None, formats: list[str] = None,
+                  workers: int = 1, force: bool = False) -> pd.DataFrame:
+
+    if isinstance(grid, str):
+        grid = load_plot_grid(grid)
+    output_dir = output_dir if output_dir is not None else grid.get("output_dir", "figures")
+    formats = formats if formats is not None else grid.get("formats", ["html"])
+    for extension in formats:
+        if extension not in plot_grid_formats:
+            raise ValueError(f"The format {extension} is not available. Please use html or json.")
+    if not hasattr(results, "dict_results"):
+        raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+    os.makedirs(output_dir, exist_ok=True)
+
+    models = list(results.dict_results.keys())
+    specs = expand_plot_grid(grid)
+    queries = {spec["name"]: figure_queries(spec, models, results.geography_groups) for spec in specs}
+
+    # Unique queries of all the figures
+    unique_queries = list({query[0]: query for spec_queries in queries.values() for query in spec_queries}.values())
+    with results.profiler.stage("plot_grid_queries") as stage:
+        data = run_queries(results, unique_queries)
+        stage.rows = len(unique_queries)
+    hashes = {key: frame_hash(df) for key, df in data.items()}
+    log_event(f"{len(unique_queries)} unique queries for {sum(len(spec_queries) for spec_queries in queries.values())} queries of {len(specs)} figures",
+              "plot_grid_queries", figures=len(specs), queries=len(unique_queries))
+
+    # Figures to render
+    manifest_path = os.path.join(output_dir, plot_grid_manifest)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+    report = []
+    tasks = []
+    for spec in specs:
+        keys = [query[0] for query in queries[spec["name"]]]
+        fingerprint = figure_fingerprint(spec, formats, keys, hashes)
+        files = [os.path.join(output_dir, f"{spec['name']}.{extension}") for extension in formats]
+        previous = manifest.get(spec["name"], {})
+        if not force and previous.get("fingerprint") == fingerprint and all(os.path.exists(file) for file in files):
+            report.append({"name": spec["name"], "plot": spec["plot"], "status": "skipped", "files": files, "time": 0.0, "error": None})
+            continue
+        manifest.pop(spec["name"], None)
+        tasks.append((spec, {key: data[key] for key in keys if key in data}, files, fingerprint))
+
+    # Rendering, in a pool of processes if workers is larger than 1
+    context = {"path": results.path, "scenario_files": list(results.scenario_files), "baseline_files": list(results.baseline_files),
+               "model_names": models, "groups": results.geography_groups}
+    with results.profiler.stage("plot_grid_render") as stage:
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rendered = list(executor.map(render_figure, *zip(*[(context, spec, spec_data, files) for spec, spec_data, files, _ in tasks])))
+        else:
+            rendered = [render_figure(context, spec, spec_data, files) for spec, spec_data, files, _ in tasks]
+        stage.rows = len(tasks)
+
+    for (spec, _, files, fingerprint), (wall_time, error) in zip(tasks, rendered):
+        report.append({"name": spec["name"], "plot": spec["plot"], "status": "failed" if error else "rendered", "files": files,
+                       "time": wall_time, "error": error})
+        if error is None:
+            manifest[spec["name"]] = {"fingerprint": fingerprint, "files": [os.path.basename(file) for file in files]}
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+
+    report = pd.DataFrame(report, columns=["name", "plot", "status", "files", "time", "error"])
+    counts = report["status"].value_counts()
+    log_event(f"{counts.get('rendered', 0)} figures rendered, {counts.get('skipped', 0)} skipped and {counts.get('failed', 0)} failed in {output_dir}",
+              "batch_figures", output_dir=output_dir, **{status: int(count) for status, count in counts.items()})
+    return report
+
+# Build a figure from the data of its queries and write its files, returns the wall time and the error if any
+# The figure is built by a MainResults_GSA without results whose query cache holds the data of the queries
+def render_figure(context: dict, spec: dict, data: dict[tuple, pd.DataFrame], files: list[str]) -> tuple[float, str]:
+
+    start = time.perf_counter()
+    results = MainResults_GSA(context["path"], context["scenario_files"], context["baseline_files"], context["model_names"])
+    results.query_cache = OrderedDict(data)
+    groups = context["groups"]
+    options = {key: value for key, value in spec.items() if key not in plot_grid_axes[spec["plot"]] + ["plot", "name", "models"]}
+    try:
+        if spec["plot"] == "violin":
+            fig = results.violin_plot(spec["selection"], resolve_countries(spec["countries"], groups), spec["year"], model_filter=spec.get("models"), **options)
+        else:
+            selection = [spec["x"], spec["y"]]
+            Countries = next(iter(country_groups(resolve_countries(spec["countries"], groups)).values()))
+            fig = results.correlation_plot(spec["model"], selection, Countries, spec["year"], color_selection=spec.get("color"), **options)
+        for file in files:
+            if file.endswith(".html"):
+                fig.write_html(file, include_plotlyjs="cdn")
+            else:
+                fig.write_json(file)
+    except Exception as error:
+        return time.perf_counter() - start, f"{type(error).__name__}: {error}"
+    return time.perf_counter() - start, None
+
+#%% ------------------------------- ###
+###        4. Command line          ###
+### ------------------------------- ###
+
+# Load the results described by the "results" section of a plot grid:
+#   {"path": ..., "scenario_files": [...], "baseline_files": [...], "model_names": [...], "input_files": [...],
+#    "store_dir": ..., "import_results": {...}, "import_input_data": {...}}
+# The results are read from the results store if store_dir is given, otherwise they are imported with the import_results arguments
+def results_from_grid(section: dict) -> MainResults_GSA:
+
+    results = MainResults_GSA(section["path"], section.get("scenario_files", []), section.get("baseline_files", []),
+                              section.get("model_names", []), section.get("input_files"))
+    if "store_dir" in section:
+        results.open_results_store(section["store_dir"], read_only=True)
+    else:
+        results.import_results(**section.get("import_results", {}))
+    if "input_files" in section:
+        results.import_input_data(**section.get("import_input_data", {}))
+    return results
+
+def main(argv: list[str] = None) -> pd.DataFrame:
+
+    parser = argparse.ArgumentParser(description="Render the figures of a plot grid (JSON or YAML).")
+    parser.add_argument("grid", help="plot grid file")
+    parser.add_argument("--output-dir", default=None, help="output directory, by default the output_dir of the grid")
+    parser.add_argument("--formats", nargs="+", default=None, choices=plot_grid_formats, help="output formats, by default the formats of the grid")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of rendering processes")
+    parser.add_argument("--force", action="store_true", help="render all the figures, even the unchanged ones")
+    args = parser.parse_args(argv)
+
+    grid = load_plot_grid(args.grid)
+    if "results" not in grid:
+        raise ValueError("The plot grid should contain a results section to be used from the command line.")
+    results = results_from_grid(grid["results"])
+    results.enable_query_cache()
+    report = batch_figures(results, grid, output_dir=args.output_dir, formats=args.formats, workers=args.workers, force=args.force)
+    failed = report[report["status"] == "failed"]
+    for _, row in failed.iterrows():
+        log_event(f"{row['name']}: {row['error']}", "batch_figures_error", name=row["name"])
+    return report
+
+if __name__ == "__main__":
+    report = main()
+    sys.exit(1 if (report["status"] == "failed").any() else 0)
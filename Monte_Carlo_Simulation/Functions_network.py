@@ -0,0 +1,212 @@
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from typing import Union, Callable
+
+#%% ------------------------------- ###
+###          0. Hard coded          ###
+### ------------------------------- ###
+
+# The H2 transmission capacities are in GW and the flows in TWh, the utilisation of a corridor is its flow over the energy it could
+# transfer at full capacity during the year (TWh per GW)
+capacity_to_energy = 8760 / 1000
+
+#%% ------------------------------- ###
+###        1. H2 network            ###
+### ------------------------------- ###
+
+# H2 transmission network of a model across the scenarios and the years
+# The capacities and the flows are stored as batches of sparse region x region matrices: one sparse matrix per kind, with one row per
+# (scenario, year) and one column per corridor (exporting region i, importing region j) at the position i * regions + j. The aggregations
+# over the corridors (cross-border totals, net imports of country groups) are products of these matrices with corridor x group
+# matrices, computed for all the scenarios and groups at once.
+# capacity and flow are the rows of the transmission tables, as DataFrames or as functions returning the partitions of a table (for
+# instance the partitions of a results store), which are read twice: once for the coordinates and once for the values of the matrices.
+class H2Network:
+    def __init__(self, capacity: Union[pd.DataFrame, Callable], flow: Union[pd.DataFrame, Callable], region_countries: dict[str, str],
+                 groups: dict[str, list[str]] = {}):
+
+        tables = {"capacity": capacity, "flow": flow}
+        tables = {kind: (lambda df=df: [df]) if isinstance(df, pd.DataFrame) else df for kind, df in tables.items()}
+
+        # Coordinates of the network
+        regions, scenarios, years = set(), [np.array([], dtype=np.int64)], set()
+        for partitions in tables.values():
+            for df in partitions():
+                regions.update(df['IRRRE'].astype(str).unique(), df['IRRRI'].astype(str).unique())
+                scenarios.append(np.unique(df['Scenarios'].to_numpy(dtype=np.int64)))
+                years.update(df['Y'].astype(str).unique())
+        self.regions = sorted(regions)
+        self.scenarios = np.unique(np.concatenate(scenarios))
+        self.years = sorted(years)
+        self.region_countries = {region: region_countries.get(region, region) for region in self.regions}
+        # Named groups of countries, shared with the results so that the groups defined later can be used
+        self.groups = groups
+        self.index = {"regions": pd.Index(self.regions), "scenarios": pd.Index(self.scenarios), "years": pd.Index(self.years)}
+
+        R = len(self.regions)
+        self.matrices = {}
+        for kind, partitions in tables.items():
+            rows, columns, values = [np.array([], dtype=np.int64)], [np.array([], dtype=np.int64)], [np.array([], dtype=np.float64)]
+            for df in partitions():
+                rows.append(self.index["scenarios"].get_indexer(df['Scenarios'].to_numpy(dtype=np.int64)) * len(self.years)
+                            + self.index["years"].get_indexer(df['Y'].astype(str)))
+                columns.append(self.index["regions"].get_indexer(df['IRRRE'].astype(str)) * R + self.index["regions"].get_indexer(df['IRRRI'].astype(str)))
+                values.append(df['value'].to_numpy(dtype=np.float64))
+            # The values of the same corridor (for instance the variable categories of the capacity) are summed
+            self.matrices[kind] = sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                                    shape=(len(self.scenarios) * len(self.years), R * R))
+
+        # Exporting and importing region of each corridor, and position of the reverse corridor
+        self.exporters = np.repeat(np.arange(R), R)
+        self.importers = np.tile(np.arange(R), R)
+        self.reverse = self.importers * R + self.exporters
+
+    # Number of scenarios, years and regions
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return len(self.scenarios), len(self.years), len(self.regions)
+
+    # Rows of the matrices of a year, one per scenario, without the baseline (scenario 0) if include_baseline is False
+    def _year_rows(self, YEAR: int, include_baseline: bool = True) -> tuple[np.ndarray, np.ndarray]:
+
+        if str(YEAR) not in self.index["years"]:
+            raise ValueError(f"The year {YEAR} is not in the H2 network.")
+        scenarios = np.arange(len(self.scenarios))
+        if not include_baseline:
+            scenarios = scenarios[self.scenarios != 0]
+        return scenarios * len(self.years) + self.index["years"].get_loc(str(YEAR)), self.scenarios[scenarios]
+
+    # Sparse matrices of a kind (capacity or flow) for a year, scenarios x corridors
+    def year_matrix(self, kind: str, YEAR: int, include_baseline: bool = True) -> tuple[sparse.csr_matrix, np.ndarray]:
+
+        if kind not in self.matrices:
+            raise ValueError("The kind should be capacity or flow.")
+        rows, scenarios = self._year_rows(YEAR, include_baseline)
+        return self.matrices[kind][rows], scenarios
+
+    # Region x region sparse matrix of a kind for one scenario and one year
+    def matrix(self, kind: str, scenario: int, YEAR: int) -> sparse.csr_matrix:
+
+        R = len(self.regions)
+        row = self.index["scenarios"].get_loc(scenario) * len(self.years) + self.index["years"].get_loc(str(YEAR))
+        return self.matrices[kind][row].reshape(R, R).tocsr()
+
+    # Country groups as a dictionnary {name: countries}: a group name (see geography_groups), a list of countries or a dictionnary
+    def _groups(self, Countries: Union[list[str], dict, str]) -> dict[str, list[str]]:
+
+        if isinstance(Countries, str):
+            return {Countries: self.groups.get(Countries, [Countries])}
+        if isinstance(Countries, dict):
+            return {name: self.groups.get(countries, [countries]) if isinstance(countries, str) else countries for name, countries in Countries.items()}
+        return {Countries[0] if len(Countries) == 1 else f"{len(Countries)} countries": Countries}
+
+    # Corridors x groups matrices of the corridors leaving (exports) and entering (imports) each group
+    def _group_corridors(self, groups: dict[str, list[str]]) -> tuple[sparse.csr_matrix, sparse.csr_matrix]:
+
+        members = np.array([[self.region_countries[region] in countries for countries in groups.values()] for region in self.regions],
+                           dtype=bool).reshape(len(self.regions), len(groups))
+        exporter_in, importer_in = members[self.exporters], members[self.importers]
+        exports = sparse.csr_matrix((exporter_in & ~importer_in).astype(np.float64))
+        imports = sparse.csr_matrix((importer_in & ~exporter_in).astype(np.float64))
+        return exports, imports
+
+    # Cross-border totals of each group of countries for each scenario of a year: the exports (from the group to the other countries),
+    # the imports (from the other countries to the group) and the net imports (imports - exports), of the flows or the capacities
+    # Returns a long table with the columns Scenarios, Group, exports, imports and net_imports
+    def cross_border(self, Countries: Union[list[str], dict, str], YEAR: int, kind: str = "flow", include_baseline: bool = True) -> pd.DataFrame:
+
+        groups = self._groups(Countries)
+        values, scenarios = self.year_matrix(kind, YEAR, include_baseline)
+        exports, imports = self._group_corridors(groups)
+        exports, imports = (values @ exports).toarray(), (values @ imports).toarray()
+        return pd.DataFrame({'Scenarios': np.repeat(scenarios, len(groups)), 'Group': np.tile(list(groups.keys()), len(scenarios)),
+                             'exports': exports.ravel(), 'imports': imports.ravel(), 'net_imports': (imports - exports).ravel()})
+
+    # Net imports of the flows of each group of countries for each scenario of a year, in the format of get_results with a Group column
+    def net_imports(self, Countries: Union[list[str], dict, str], YEAR: int, include_baseline: bool = True) -> pd.DataFrame:
+
+        df = self.cross_border(Countries, YEAR, kind="flow", include_baseline=include_baseline)
+        return df[['Scenarios', 'Group', 'net_imports']].rename(columns={'net_imports': 'value'})
+
+    # Capacity of the corridors of a year, scenarios x corridors. The capacity of a corridor is the largest capacity of its two directions,
+    # as a capacity can be given in one direction only.
+    def corridor_capacity(self, YEAR: int, include_baseline: bool = True) -> tuple[sparse.csr_matrix, np.ndarray]:
+
+        capacity, scenarios = self.year_matrix("capacity", YEAR, include_baseline)
+        capacity = capacity.maximum(capacity[:, self.reverse]).tocsr()
+        capacity.eliminate_zeros()
+        return capacity, scenarios
+
+    # Utilisation of the corridors of a year: the flow over the energy the corridor could transfer at full capacity during the year,
+    # as a sparse matrix scenarios x corridors holding the corridors with a capacity
+    def utilisation_matrix(self, YEAR: int, include_baseline: bool = True) -> tuple[sparse.csr_matrix, np.ndarray]:
+
+        capacity, scenarios = self.corridor_capacity(YEAR, include_baseline)
+        flow, _ = self.year_matrix("flow", YEAR, include_baseline)
+        rows, columns = capacity.nonzero()
+        utilisation = np.asarray(flow[rows, columns]).ravel() / (np.asarray(capacity[rows, columns]).ravel() * capacity_to_energy)
+        return sparse.csr_matrix((utilisation, (rows, columns)), shape=capacity.shape), scenarios
+
+    # Statistics of each corridor of a year over the scenarios (without the baseline by default): mean flow, mean capacity, and mean,
+    # max and 95th percentile of the utilisation over the scenarios where the corridor has a capacity (NaN if it never has one)
+    def corridor_statistics(self, YEAR: int, include_baseline: bool = False) -> pd.DataFrame:
+
+        flow, scenarios = self.year_matrix("flow", YEAR, include_baseline)
+        capacity, _ = self.corridor_capacity(YEAR, include_baseline)
+        corridors = np.union1d(flow.indices, capacity.indices).astype(np.int64)
+
+        # Dense values of the used corridors only
+        flow_values, capacity_values = flow[:, corridors].toarray(), capacity[:, corridors].toarray()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            utilisation = np.where(capacity_values > 0, flow_values / (capacity_values * capacity_to_energy), np.nan)
+        with_capacity = (capacity_values > 0).sum(axis=0)
+        statistics = np.full((3, len(corridors)), np.nan)
+        columns = with_capacity > 0
+        if columns.any():
+            statistics[:, columns] = np.vstack([np.nanmean(utilisation[:, columns], axis=0), np.nanmax(utilisation[:, columns], axis=0),
+                                                np.nanquantile(utilisation[:, columns], 0.95, axis=0)])
+
+        df = self._corridors_frame(corridors)
+        df['mean_flow'] = flow_values.mean(axis=0)
+        df['mean_capacity'] = capacity_values.mean(axis=0)
+        df['scenarios_with_capacity'] = with_capacity
+        df['mean_utilisation'], df['max_utilisation'], df['p95_utilisation'] = statistics
+        return df
+
+    # Top k corridors of a year across the scenarios (without the baseline by default), by the mean or the max over the scenarios of
+    # their flow, capacity or utilisation. Only the corridors between two countries are kept if cross_border is True.
+    def top_corridors(self, YEAR: int, k: int = 10, kind: str = "flow", statistic: str = "mean", cross_border: bool = False,
+                      include_baseline: bool = False) -> pd.DataFrame:
+
+        if statistic not in ["mean", "max"]:
+            raise ValueError("The statistic should be mean or max.")
+        if kind == "utilisation":
+            df = self.corridor_statistics(YEAR, include_baseline)
+            df = df[df['C'] != df['CI']] if cross_border else df
+            return df.nlargest(k, f"{statistic}_utilisation").reset_index(drop=True)
+
+        values, _ = self.corridor_capacity(YEAR, include_baseline) if kind == "capacity" else self.year_matrix(kind, YEAR, include_baseline)
+        if statistic == "mean":
+            scores = np.asarray(values.sum(axis=0)).ravel() / values.shape[0]
+        else:
+            scores = values.max(axis=0).toarray().ravel()
+        candidates = np.flatnonzero(scores)
+        if cross_border:
+            countries = np.array([self.region_countries[region] for region in self.regions], dtype=object)
+            candidates = candidates[countries[self.exporters[candidates]] != countries[self.importers[candidates]]]
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]] if k > 0 else candidates
+        top = top[np.argsort(-scores[top], kind='stable')]
+        df = self._corridors_frame(top)
+        df[f"{statistic}_{kind}"] = scores[top]
+        return df
+
+    # Exporting and importing regions and countries of some corridors
+    def _corridors_frame(self, corridors: np.ndarray) -> pd.DataFrame:
+
+        regions = np.array(self.regions, dtype=object)
+        exporters, importers = regions[self.exporters[corridors]], regions[self.importers[corridors]]
+        return pd.DataFrame({'IRRRE': exporters, 'IRRRI': importers,
+                             'C': [self.region_countries[region] for region in exporters],
+                             'CI': [self.region_countries[region] for region in importers]})
@@ -0,0 +1,170 @@
+import pandas as pd
+import numpy as np
+import functools
+import inspect
+import json
+import logging
+import sys
+import time
+import tracemalloc
+
+#%% ------------------------------- ###
+###            1. Logging           ###
+### ------------------------------- ###
+
+# Logger of the analysis, the messages are printed on the standard output by default as the previous print messages
+# The level can be changed with logger.setLevel, and the structured fields of the messages (event, model, ...) are in the records
+logger = logging.getLogger("GSA_Analysis")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Log a message with structured fields
+def log_event(message: str, event: str, level: int = logging.INFO, **fields) -> None:
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"event": event, "fields": fields})
+
+#%% ------------------------------- ###
+###          2. Profiling           ###
+### ------------------------------- ###
+
+# Stage returned when the profiler is disabled, setting the rows has no effect
+class _NullStage:
+    rows = None
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+_null_stage = _NullStage()
+
+# Stage being measured: wall time, rows processed and peak memory (if the memory is tracked) of a block of code
+class _Stage:
+    def __init__(self, profiler: "StageProfiler", name: str, model: str, selection: str):
+        self.profiler = profiler
+        self.name = name
+        self.model = model
+        self.selection = selection
+        self.rows = None
+        self.child_peak = 0
+
+    def __enter__(self):
+        if self.profiler.track_memory:
+            # The peak of the parent stage is kept before resetting the peak for this stage
+            current, peak = tracemalloc.get_traced_memory()
+            if len(self.profiler._stack) != 0:
+                parent = self.profiler._stack[-1]
+                parent.child_peak = max(parent.child_peak, peak)
+            self.memory_start = current
+            tracemalloc.reset_peak()
+        self.profiler._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall_time = time.perf_counter() - self.start
+        self.profiler._stack.pop()
+        peak_memory = np.nan
+        if self.profiler.track_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            peak_memory = peak - self.memory_start
+            if len(self.profiler._stack) != 0:
+                parent = self.profiler._stack[-1]
+                parent.child_peak = max(parent.child_peak, peak)
+        self.profiler.records.append({"stage": self.name, "model": self.model, "selection": self.selection,
+                                      "wall_time": wall_time, "rows": self.rows, "peak_memory": peak_memory})
+        return False
+
+# Opt-in profiler of the stages of the analysis (GDX read, extraction of the scenario ids, concatenation, filters, figures...)
+# One record is stored per call of a stage, with the wall time, the rows processed and the peak memory above the memory at the start
+# of the stage (only if track_memory, as tracemalloc slows down the allocations). When disabled, a stage costs one method call.
+class StageProfiler:
+    def __init__(self, enabled: bool = False, track_memory: bool = False):
+
+        self.records = []
+        self._stack = []
+        self.enabled = False
+        self.track_memory = False
+        if enabled:
+            self.enable(track_memory)
+
+    def enable(self, track_memory: bool = False) -> None:
+        self.enabled = True
+        if track_memory and not self.track_memory:
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start()
+        self.track_memory = track_memory
+
+    def disable(self) -> None:
+        if self.track_memory and getattr(self, "_started_tracemalloc", False):
+            tracemalloc.stop()
+        self.enabled = False
+        self.track_memory = False
+
+    def reset(self) -> None:
+        self.records = []
+
+    # Context manager measuring a stage, the rows processed can be set on the returned stage
+    def stage(self, name: str, model: str = None, selection=None):
+        if not self.enabled:
+            return _null_stage
+        return _Stage(self, name, model, None if selection is None else str(selection))
+
+    # Add the records measured by another profiler, for instance in a worker process
+    def extend(self, records: list[dict]) -> None:
+        if self.enabled:
+            self.records.extend(records)
+
+    # One row per call of a stage
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.records, columns=["stage", "model", "selection", "wall_time", "rows", "peak_memory"])
+
+    # Summary table: calls, total, mean and max wall time, rows and peak memory of each stage, per model and selection
+    def summary(self) -> pd.DataFrame:
+        df = self.to_frame()
+        df[["model", "selection"]] = df[["model", "selection"]].fillna("")
+        df["rows"] = pd.to_numeric(df["rows"])
+        df = df.groupby(["stage", "model", "selection"], sort=False).agg(calls=("wall_time", "size"), total_time=("wall_time", "sum"),
+                                                                         mean_time=("wall_time", "mean"), max_time=("wall_time", "max"),
+                                                                         rows=("rows", lambda rows: rows.sum(min_count=1)),
+                                                                         peak_memory=("peak_memory", "max"))
+        return df.reset_index().sort_values("total_time", ascending=False, ignore_index=True)
+
+    # Export the records and the summary to a JSON file, or the records to a CSV file
+    def export(self, file_path: str) -> None:
+        if file_path.lower().endswith(".csv"):
+            self.to_frame().to_csv(file_path, index=False)
+        elif file_path.lower().endswith(".json"):
+            with open(file_path, 'w') as file:
+                json.dump({"records": json.loads(self.to_frame().to_json(orient="records")),
+                           "summary": json.loads(self.summary().to_json(orient="records"))}, file, indent=1)
+        else:
+            raise ValueError("The profiling can only be exported to a .json or a .csv file.")
+
+# Disabled profiler used by the functions called without a profiler
+no_profiler = StageProfiler()
+
+# Decorator measuring a method of a class with a profiler attribute as a stage, with the model and the selection of the call
+# The rows processed are given by the rows function applied to the output, by default the length of a DataFrame
+def profiled(name: str, rows=None):
+    def decorator(method):
+        signature = inspect.signature(method)
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if not profiler.enabled:
+                return method(self, *args, **kwargs)
+            arguments = signature.bind_partial(self, *args, **kwargs).arguments
+            with profiler.stage(name, model=arguments.get("model"), selection=arguments.get("selection")) as stage:
+                output = method(self, *args, **kwargs)
+                if rows is not None:
+                    stage.rows = rows(output)
+                elif isinstance(output, pd.DataFrame):
+                    stage.rows = len(output)
+            return output
+        return wrapper
+    return decorator
@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from scipy import stats
+
+#%% ------------------------------- ###
+###    1. Sensitivity indices       ###
+### ------------------------------- ###
+
+# The indices are computed from the given Monte Carlo sample (no Saltelli design needed) by conditioning the outputs
+# on equiprobable bins of each parameter. All the parameters and outputs are computed at once with matrix products:
+# the bins are stored as a one-hot matrix of size n x (parameters * bins).
+
+# Bin of each scenario for each parameter, the bins are equiprobable (based on the ranks of the values)
+def rank_bins(X: np.ndarray, n_bins: int = 10) -> np.ndarray:
+
+    n = X.shape[0]
+    if n_bins < 2 or n_bins > n:
+        raise ValueError("The number of bins should be between 2 and the number of scenarios.")
+    ranks = np.argsort(np.argsort(X, axis=0, kind='stable'), axis=0, kind='stable')
+    return (ranks * n_bins) // n
+
+# One-hot matrix of the bins, of size n x (parameters * bins)
+def bins_one_hot(bins: np.ndarray, n_bins: int, dtype: type = np.float64) -> np.ndarray:
+
+    n, p = bins.shape
+    one_hot = np.zeros((n, p * n_bins), dtype=dtype)
+    one_hot[np.arange(n)[:, None], bins + np.arange(p) * n_bins] = 1
+    return one_hot
+
+# First order variance-based indices Var(E[Y|X_j]) / Var(Y), estimated with the means of Y in the bins of X_j
+# Y is of size n x outputs and the weights of the scenarios are used for the bootstrap. Returns an array parameters x outputs.
+def first_order_indices(one_hot: np.ndarray, Y: np.ndarray, n_bins: int, weights: np.ndarray = None) -> np.ndarray:
+
+    if weights is None:
+        weights = np.ones(Y.shape[0])
+    total_weight = weights.sum()
+    mean = weights @ Y / total_weight
+    variance = weights @ (Y - mean)**2 / total_weight
+
+    bin_weights = one_hot.T @ weights # (parameters * bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bin_means = (one_hot.T @ (weights[:, None] * Y)) / bin_weights[:, None] # (parameters * bins) x outputs
+        between = np.nan_to_num(bin_weights[:, None] * (bin_means - mean)**2)
+        indices = between.reshape(-1, n_bins, Y.shape[1]).sum(axis=1) / (total_weight * variance)
+    return indices
+
+# Indicators Y <= grid used to evaluate the CDFs of the outputs on a grid of quantiles of each output
+# The outputs are split in chunks to bound the size of the indicator matrices, each chunk is a matrix n x (grid * outputs)
+def cdf_indicators(Y: np.ndarray, n_grid: int = 50, chunk_size: int = 64) -> list[tuple[int, int, np.ndarray]]:
+
+    n, m = Y.shape
+    grid = np.quantile(Y, np.linspace(0, 1, n_grid + 2)[1:-1], axis=0) # n_grid x outputs
+    indicators = []
+    for start in range(0, m, chunk_size):
+        stop = min(start + chunk_size, m)
+        below = (Y[:, None, start:stop] <= grid[None, :, start:stop]).astype(np.float32).reshape(n, -1)
+        indicators.append((start, stop, below))
+    return indicators
+
+# PAWN indices: statistic over the bins of X_j of the Kolmogorov-Smirnov distance between the unconditional CDF of Y
+# and the CDF of Y conditional to the bin. The CDFs are evaluated on a grid of quantiles of each output.
+# The indicators can be computed once with cdf_indicators and reused for the bootstrap replicates.
+def pawn_indices(one_hot: np.ndarray, Y: np.ndarray, n_bins: int, weights: np.ndarray = None, n_grid: int = 50,
+                 statistic: str = "median", indicators: list = None) -> np.ndarray:
+
+    if statistic not in ["median", "mean", "max"]:
+        raise ValueError("The statistic should be median, mean or max.")
+    if weights is None:
+        weights = np.ones(Y.shape[0])
+    total_weight = weights.sum()
+    bin_weights = one_hot.T @ weights
+    weighted_one_hot = (one_hot * weights[:, None]).T.astype(np.float32)
+
+    if indicators is None:
+        indicators = cdf_indicators(Y, n_grid)
+    n_grid = indicators[0][2].shape[1] // (indicators[0][1] - indicators[0][0])
+    indices = np.empty((one_hot.shape[1] // n_bins, Y.shape[1]))
+    for start, stop, below in indicators:
+        cdf = weights.astype(np.float32) @ below / total_weight
+        with np.errstate(invalid='ignore', divide='ignore'):
+            conditional_cdf = (weighted_one_hot @ below) / bin_weights[:, None]
+        distance = np.abs(conditional_cdf - cdf).reshape(-1, n_grid, stop - start).max(axis=1) # (parameters * bins) x outputs
+        distance = distance.reshape(-1, n_bins, stop - start)
+        if statistic == "median":
+            indices[:, start:stop] = np.nanmedian(distance, axis=1)
+        elif statistic == "mean":
+            indices[:, start:stop] = np.nanmean(distance, axis=1)
+        else:
+            indices[:, start:stop] = np.nanmax(distance, axis=1)
+    return indices
+
+# Compute the indices of the methods for all the parameters and outputs, with bootstrap confidence intervals
+# The bootstrap replicates are weighted versions of the sample (multinomial weights), computed in parallel by threads
+# Returns a dictionnary with, for each method, the indices, the lower bound and the upper bound (arrays parameters x outputs)
+def sensitivity_indices(X: np.ndarray, Y: np.ndarray, methods: list[str] = ["first_order", "pawn"], n_bins: int = 10,
+                        n_boot: int = 100, confidence: float = 0.95, workers: int = None, seed: int = None, n_grid: int = 50) -> dict:
+
+    if X.shape[0] != Y.shape[0]:
+        raise ValueError("The parameters and the outputs should have the same number of scenarios.")
+    for method in methods:
+        if method not in ["first_order", "pawn"]:
+            raise ValueError(f"The method {method} is not available. Please use first_order or pawn.")
+
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    one_hot = bins_one_hot(rank_bins(X, n_bins), n_bins)
+    if "pawn" in methods:
+        indicators = cdf_indicators(Y, n_grid)
+
+    def compute(weights):
+        results = {}
+        if "first_order" in methods:
+            results["first_order"] = first_order_indices(one_hot, Y, n_bins, weights)
+        if "pawn" in methods:
+            results["pawn"] = pawn_indices(one_hot, Y, n_bins, weights, indicators=indicators)
+        return results
+
+    estimates = compute(None)
+
+    # Bootstrap replicates
+    if n_boot > 0:
+        rng = np.random.default_rng(seed)
+        n = X.shape[0]
+        boot_weights = rng.multinomial(n, np.full(n, 1 / n), size=n_boot).astype(np.float64)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            replicates = list(executor.map(compute, boot_weights))
+
+    alpha = (1 - confidence) / 2
+    output = {}
+    for method, values in estimates.items():
+        if n_boot > 0:
+            samples = np.stack([replicate[method] for replicate in replicates])
+            low, high = np.nanquantile(samples, [alpha, 1 - alpha], axis=0)
+        else:
+            low, high = np.full(values.shape, np.nan), np.full(values.shape, np.nan)
+        output[method] = {"value": values, "CI_low": low, "CI_high": high}
+    return output
+
+# Tidy table of the indices, one row per (output, parameter, method)
+def sensitivity_table(indices: dict, parameters: list[str], outputs: pd.DataFrame) -> pd.DataFrame:
+
+    tables = []
+    for method, values in indices.items():
+        p, m = values["value"].shape
+        table = outputs.iloc[np.tile(np.arange(m), p)].reset_index(drop=True)
+        table["Parameter"] = np.repeat(parameters, m)
+        table["Method"] = method
+        for column in ["value", "CI_low", "CI_high"]:
+            table[column] = values[column].reshape(-1)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+#%% ------------------------------- ###
+###     2. Correlation matrices     ###
+### ------------------------------- ###
+
+# Pearson correlation of all the columns of X with all the columns of Y, array of size parameters x outputs
+def pearson_matrix(X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        X = (X - X.mean(axis=0)) / X.std(axis=0)
+        Y = (Y - Y.mean(axis=0)) / Y.std(axis=0)
+    return X.T @ Y / X.shape[0]
+
+# Two-sided p-values of correlation coefficients computed on n scenarios, with a number of controlled variables
+def correlation_p_values(r: np.ndarray, n: int, controlled: int = 0) -> np.ndarray:
+
+    dof = n - 2 - controlled
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = r * np.sqrt(dof / (1 - r**2))
+    return 2 * stats.t.sf(np.abs(t), dof)
+
+# Partial rank correlation coefficients of all the columns of X with all the columns of Y, controlling for the other columns of X
+# The partial correlations are obtained from the inverse of the correlation matrix of [X, y] for each output y, computed for all
+# the outputs at once with the block inverse formula: with A the correlation of X, b the correlation of X and y and u = A^-1 b,
+# the partial correlation of X_j and y is u_j / sqrt((1 - b.u) (A^-1)_jj + u_j^2)
+def prcc_matrix(X: np.ndarray, Y: np.ndarray, ranked: bool = False) -> np.ndarray:
+
+    if not ranked:
+        X, Y = stats.rankdata(X, axis=0), stats.rankdata(Y, axis=0)
+    A = pearson_matrix(X, X)
+    b = pearson_matrix(X, Y)
+    A_inv = np.linalg.pinv(A)
+    u = A_inv @ b
+    d = 1 - (b * u).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return u / np.sqrt(d * np.diag(A_inv)[:, None] + u**2)
+
+# Pearson, Spearman and partial rank correlation coefficients with their p-values, arrays of size parameters x outputs
+# The PRCC are only computed for the first prcc_columns columns of X (all by default), the other ones are NaN
+def correlation_coefficients(X: np.ndarray, Y: np.ndarray, prcc_columns: int = None) -> dict[str, np.ndarray]:
+
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    n, p = X.shape
+    if prcc_columns is None:
+        prcc_columns = p
+    X_ranks, Y_ranks = stats.rankdata(X, axis=0), stats.rankdata(Y, axis=0)
+
+    coefficients = {"pearson": pearson_matrix(X, Y), "spearman": pearson_matrix(X_ranks, Y_ranks),
+                    "prcc": np.full((p, Y.shape[1]), np.nan)}
+    coefficients["prcc"][:prcc_columns] = prcc_matrix(X_ranks[:, :prcc_columns], Y_ranks, ranked=True)
+    coefficients["pearson_p"] = correlation_p_values(coefficients["pearson"], n)
+    coefficients["spearman_p"] = correlation_p_values(coefficients["spearman"], n)
+    coefficients["prcc_p"] = correlation_p_values(coefficients["prcc"], n, controlled=prcc_columns - 1)
+    return coefficients
@@ -0,0 +1,334 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import plotly.io as pio
+import plotly.graph_objects as go
+import argparse
+import http.client
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+from Functions_analysis import MainResults_GSA, geography_groups, results_selections
+from Functions_figures import load_config_file, results_from_grid
+from Functions_profiling import log_event
+
+#%% ------------------------------- ###
+###          0. Hard coded          ###
+### ------------------------------- ###
+
+# Methods of MainResults_GSA exposed by the service, returning a DataFrame or a figure
+service_frame_methods = ["get_results", "sample_input_data", "get_results_regions"]
+service_figure_methods = ["violin_plot", "correlation_plot"]
+
+# Content types of the responses: the DataFrames are sent as Arrow IPC streams (the dtypes are kept), the figures and the errors as JSON
+arrow_content_type = "application/vnd.apache.arrow.stream"
+json_content_type = "application/json"
+
+#%% ------------------------------- ###
+###           1. Service            ###
+### ------------------------------- ###
+
+# Local HTTP service over a MainResults_GSA loaded once, so that several analysts query the same results without their own copy
+# A call is a POST request on /<method> with the JSON body {"args": [...], "kwargs": {...}}, GET /health gives the models and GET /stats
+# the counters of the service. The requests are handled by one thread each. The serialized responses are kept in an LRU cache of
+# cache_size responses, and the last cache_size queries of get_results and sample_input_data in the query cache of the results: a cached
+# response is sent without computing anything. The responses which are not cached are computed one at a time, as MainResults_GSA is not thread safe.
+class ResultsService:
+    def __init__(self, results: MainResults_GSA, host: str = "127.0.0.1", port: int = 8765, cache_size: int = 4096):
+
+        if not hasattr(results, "dict_results"):
+            raise ValueError("The data has not been imported yet. Please use the import_results() function.")
+        if cache_size < 0:
+            raise ValueError("The size of the cache should be positive or 0.")
+
+        self.results = results
+        # The query cache of the results is bounded as the cache of the responses, so that a long running service does not grow
+        if cache_size > 0:
+            self.results.enable_query_cache(max_size=cache_size)
+        self.cache_size = cache_size
+        self.responses = OrderedDict()
+        self.lock = threading.Lock()
+        self.compute_lock = threading.Lock()
+        self.statistics = {"requests": 0, "hits": 0, "misses": 0, "errors": 0}
+        self.server = ThreadingHTTPServer((host, port), service_handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    # Address of the service, the port is chosen by the system if the port 0 was given
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # Serve the requests until shutdown, in a background thread if background is True
+    def serve(self, background: bool = False) -> None:
+        log_event(f"Results service listening on {self.url}", "service_start", url=self.url, models=list(self.results.dict_results.keys()))
+        if background:
+            self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+            self.thread.start()
+        else:
+            self.server.serve_forever()
+
+    def shutdown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # Serialized response of a call, as (status, content type, body), from the cache if the same call was already answered
+    def call(self, method: str, args: list, kwargs: dict) -> tuple[int, str, bytes]:
+
+        if method not in service_frame_methods + service_figure_methods:
+            return 404, json_content_type, json.dumps({"error": f"The method {method} is not available."}).encode()
+        key = json.dumps([method, args, kwargs], sort_keys=True, default=str)
+        with self.lock:
+            self.statistics["requests"] += 1
+            if key in self.responses:
+                self.responses.move_to_end(key)
+                self.statistics["hits"] += 1
+                return self.responses[key]
+            self.statistics["misses"] += 1
+
+        try:
+            with self.compute_lock:
+                output = getattr(self.results, method)(*args, **kwargs)
+            response = (200,) + serialize_output(output)
+        except Exception as error:
+            # The invalid arguments are errors of the client, any other exception is an error of the service
+            status = 400 if isinstance(error, (ValueError, KeyError, TypeError)) else 500
+            with self.lock:
+                self.statistics["errors"] += 1
+            if status == 500:
+                log_event(f"Error in {method}: {type(error).__name__}: {error}", "service_error", level=logging.ERROR, method=method)
+            return status, json_content_type, json.dumps({"error": f"{type(error).__name__}: {error}"}).encode()
+
+        with self.lock:
+            if self.cache_size > 0:
+                self.responses[key] = response
+                while len(self.responses) > self.cache_size:
+                    self.responses.popitem(last=False)
+        return response
+
+    # Models of the results and named groups of countries
+    def health(self) -> dict:
+        return {"status": "ok", "models": list(self.results.dict_results.keys()), "groups": list(self.results.geography_groups.keys())}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.statistics, cached_responses=len(self.responses))
+
+# Request handler class of a service, HTTP/1.1 so that the clients keep their connection open between requests
+# The headers and the body are written separately, Nagle's algorithm is disabled so that the body is not delayed by the ACK of the headers
+def service_handler(service: ResultsService) -> type:
+
+    class ServiceHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            path = urlparse(self.path).path.strip("/")
+            if path == "health":
+                self._send(200, json_content_type, json.dumps(service.health()).encode())
+            elif path == "stats":
+                self._send(200, json_content_type, json.dumps(service.stats()).encode())
+            else:
+                self._send(404, json_content_type, json.dumps({"error": f"Unknown path {self.path}"}).encode())
+
+        def do_POST(self):
+            method = urlparse(self.path).path.strip("/")
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except json.JSONDecodeError as error:
+                self._send(400, json_content_type, json.dumps({"error": f"The body is not valid JSON: {error}"}).encode())
+                return
+            if not isinstance(body, dict):
+                self._send(400, json_content_type, json.dumps({"error": "The body should be a JSON object with args and kwargs."}).encode())
+                return
+            self._send(*service.call(method, body.get("args", []), body.get("kwargs", {})))
+
+        def _send(self, status: int, content_type: str, body: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        # The requests are logged as debug events instead of stderr
+        def log_message(self, format, *args):
+            log_event(format % args, "service_request", level=logging.DEBUG)
+
+    return ServiceHandler
+
+# Content type and body of the output of a method: a DataFrame as an Arrow IPC stream, a figure as its plotly JSON
+def serialize_output(output) -> tuple[str, bytes]:
+
+    if isinstance(output, go.Figure):
+        return json_content_type, output.to_json().encode()
+    table = pa.Table.from_pandas(output.reset_index(drop=True), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return arrow_content_type, sink.getvalue().to_pybytes()
+
+#%% ------------------------------- ###
+###            2. Client            ###
+### ------------------------------- ###
+
+# Client of a ResultsService, with the methods of MainResults_GSA exposed by the service and the same arguments
+# Each thread has its own connection, kept open between its requests. The errors of the service are raised as ValueError.
+class ResultsClient:
+    def __init__(self, url: str = "http://127.0.0.1:8765", timeout: float = 600):
+
+        address = urlparse(url)
+        self.host, self.port = address.hostname, address.port
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def get_results(self, model: str, selection: str, Countries, YEAR) -> pd.DataFrame:
+        return self.call("get_results", model, selection, Countries, YEAR)
+
+    def sample_input_data(self, selection: str, Countries: list[str], YEAR) -> pd.DataFrame:
+        return self.call("sample_input_data", selection, Countries, YEAR)
+
+    def get_results_regions(self, model: str, selection: str, Regions: list[str], YEAR) -> pd.DataFrame:
+        return self.call("get_results_regions", model, selection, Regions, YEAR)
+
+    def violin_plot(self, selection, Countries, YEAR, **options) -> go.Figure:
+        return self.call("violin_plot", selection, Countries, YEAR, **options)
+
+    def correlation_plot(self, model: str, selection: list[str], Countries: list[str], YEAR, **options) -> go.Figure:
+        return self.call("correlation_plot", model, selection, Countries, YEAR, **options)
+
+    def health(self) -> dict:
+        return json.loads(self._request("GET", "/health")[1])
+
+    def stats(self) -> dict:
+        return json.loads(self._request("GET", "/stats")[1])
+
+    # Call a method of the service, the output is a DataFrame or a figure
+    def call(self, method: str, *args, **kwargs):
+
+        content_type, body = self._request("POST", f"/{method}", json.dumps({"args": list(args), "kwargs": kwargs}, default=str).encode())
+        if content_type == arrow_content_type:
+            return pa.ipc.open_stream(body).read_pandas()
+        return pio.from_json(body.decode())
+
+    def _request(self, verb: str, path: str, body: bytes = None) -> tuple[str, bytes]:
+
+        for attempt in range(2):
+            connection = getattr(self.local, "connection", None)
+            if connection is None:
+                connection = self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(verb, path, body=body, headers={"Content-Type": json_content_type} if body is not None else {})
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # The connection was closed by the service, it is opened again once
+                connection.close()
+                self.local.connection = None
+                if attempt == 1:
+                    raise
+        if response.status != 200:
+            raise ValueError(json.loads(data)["error"])
+        return response.getheader("Content-Type"), data
+
+    def close(self) -> None:
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+#%% ------------------------------- ###
+###           3. Load test          ###
+### ------------------------------- ###
+
+# Queries of get_results for a load test: all the selections of all the models for the named groups of countries and the years
+def load_test_queries(models: list[str], groups: list[str], years: list, selections: list[str] = results_selections) -> list[tuple]:
+    return [("get_results", (model, selection, group, str(year))) for model in models for selection in selections for group in groups for year in years]
+
+# Send the queries to a service from concurrent clients (threads), each client sends requests_per_client queries drawn at random
+# Returns the latency of each request and a summary with the p50, p95 and p99 latencies and the throughput
+def load_test(url: str, queries: list[tuple], clients: int = 8, requests_per_client: int = 200, seed: int = 0) -> tuple[pd.DataFrame, dict]:
+
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(len(queries), size=(clients, requests_per_client))
+    client = ResultsClient(url)
+
+    def run(draw: np.ndarray) -> list[tuple]:
+        latencies = []
+        for i in draw:
+            method, args = queries[i]
+            start = time.perf_counter()
+            try:
+                client.call(method, *args)
+                error = None
+            except ValueError as exception:
+                error = str(exception)
+            latencies.append((i, time.perf_counter() - start, error))
+        client.close()
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = [latency for client_latencies in executor.map(run, draws) for latency in client_latencies]
+    wall_time = time.perf_counter() - start
+
+    df = pd.DataFrame(latencies, columns=["query", "latency", "error"])
+    summary = {"requests": len(df), "clients": clients, "errors": int(df["error"].notna().sum()), "wall_time": wall_time,
+               "throughput": len(df) / wall_time, "mean": df["latency"].mean(),
+               "p50": df["latency"].quantile(0.5), "p95": df["latency"].quantile(0.95), "p99": df["latency"].quantile(0.99)}
+    return df, summary
+
+#%% ------------------------------- ###
+###        4. Command line          ###
+### ------------------------------- ###
+
+# serve: load the results described by a JSON or YAML file (the "results" section of a plot grid, see results_from_grid) and serve them
+# load-test: send concurrent queries to a running service and report the latencies
+def main(argv: list[str] = None) -> dict:
+
+    parser = argparse.ArgumentParser(description="Local query service over the results of MainResults_GSA.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="load the results once and serve them")
+    serve.add_argument("config", help="JSON or YAML file with the results section")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--cache-size", type=int, default=4096, help="number of responses kept in memory")
+    test = commands.add_parser("load-test", help="measure the latencies of a running service under concurrent load")
+    test.add_argument("--url", default="http://127.0.0.1:8765")
+    test.add_argument("--clients", type=int, default=8, help="number of concurrent clients")
+    test.add_argument("--requests", type=int, default=200, help="number of requests of each client")
+    test.add_argument("--years", nargs="+", default=["2050"])
+    test.add_argument("--groups", nargs="+", default=list(geography_groups.keys()))
+    test.add_argument("--output", default=None, help="CSV file to write the latencies to")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        config = load_config_file(args.config)
+        results = results_from_grid(config.get("results", config))
+        service = ResultsService(results, host=args.host, port=args.port, cache_size=args.cache_size)
+        try:
+            service.serve()
+        except KeyboardInterrupt:
+            service.shutdown()
+        return service.stats()
+
+    models = ResultsClient(args.url).health()["models"]
+    df, summary = load_test(args.url, load_test_queries(models, args.groups, args.years), clients=args.clients, requests_per_client=args.requests)
+    if args.output is not None:
+        df.to_csv(args.output, index=False)
+    print(f"{summary['requests']} requests from {summary['clients']} clients in {summary['wall_time']:.2f} s "
+          f"({summary['throughput']:.0f} requests/s, {summary['errors']} errors)")
+    print(f"latency p50 {summary['p50']*1e3:.2f} ms | p95 {summary['p95']*1e3:.2f} ms | p99 {summary['p99']*1e3:.2f} ms")
+    return summary
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+
+#%% ------------------------------- ###
+###        1. Results cache         ###
+### ------------------------------- ###
+
+# On-disk cache of the DataFrames read from the scenario and baseline GDX files.
+# Each GDX file is stored in its own Parquet file, keyed by the absolute path, size, mtime and content hash of the GDX file, by whether
+# it was read as a baseline file and by the format_version of the reader, so that the DataFrames of an older reader are read again.
+class ResultsCache:
+    def __init__(self, cache_dir: str, max_size: float = None, format_version: int = 1):
+
+        # max_size is the maximum size of the cache on disk in bytes, None for no limit
+        if max_size is not None and max_size <= 0:
+            raise ValueError("The maximum size of the cache should be positive or None.")
+
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+        self.format_version = format_version
+        self.index_path = os.path.join(self.cache_dir, "cache_index.json")
+
+        # The hits only change the access times of the entries, the index is written once by save_index after them
+        self.changed = False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Load the index of the cache if it exists
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as file:
+                self.index = json.load(file)
+        else:
+            self.index = {}
+
+    # Hash of the content of a file, read by blocks to keep the memory low
+    @staticmethod
+    def content_hash(file_path: str, block_size: int = 1 << 20) -> str:
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(block_size), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    # Fingerprint of a GDX file. The content hash is only recomputed if the size or mtime changed since the last fingerprint.
+    def fingerprint(self, file_path: str, verify_hash: bool = False) -> dict:
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        fingerprint = {"path": file_path, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+        entry = self.index.get(file_path)
+        if entry is not None and not verify_hash and entry["size"] == fingerprint["size"] and entry["mtime"] == fingerprint["mtime"]:
+            fingerprint["hash"] = entry["hash"]
+        else:
+            fingerprint["hash"] = self.content_hash(file_path)
+        return fingerprint
+
+    # Return the cached DataFrame of a GDX file, or None if the file is not cached, has changed or was read differently
+    def load(self, file_path: str, baseline: bool = False, verify_hash: bool = False) -> pd.DataFrame:
+        file_path = os.path.abspath(file_path)
+        entry = self.index.get(file_path)
+        if entry is None:
+            return None
+        if entry.get("format") != self.format_version or entry.get("baseline") != baseline:
+            # Read by another version of the reader or with the other baseline flag, the entry is replaced by the next store
+            return None
+        fingerprint = self.fingerprint(file_path, verify_hash=verify_hash)
+        cache_file = os.path.join(self.cache_dir, entry["file"])
+        if fingerprint["hash"] != entry["hash"] or fingerprint["size"] != entry["size"] or not os.path.exists(cache_file):
+            # The GDX file has changed, the cached data is not valid anymore
+            self.invalidate([file_path])
+            return None
+        # Same content with a new mtime (file touched or copied), update the entry to avoid hashing it again
+        entry["mtime"] = fingerprint["mtime"]
+        entry["last_access"] = time.time()
+        self.changed = True
+        return pd.read_parquet(cache_file)
+
+    # Store the DataFrame read from a GDX file in the cache
+    def store(self, file_path: str, df: pd.DataFrame, baseline: bool = False) -> None:
+        file_path = os.path.abspath(file_path)
+        fingerprint = self.fingerprint(file_path)
+        key = f"{fingerprint['hash']}-{self.format_version}-{int(baseline)}"
+        cache_file = hashlib.sha256(key.encode()).hexdigest()[:32] + ".parquet"
+        df.to_parquet(os.path.join(self.cache_dir, cache_file))
+        # Remove the previous version of the file if it is not shared with another entry
+        if file_path in self.index and self.index[file_path]["file"] != cache_file:
+            self._remove(file_path)
+        self.index[file_path] = {"size": fingerprint["size"], "mtime": fingerprint["mtime"], "hash": fingerprint["hash"],
+                                 "format": self.format_version, "baseline": baseline, "file": cache_file, "nbytes": os.path.getsize(os.path.join(self.cache_dir, cache_file)),
+                                 "last_access": time.time()}
+        self.changed = True
+        self._evict(keep=file_path)
+        self.save_index()
+
+    # Remove some files from the cache, or all of them if no file is given
+    def invalidate(self, files: list[str] = None) -> None:
+        if files is None:
+            files = list(self.index.keys())
+        for file_path in files:
+            self._remove(file_path)
+        self.save_index()
+
+    # Remove the entry of a file without writing the index, returns the number of bytes freed on disk
+    def _remove(self, file_path: str) -> int:
+        entry = self.index.pop(os.path.abspath(file_path), None)
+        if entry is None:
+            return 0
+        self.changed = True
+        # Two identical GDX files share the same cached file
+        if any(other["file"] == entry["file"] for other in self.index.values()):
+            return 0
+        cache_file = os.path.join(self.cache_dir, entry["file"])
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+        return entry["nbytes"]
+
+    # Total size of the cache on disk in bytes
+    def size(self) -> int:
+        return sum({entry["file"]: entry["nbytes"] for entry in self.index.values()}.values())
+
+    # Evict the least recently used files until the cache is below its maximum size
+    def _evict(self, keep: str = None) -> None:
+        if self.max_size is None:
+            return
+        entries = sorted(self.index.items(), key=lambda item: item[1]["last_access"])
+        size = self.size()
+        for file_path, entry in entries:
+            if size <= self.max_size:
+                break
+            if file_path == keep:
+                continue
+            size -= self._remove(file_path)
+
+    # Write the index if it has changed since it was last written
+    def save_index(self) -> None:
+        if not self.changed:
+            return
+        with open(self.index_path, 'w') as file:
+            json.dump(self.index, file, indent=1)
+        self.changed = False
+
+#%% ------------------------------- ###
+###    2. Out-of-core results store ###
+### ------------------------------- ###
+
+# On-disk store of the results of the models, for ensembles larger than the memory.
+# Each table of each model is partitioned by ranges of chunk_scenarios scenarios, each partition is an uncompressed Arrow IPC file which is
+# memory-mapped when it is read. The partitions are listed in a manifest with their scenario range, and the scenario ids of each model.
+# A read only store cannot be modified, it is used by the processes attached to a published store.
+class ResultsStore:
+    def __init__(self, store_dir: str, chunk_scenarios: int = 1000, read_only: bool = False):
+
+        if chunk_scenarios < 1:
+            raise ValueError("The number of scenarios per partition should be positive.")
+
+        self.store_dir = os.path.abspath(store_dir)
+        self.manifest_path = os.path.join(self.store_dir, "store_manifest.json")
+        self.read_only = read_only
+
+        if read_only and not os.path.exists(self.manifest_path):
+            raise ValueError(f"There is no results store in {store_dir}.")
+        os.makedirs(self.store_dir, exist_ok=True)
+        # Load the manifest of the store if it exists, the partitioning of an existing store is kept
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as file:
+                self.manifest = json.load(file)
+        else:
+            self.manifest = {"chunk_scenarios": chunk_scenarios, "models": {}}
+        self.chunk_scenarios = self.manifest["chunk_scenarios"]
+
+    # Models of the store
+    def models(self) -> list[str]:
+        return list(self.manifest["models"].keys())
+
+    # View of the results of a model
+    def model(self, model: str) -> "StoredModel":
+        if model not in self.manifest["models"]:
+            raise ValueError(f"The model {model} is not in the results store.")
+        return StoredModel(self, model)
+
+    # Write the tables of a model (a dictionnary {Table: DataFrame}), the partitions are added to the existing partitions of the model
+    def write(self, model: str, tables: dict[str, pd.DataFrame], float32: bool = False) -> None:
+
+        self._check_writable()
+        entry = self.manifest["models"].setdefault(model, {"directory": self._directory_name(model), "tables": {}, "scenarios": []})
+        scenarios = [np.asarray(entry["scenarios"], dtype=np.int64)]
+        for Table, df in tables.items():
+            if len(df) == 0:
+                continue
+            if float32:
+                df = df.assign(value=df['value'].astype(np.float32))
+            directory = os.path.join(entry["directory"], re.sub(r'\W+', '_', Table))
+            os.makedirs(os.path.join(self.store_dir, directory), exist_ok=True)
+            parts = entry["tables"].setdefault(Table, [])
+            ids = df['Scenarios'].to_numpy().astype(np.int64)
+            scenarios.append(np.unique(ids))
+            for chunk, part in df.groupby(ids // self.chunk_scenarios, sort=True):
+                file = os.path.join(directory, f"part-{int(chunk):06d}-{len(parts):06d}.arrow")
+                table = pa.Table.from_pandas(part, preserve_index=False)
+                with pa.OSFile(os.path.join(self.store_dir, file), 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                part_ids = part['Scenarios'].to_numpy()
+                parts.append({"file": file, "first": int(part_ids.min()), "last": int(part_ids.max()), "rows": len(part)})
+        entry["scenarios"] = np.unique(np.concatenate(scenarios)).tolist()
+        self._save_manifest()
+
+    # Remove a model from the store
+    def remove_model(self, model: str) -> None:
+        self._check_writable()
+        entry = self.manifest["models"].pop(model, None)
+        if entry is not None:
+            shutil.rmtree(os.path.join(self.store_dir, entry["directory"]), ignore_errors=True)
+            self._save_manifest()
+
+    # Total size of the partitions on disk in bytes
+    def size(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.store_dir, part["file"]))
+                   for entry in self.manifest["models"].values() for parts in entry["tables"].values() for part in parts)
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise ValueError("The results store is read only.")
+
+    def _directory_name(self, model: str) -> str:
+        name = re.sub(r'\W+', '_', model)
+        used = {entry["directory"] for entry in self.manifest["models"].values()}
+        directory, k = name, 1
+        while directory in used:
+            directory, k = f"{name}_{k}", k + 1
+        return directory
+
+    def _save_manifest(self) -> None:
+        with open(self.manifest_path, 'w') as file:
+            json.dump(self.manifest, file)
+
+# Results of one model in a results store, read partition by partition
+class StoredModel:
+    def __init__(self, store: ResultsStore, model: str):
+
+        self.store = store
+        self.model = model
+
+    @property
+    def entry(self) -> dict:
+        return self.store.manifest["models"][self.model]
+
+    def tables(self) -> list[str]:
+        return list(self.entry["tables"].keys())
+
+    # Sorted scenario ids of the model
+    def scenarios(self) -> np.ndarray:
+        return np.asarray(self.entry["scenarios"], dtype=np.int64)
+
+    # Chunks of the partitions of the model, a chunk k holds the scenarios k * chunk_scenarios to (k + 1) * chunk_scenarios - 1 of all the tables
+    def chunks(self) -> list[int]:
+        return sorted({part["first"] // self.store.chunk_scenarios for parts in self.entry["tables"].values() for part in parts})
+
+    # Read the partitions of a table one after the other, optionally only the rows of some countries and of a year, or of a chunk
+    # The partitions are memory-mapped and filtered with Arrow before being converted to pandas, so only the selected rows are loaded
+    def scan(self, Table: str, Countries: list[str] = None, YEAR=None, chunk: int = None):
+        for part in self.entry["tables"].get(Table, []):
+            if chunk is not None and part["first"] // self.store.chunk_scenarios != chunk:
+                continue
+            # The memory map is released with the last buffer using it
+            table = pa.ipc.open_file(pa.memory_map(os.path.join(self.store.store_dir, part["file"]), 'r')).read_all()
+            mask = None
+            if Countries is not None:
+                mask = pc.is_in(pc.cast(table['C'], pa.string()), value_set=pa.array(list(Countries), type=pa.string()))
+            if YEAR is not None:
+                year = pc.equal(pc.cast(table['Y'], pa.string()), str(YEAR))
+                mask = year if mask is None else pc.and_(mask, year)
+            if mask is not None:
+                table = table.filter(mask)
+            yield table.to_pandas()
+
+    # All the rows of a table, loaded in memory
+    def table(self, Table: str) -> pd.DataFrame:
+        frames = list(self.scan(Table))
+        if len(frames) == 0:
+            return None
+        return pd.concat(frames, ignore_index=True)
+
+#%% ------------------------------- ###
+###         3. Lazy results         ###
+### ------------------------------- ###
+
+# Tables of the results loaded on first access and kept in memory within a memory budget, shared by the lazy models
+# The least recently used tables are dropped when the tables in memory exceed max_memory (in bytes, None for no limit),
+# a dropped table is loaded again on its next access
+class TableCache:
+    def __init__(self, max_memory: float = None):
+
+        if max_memory is not None and max_memory <= 0:
+            raise ValueError("The memory budget should be positive or None.")
+
+        self.max_memory = max_memory
+        self.tables = OrderedDict()
+        self.nbytes = {}
+        self.statistics = {"hits": 0, "loads": 0, "evictions": 0}
+
+    # Table of a key, loaded with load() if it is not in memory
+    def get(self, key: tuple, load) -> pd.DataFrame:
+        if key in self.tables:
+            self.tables.move_to_end(key)
+            self.statistics["hits"] += 1
+            return self.tables[key]
+        df = load()
+        self.statistics["loads"] += 1
+        self.tables[key] = df
+        self.nbytes[key] = int(df.memory_usage(deep=True).sum())
+        self._evict(keep=key)
+        return df
+
+    # Memory used by the tables in memory in bytes
+    def memory(self) -> int:
+        return sum(self.nbytes.values())
+
+    # Drop the tables of a model, or all the tables if no model is given (the keys start with the model)
+    def discard(self, model: str = None) -> None:
+        for key in [key for key in self.tables if model is None or key[0] == model]:
+            del self.tables[key], self.nbytes[key]
+
+    # Drop the least recently used tables until the memory is below the budget, the table just loaded is always kept
+    def _evict(self, keep: tuple = None) -> None:
+        if self.max_memory is None:
+            return
+        for key in list(self.tables):
+            if self.memory() <= self.max_memory:
+                break
+            if key == keep:
+                continue
+            del self.tables[key], self.nbytes[key]
+            self.statistics["evictions"] += 1
+
+# Results of one model read lazily from its GDX files: a table is read on its first access, only from the symbol of the table,
+# and kept in the shared TableCache. load(Table) returns the rows of a table, an empty table if its symbol is missing.
+# The scenario ids are read from scenario_table, which all the scenarios have.
+class LazyModel:
+    def __init__(self, cache: TableCache, model: str, load, scenario_table: str):
+
+        self.cache = cache
+        self.model = model
+        self.load = load
+        self.scenario_table = scenario_table
+        self._scenarios = None
+
+    # All the rows of a table, from memory or read from the files
+    def table(self, Table: str) -> pd.DataFrame:
+        return self.cache.get((self.model, Table), lambda: self.load(Table))
+
+    # Tables of the model in memory
+    def tables(self) -> list[str]:
+        return [Table for model, Table in self.cache.tables if model == self.model]
+
+    # Sorted scenario ids of the model
+    def scenarios(self) -> np.ndarray:
+        if self._scenarios is None:
+            self._scenarios = np.unique(np.asarray(self.table(self.scenario_table)['Scenarios'], dtype=np.int64))
+        return self._scenarios
+
+#%% ------------------------------- ###
+###        4. Appended results      ###
+### ------------------------------- ###
+
+# Table of the results made of the batches of rows appended to it, so that an append does not copy the rows already there
+# The rows at some positions (of the concatenated table) are taken from the batches holding them, and the batches are only concatenated
+# when the whole table is needed (see frame). If align_dtypes is True, the rows of the older batches are converted to the dtypes of
+# the last batch when they are taken, as the categories of the compact representation are only extended by the new batches.
+class ChunkedTable:
+    def __init__(self, frames: list[pd.DataFrame], align_dtypes: bool = False):
+
+        if len(frames) == 0:
+            raise ValueError("A chunked table should have at least one batch of rows.")
+
+        self.chunks = list(frames)
+        self.align_dtypes = align_dtypes
+        self.offsets = np.cumsum([0] + [len(df) for df in self.chunks])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def columns(self) -> pd.Index:
+        return self.chunks[-1].columns
+
+    # Add a batch of rows at the end of the table
+    def append(self, df: pd.DataFrame) -> None:
+        self.chunks.append(df)
+        self.offsets = np.append(self.offsets, self.offsets[-1] + len(df))
+
+    # Rows at sorted positions of the concatenated table, in the order of the positions
+    def take(self, positions: np.ndarray) -> pd.DataFrame:
+        chunk_positions = np.searchsorted(self.offsets, positions, side='right') - 1
+        pieces = []
+        for k in np.unique(chunk_positions):
+            pieces.append(self.chunks[k].iloc[positions[chunk_positions == k] - self.offsets[k]])
+        if len(pieces) == 0:
+            return self.chunks[-1].iloc[[]]
+        return self._concat(pieces)
+
+    # Whole table, the batches are concatenated once and replaced by the concatenated table
+    def frame(self) -> pd.DataFrame:
+        if len(self.chunks) > 1:
+            self.chunks = [self._concat(self.chunks)]
+            self.offsets = np.array([0, len(self.chunks[0])])
+        return self.chunks[0]
+
+    def memory_usage(self, deep: bool = False) -> pd.Series:
+        return pd.concat([df.memory_usage(deep=deep) for df in self.chunks])
+
+    def _concat(self, pieces: list[pd.DataFrame]) -> pd.DataFrame:
+        if self.align_dtypes:
+            dtypes = self.chunks[-1].dtypes
+            pieces = [df if df.dtypes.equals(dtypes) else df.astype({column: dtypes[column] for column in df.columns if column in dtypes})
+                      for df in pieces]
+        return pd.concat(pieces) if len(pieces) > 1 else pieces[0]
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import os
+import joblib
+import sklearn
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.inspection import permutation_importance, partial_dependence
+from sklearn.metrics import r2_score
+
+#%% ------------------------------- ###
+###       1. Surrogate models       ###
+### ------------------------------- ###
+
+# Fit one emulator for one output, used by the pool of workers
+def _fit_surrogate(X: np.ndarray, y: np.ndarray, params: dict, train: np.ndarray) -> HistGradientBoostingRegressor:
+    return HistGradientBoostingRegressor(**params).fit(X[train], y[train])
+
+# Permutation importance of one emulator, used by the pool of workers
+def _surrogate_importance(regressor: HistGradientBoostingRegressor, X: np.ndarray, y: np.ndarray, n_repeats: int, seed: int) -> np.ndarray:
+    result = permutation_importance(regressor, X, y, n_repeats=n_repeats, random_state=seed)
+    return np.stack([result.importances_mean, result.importances_std])
+
+# Gradient boosting emulators of the outputs of a model, one per output, with the parameters of the sample as features
+# The trained emulators are stored in the cache directory, keyed by the fingerprint of the data and of the hyperparameters
+class SurrogateModels:
+    def __init__(self, parameters: list[str], outputs: pd.DataFrame, cache_dir: str = None, test_size: float = 0.2, seed: int = 0, **params):
+
+        if test_size < 0 or test_size >= 1:
+            raise ValueError("The test size should be between 0 and 1.")
+
+        self.parameters = list(parameters)
+        self.outputs = outputs.reset_index(drop=True) # One row per output, describing it
+        self.cache_dir = cache_dir
+        self.test_size = test_size
+        self.seed = seed
+        self.params = params
+        self.regressors = []
+        self.importance = {}
+
+    # Fingerprint of the data and of the settings of the emulators
+    def fingerprint(self, X: np.ndarray, Y: np.ndarray) -> str:
+        sha = hashlib.sha256()
+        sha.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+        sha.update(np.ascontiguousarray(Y, dtype=np.float64).tobytes())
+        sha.update(json.dumps([self.parameters, self.outputs.astype(str).values.tolist(), self.test_size, self.seed,
+                               self.params, sklearn.__version__], sort_keys=True, default=str).encode())
+        return sha.hexdigest()[:32]
+
+    # Train the emulators of all the outputs in parallel, or load them from the cache
+    def fit(self, X: np.ndarray, Y: np.ndarray, workers: int = None) -> "SurrogateModels":
+
+        if X.shape[1] != len(self.parameters) or Y.shape[1] != len(self.outputs):
+            raise ValueError("The shape of the data does not match the parameters and the outputs.")
+
+        self.key = self.fingerprint(X, Y)
+        cache_file = None
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cache_file = os.path.join(self.cache_dir, f"surrogates_{self.key}.joblib")
+            if os.path.exists(cache_file):
+                cached = joblib.load(cache_file)
+                self.regressors, self.scores, self.test, self.importance = cached["regressors"], cached["scores"], cached["test"], cached["importance"]
+                self.X, self.Y = X, Y
+                return self
+
+        # Split the scenarios between training and test
+        rng = np.random.default_rng(self.seed)
+        order = rng.permutation(X.shape[0])
+        nb_test = int(round(self.test_size * X.shape[0]))
+        self.test, train = np.sort(order[:nb_test]), np.sort(order[nb_test:])
+
+        params = {"random_state": self.seed, **self.params}
+        self.regressors = joblib.Parallel(n_jobs=workers)(joblib.delayed(_fit_surrogate)(X, Y[:, k], params, train) for k in range(Y.shape[1]))
+
+        # Accuracy of the emulators on the test scenarios
+        if nb_test > 1:
+            prediction = self.predict(X[self.test])
+            self.scores = np.array([r2_score(Y[self.test, k], prediction[:, k]) for k in range(Y.shape[1])])
+        else:
+            self.scores = np.full(Y.shape[1], np.nan)
+        self.importance = {}
+        self.X, self.Y = X, Y
+
+        if cache_file is not None:
+            self._save(cache_file)
+        return self
+
+    def _save(self, cache_file: str) -> None:
+        joblib.dump({"regressors": self.regressors, "scores": self.scores, "test": self.test, "importance": self.importance}, cache_file)
+
+    # Predict all the outputs for new combinations of parameters, X has the shape scenarios x parameters
+    def predict(self, X: np.ndarray) -> np.ndarray:
+
+        if len(self.regressors) == 0:
+            raise ValueError("The surrogate models have not been trained yet. Please use the fit() function.")
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        return np.column_stack([regressor.predict(X) for regressor in self.regressors])
+
+    # Predict the outputs for parameters given as a dictionnary, the missing parameters take their baseline value 1
+    def what_if(self, values: dict) -> pd.DataFrame:
+
+        for parameter in values:
+            if parameter not in self.parameters:
+                raise ValueError(f"The parameter {parameter} is not a parameter of the surrogate models.")
+        x = np.array([[values.get(parameter, 1) for parameter in self.parameters]], dtype=np.float64)
+        df = self.outputs.copy()
+        df["value"] = self.predict(x)[0]
+        return df
+
+    # Accuracy (R2 on the test scenarios) of each emulator
+    def accuracy(self) -> pd.DataFrame:
+        df = self.outputs.copy()
+        df["R2"] = self.scores
+        return df
+
+    # Permutation importance of the parameters for each output, on the test scenarios (or all scenarios if there is no test set)
+    # The result is cached in memory and in the cache directory
+    def permutation_importance(self, n_repeats: int = 10, workers: int = None) -> pd.DataFrame:
+
+        if n_repeats not in self.importance:
+            rows = self.test if len(self.test) > 1 else np.arange(self.X.shape[0])
+            results = joblib.Parallel(n_jobs=workers)(joblib.delayed(_surrogate_importance)(regressor, self.X[rows], self.Y[rows, k], n_repeats, self.seed)
+                                                      for k, regressor in enumerate(self.regressors))
+            self.importance[n_repeats] = np.stack(results) # outputs x (mean, std) x parameters
+            if self.cache_dir is not None:
+                self._save(os.path.join(self.cache_dir, f"surrogates_{self.key}.joblib"))
+
+        importance = self.importance[n_repeats]
+        df = self.outputs.iloc[np.repeat(np.arange(len(self.outputs)), len(self.parameters))].reset_index(drop=True)
+        df["Parameter"] = np.tile(self.parameters, len(self.outputs))
+        df["importance_mean"] = importance[:, 0, :].reshape(-1)
+        df["importance_std"] = importance[:, 1, :].reshape(-1)
+        return df
+
+    # Partial dependence of an output (given by its position) on a parameter
+    def partial_dependence(self, output: int, parameter: str, grid_resolution: int = 50) -> pd.DataFrame:
+
+        if parameter not in self.parameters:
+            raise ValueError(f"The parameter {parameter} is not a parameter of the surrogate models.")
+        result = partial_dependence(self.regressors[output], self.X, [self.parameters.index(parameter)], grid_resolution=grid_resolution, kind="average", method="brute")
+        return pd.DataFrame({parameter: result["grid_values"][0], "value": result["average"][0]})
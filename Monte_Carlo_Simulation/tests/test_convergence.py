@@ -0,0 +1,54 @@
+import pandas as pd
+import numpy as np
+import pytest
+from Functions_convergence import RunningMoments, P2Quantiles, ConvergenceMonitor
+
+# The streaming statistics should match the statistics of all the values at once
+
+@pytest.fixture(scope="module")
+def values():
+    # Outputs with different shapes: normal with a large offset (cancellation in the naive variance), lognormal, uniform and constant
+    rng = np.random.default_rng(0)
+    n = 10000
+    return np.column_stack([1e6 + rng.normal(size=n), rng.lognormal(sigma=1, size=n), rng.uniform(size=n), np.full(n, 3.0)])
+
+def test_running_moments(values):
+    moments = RunningMoments(values.shape[1])
+    assert np.isnan(moments.variance()).all()
+    # The values arrive by chunks of different sizes
+    for chunk in np.array_split(values, [1, 10, 500, 4000]):
+        for row in chunk:
+            moments.update(row)
+        n = moments.count
+        np.testing.assert_allclose(moments.mean, values[:n].mean(axis=0), rtol=1e-12)
+        if n > 1:
+            np.testing.assert_allclose(moments.variance(), np.var(values[:n], axis=0, ddof=1), rtol=1e-8, atol=1e-12)
+    assert moments.count == len(values)
+
+def test_p2_quantiles(values):
+    quantiles = [0.05, 0.25, 0.5, 0.95]
+    sketch = P2Quantiles(values.shape[1], quantiles)
+    assert np.isnan(sketch.estimates()).all()
+    for row in values[:3]:
+        sketch.update(row)
+    # Exact quantiles with less than 5 scenarios
+    np.testing.assert_allclose(sketch.estimates(), np.quantile(values[:3], quantiles, axis=0).T)
+    for row in values[3:]:
+        sketch.update(row)
+    expected = np.quantile(values, quantiles, axis=0).T
+    # Tolerance relative to the spread of each output (the constant output is exact)
+    spread = np.quantile(values, 0.95, axis=0) - np.quantile(values, 0.05, axis=0)
+    assert (np.abs(sketch.estimates() - expected) <= 0.02 * spread[:, None] + 1e-12).all()
+
+def test_p2_invalid_quantiles():
+    with pytest.raises(ValueError):
+        P2Quantiles(2, [0, 0.5])
+
+def test_monitor_update_many(values):
+    outputs = pd.DataFrame({"Selection": ["A", "B", "C", "D"]})
+    monitor = ConvergenceMonitor(outputs, quantiles=[0.05, 0.95])
+    for chunk in np.array_split(values, 7):
+        monitor.update_many(chunk)
+    assert monitor.count == len(values)
+    np.testing.assert_allclose(monitor.moments.mean, values.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(monitor.moments.variance(), np.var(values, axis=0, ddof=1), rtol=1e-8, atol=1e-12)
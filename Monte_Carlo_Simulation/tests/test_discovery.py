@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from Functions_discovery import ScenarioIndex, bitmap_from_mask, mask_from_bitmap, bitmap_count, prim_boxes
+
+# The bitmaps of the index should be the boolean masks of the same predicates on the values
+
+def masks(values: np.ndarray, operator: str, value) -> np.ndarray:
+    with np.errstate(invalid='ignore'):
+        if operator == "<":
+            return values < value
+        if operator == "<=":
+            return values <= value
+        if operator == ">":
+            return values > value
+        if operator == ">=":
+            return values >= value
+        if operator == "==":
+            return values == value
+        if operator == "!=":
+            return ~np.isnan(values) & (values != value)
+        return (values >= value[0]) & (values <= value[1])
+
+@pytest.fixture(scope="module")
+def values():
+    # 1000 scenarios (not a multiple of 64): a continuous column, a column of integers with many ties and a column with NaN values
+    rng = np.random.default_rng(0)
+    values = np.column_stack([rng.normal(size=1000), rng.integers(0, 7, size=1000).astype(np.float64), rng.uniform(size=1000)])
+    values[rng.choice(1000, size=150, replace=False), 2] = np.nan
+    return values
+
+def test_bitmap_round_trip(values):
+    mask = values[:, 0] > 0
+    bitmap = bitmap_from_mask(mask)
+    assert len(bitmap) == 16
+    np.testing.assert_array_equal(mask_from_bitmap(bitmap, 1000), mask)
+    assert bitmap_count(bitmap) == mask.sum()
+
+@pytest.mark.parametrize("n_bins", [1, 7, 32, 1000])
+def test_predicates_match_masks(values, n_bins):
+    index = ScenarioIndex(values, ["normal", "ties", "nan"], n_bins=n_bins)
+    for j, column in enumerate(index.columns):
+        sorted_values = index.sorted_values[:, j]
+        # The thresholds are the values at the edges of the bins (ties), values between them and values outside of the range
+        edges = sorted_values[np.minimum(index.bin_starts, index.valid_counts[j] - 1)]
+        thresholds = np.concatenate([edges, edges + 1e-9, [-np.inf, -10.0, 0.5, 3.0, 10.0, np.inf]])
+        for value in thresholds:
+            for operator in ["<", "<=", ">", ">=", "==", "!="]:
+                bitmap = index.predicate(column, operator, value)
+                np.testing.assert_array_equal(index.mask(bitmap), masks(values[:, j], operator, value), err_msg=f"{column} {operator} {value}")
+                assert index.count(bitmap) == masks(values[:, j], operator, value).sum()
+        bounds = (edges[len(edges) // 2], edges[-1])
+        np.testing.assert_array_equal(index.mask(index.predicate(column, "between", bounds)), masks(values[:, j], "between", bounds))
+
+def test_query_combinations(values):
+    index = ScenarioIndex(values, ["normal", "ties", "nan"], n_bins=16)
+    conditions = [("normal", ">", 0.2), ("ties", "<=", 3), ("nan", "<", 0.7)]
+    expected = [masks(values[:, j], operator, value) for j, (_, operator, value) in enumerate(conditions)]
+    np.testing.assert_array_equal(index.mask(index.query(conditions)), np.logical_and.reduce(expected))
+    np.testing.assert_array_equal(index.mask(index.query(conditions, combine="or")), np.logical_or.reduce(expected))
+    # The inverse keeps the padding bits at 0, the scenarios with a NaN value are in the inverse of a predicate
+    inverse = index.invert(index.predicate("nan", "<", 0.7))
+    np.testing.assert_array_equal(index.mask(inverse), ~expected[2])
+    assert index.count(inverse) == (~expected[2]).sum()
+
+# PRIM should recover a box planted in the parameters: the target is x1 < 0.3 and x2 > 0.6, x3 and x4 have no effect
+def test_prim_planted_box():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(size=(4000, 4))
+    y = (X[:, 0] < 0.3) & (X[:, 1] > 0.6)
+    limits, trajectory = prim_boxes(X, y, ["x1", "x2", "x3", "x4"], alpha=0.05, min_coverage=0.8)
+    limits = limits.set_index("Parameter")
+    assert list(limits.index) == ["x1", "x2"]
+    assert limits.loc["x1", "low"] == -np.inf and limits.loc["x1", "high"] == pytest.approx(0.3, abs=0.02)
+    assert limits.loc["x2", "low"] == pytest.approx(0.6, abs=0.02) and limits.loc["x2", "high"] == np.inf
+    # The box holds the target scenarios only and most of them
+    assert limits["density"].iloc[0] == 1
+    assert limits["coverage"].iloc[0] >= 0.8
+    assert limits["support"].iloc[0] == pytest.approx(0.3 * 0.4, abs=0.02)
+    assert trajectory["selected"].sum() == 1
+    # The same box from the index, with the target given as conditions
+    index = ScenarioIndex(X, ["x1", "x2", "x3", "x4"])
+    index_limits, _ = index.prim([("x1", "<", 0.3), ("x2", ">", 0.6)], alpha=0.05, min_coverage=0.8)
+    np.testing.assert_allclose(index_limits.set_index("Parameter")[["low", "high"]].to_numpy(), limits[["low", "high"]].to_numpy())
@@ -0,0 +1,50 @@
+import os
+import pytest
+from Functions_analysis import MainResults_GSA, results_from_records
+from Functions_benchmark import synthetic_ensemble_records
+from Functions_figures import batch_figures
+
+# A figure is rendered again only when its spec or the data of its queries change, the other ones are skipped
+
+# Results of two models, the results of Model 2 are drawn with another seed if seed_model_2 is given
+def imported_results(seed_model_2: int = None) -> MainResults_GSA:
+    ensemble = synthetic_ensemble_records(20, n_models=2, seed=0)
+    names = ensemble["model_names"]
+    records = ensemble["results"]
+    if seed_model_2 is not None:
+        records = records[:2] + synthetic_ensemble_records(20, n_models=2, seed=seed_model_2)["results"][2:]
+    results = MainResults_GSA(".", [f"{name}.gdx" for name in names], [f"{name}_baseline.gdx" for name in names], names)
+    results.import_results_frames([results_from_records(model_records, baseline=k % 2 == 1) for k, model_records in enumerate(records)])
+    return results
+
+def plot_grid(countries: str = "EU_West") -> dict:
+    return {"formats": ["json"],
+            "figures": [{"plot": "violin", "name": "pv", "selection": "Elec PV Capacity", "countries": countries, "year": 2050},
+                        {"plot": "violin", "name": "wind", "selection": "Elec ONSHORE Capacity", "countries": "EU_North", "year": 2050,
+                         "models": ["Model 1"]}]}
+
+def statuses(report) -> dict:
+    return dict(zip(report["name"], report["status"]))
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_figures_skips_unchanged(tmp_path, workers):
+    results = imported_results()
+    output_dir = str(tmp_path)
+    assert statuses(batch_figures(results, plot_grid(), output_dir, workers=workers)) == {"pv": "rendered", "wind": "rendered"}
+    modified = {file: os.path.getmtime(os.path.join(output_dir, file)) for file in ["pv.json", "wind.json"]}
+
+    # Nothing changed: both figures are skipped and their files are kept
+    assert statuses(batch_figures(results, plot_grid(), output_dir, workers=workers)) == {"pv": "skipped", "wind": "skipped"}
+    assert all(os.path.getmtime(os.path.join(output_dir, file)) == mtime for file, mtime in modified.items())
+
+    # The query of the PV figure changes: only this figure is rendered again
+    assert statuses(batch_figures(results, plot_grid("EU_North"), output_dir, workers=workers)) == {"pv": "rendered", "wind": "skipped"}
+
+    # The results of Model 2 change: only the PV figure, which plots Model 2, is rendered again
+    changed = imported_results(seed_model_2=10)
+    assert statuses(batch_figures(changed, plot_grid("EU_North"), output_dir, workers=workers)) == {"pv": "rendered", "wind": "skipped"}
+
+    # A deleted file is rendered again, and force renders all the figures
+    os.remove(os.path.join(output_dir, "wind.json"))
+    assert statuses(batch_figures(changed, plot_grid("EU_North"), output_dir, workers=workers)) == {"pv": "skipped", "wind": "rendered"}
+    assert statuses(batch_figures(changed, plot_grid("EU_North"), output_dir, workers=workers, force=True)) == {"pv": "rendered", "wind": "rendered"}
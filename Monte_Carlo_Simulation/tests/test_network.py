@@ -0,0 +1,104 @@
+import pandas as pd
+import numpy as np
+import pytest
+from Functions_network import H2Network, capacity_to_energy
+
+# The sparse aggregations of the H2 network should be the same as the aggregations of the rows of the transmission tables
+
+region_countries = {"DK1": "DENMARK", "DK2": "DENMARK", "DE4-N": "GERMANY", "NO1": "NORWAY", "SE3": "SWEDEN"}
+groups = {"Nordic": ["DENMARK", "NORWAY", "SWEDEN"]}
+
+# Random corridors of 5 regions for the baseline and 6 scenarios in 2 years, the capacities have two rows per corridor (categories)
+def transmission_tables(seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    regions = list(region_countries.keys())
+    corridors = [(i, j) for i in regions for j in regions if i != j]
+    tables = []
+    for repeat in [2, 1]:
+        rows = [(i, j, region_countries[i], scenario, year) for scenario in range(7) for year in ["2030", "2050"]
+                for i, j in corridors if rng.uniform() < 0.5 for _ in range(repeat)]
+        df = pd.DataFrame(rows, columns=['IRRRE', 'IRRRI', 'C', 'Scenarios', 'Y'])
+        df['value'] = rng.uniform(0.1, 5, size=len(df))
+        tables.append(df)
+    return tables[0], tables[1]
+
+# Reference cross-border totals of the groups with pandas
+def cross_border_reference(df: pd.DataFrame, countries: list[str], YEAR: str) -> pd.DataFrame:
+    df = df[df['Y'] == YEAR].assign(exporter=lambda df: df['IRRRE'].map(region_countries).isin(countries),
+                                    importer=lambda df: df['IRRRI'].map(region_countries).isin(countries))
+    exports = df[df['exporter'] & ~df['importer']].groupby('Scenarios')['value'].sum()
+    imports = df[df['importer'] & ~df['exporter']].groupby('Scenarios')['value'].sum()
+    scenarios = np.unique(df['Scenarios'])
+    return pd.DataFrame({'exports': exports.reindex(scenarios, fill_value=0), 'imports': imports.reindex(scenarios, fill_value=0)})
+
+@pytest.fixture(scope="module")
+def tables():
+    return transmission_tables()
+
+@pytest.fixture(scope="module")
+def network(tables):
+    return H2Network(*tables, region_countries, groups)
+
+def test_matrices(tables, network):
+    capacity, flow = tables
+    assert network.shape == (7, 2, 5)
+    for kind, df in [("capacity", capacity), ("flow", flow)]:
+        # The rows of the same corridor are summed
+        expected = df.groupby(['Scenarios', 'Y', 'IRRRE', 'IRRRI'])['value'].sum()
+        for (scenario, year, exporter, importer), value in expected.items():
+            matrix = network.matrix(kind, scenario, year)
+            assert matrix[network.regions.index(exporter), network.regions.index(importer)] == pytest.approx(value)
+        assert network.matrices[kind].nnz == len(expected)
+
+@pytest.mark.parametrize("Countries", ["Nordic", ["GERMANY"], {"Nordic": "Nordic", "DK": ["DENMARK"]}])
+def test_cross_border(tables, network, Countries):
+    flow = tables[1]
+    df = network.cross_border(Countries, 2050)
+    for name, countries in network._groups(Countries).items():
+        expected = cross_border_reference(flow, countries, "2050")
+        group = df[df['Group'] == name].set_index('Scenarios')
+        np.testing.assert_allclose(group['exports'].reindex(expected.index), expected['exports'])
+        np.testing.assert_allclose(group['imports'].reindex(expected.index), expected['imports'])
+        np.testing.assert_allclose(group['net_imports'], group['imports'] - group['exports'])
+    assert 0 not in network.net_imports("Nordic", 2050, include_baseline=False)['Scenarios'].values
+
+# The corridors with a flow and no capacity have no utilisation (NaN)
+@pytest.mark.filterwarnings("ignore:All-NaN slice:RuntimeWarning", "ignore:Mean of empty slice:RuntimeWarning")
+def test_utilisation(tables, network):
+    statistics = network.corridor_statistics(2030)
+    corridors = pd.MultiIndex.from_frame(statistics[['IRRRE', 'IRRRI']])
+    # Values of the scenarios (without the baseline) of 2030, one row per corridor and one column per scenario
+    values = lambda df: df[df['Y'] == "2030"].groupby(['IRRRE', 'IRRRI', 'Scenarios'])['value'].sum().unstack('Scenarios') \
+        .reindex(columns=range(1, 7)).fillna(0)
+    capacity, flow = values(tables[0]), values(tables[1])
+    # The capacity of a corridor is the largest capacity of its two directions
+    reverse = capacity.set_axis(capacity.index.swaplevel().set_names(['IRRRE', 'IRRRI']), axis=0)
+    capacity = np.maximum(capacity.reindex(corridors, fill_value=0), reverse.reindex(corridors, fill_value=0)).to_numpy()
+    flow = flow.reindex(corridors, fill_value=0).to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        utilisation = np.where(capacity > 0, flow / (capacity * capacity_to_energy), np.nan)
+
+    np.testing.assert_allclose(statistics['mean_capacity'], capacity.mean(axis=1))
+    np.testing.assert_allclose(statistics['mean_flow'], flow.mean(axis=1))
+    np.testing.assert_array_equal(statistics['scenarios_with_capacity'], (capacity > 0).sum(axis=1))
+    np.testing.assert_allclose(statistics['mean_utilisation'], np.nanmean(utilisation, axis=1))
+    np.testing.assert_allclose(statistics['max_utilisation'], np.nanmax(utilisation, axis=1))
+
+def test_top_corridors(tables, network):
+    flow = tables[1]
+    flow = flow[(flow['Y'] == "2050") & (flow['Scenarios'] != 0)]
+    expected = flow.groupby(['IRRRE', 'IRRRI'])['value'].sum() / 6
+    top = network.top_corridors(2050, k=3)
+    np.testing.assert_allclose(top['mean_flow'], expected.nlargest(3).to_numpy())
+    assert list(zip(top['IRRRE'], top['IRRRI'])) == list(expected.nlargest(3).index)
+    cross_border = network.top_corridors(2050, k=50, cross_border=True)
+    assert (cross_border['C'] != cross_border['CI']).all()
+    assert len(cross_border) == sum(region_countries[i] != region_countries[j] for i, j in expected.index)
+
+# The tables can be given as functions returning their partitions, as for a results store
+def test_partitions(tables, network):
+    partitioned = H2Network(*[lambda df=df: [df[df['Scenarios'] < 3], df[df['Scenarios'] >= 3]] for df in tables], region_countries, groups)
+    for kind in ["capacity", "flow"]:
+        assert (partitioned.matrices[kind] != network.matrices[kind]).nnz == 0
+    with pytest.raises(ValueError):
+        network.year_matrix("flow", 2040)
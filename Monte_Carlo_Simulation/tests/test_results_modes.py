@@ -0,0 +1,125 @@
+import pandas as pd
+import numpy as np
+import os
+import pytest
+from Functions_analysis import MainResults_GSA, results_from_records, split_results_tables, results_selections, EU_West, EU_North
+from Functions_benchmark import synthetic_ensemble_records
+from Functions_storage import ResultsStore
+
+# get_results should give the same results whatever the representation of the results: padded rows filtered without the index (the
+# reference), the index, the compact tables, the cube, the roll-up, the out-of-core store and the appended batches
+
+n_scenarios = 40
+years = [2050, '2050', '2030']
+countries = [EU_West, ['DENMARK'], "EU_North", "EU"]
+
+@pytest.fixture(scope="module")
+def ensemble():
+    return synthetic_ensemble_records(n_scenarios, n_models=2, seed=3)
+
+def new_results(ensemble: dict) -> MainResults_GSA:
+    names = ensemble["model_names"]
+    return MainResults_GSA(".", [f"{name}.gdx" for name in names], [f"{name}_baseline.gdx" for name in names], names)
+
+# DataFrames of the files of the ensemble, the scenario file and then the baseline file of each model
+def ensemble_frames(ensemble: dict) -> list[pd.DataFrame]:
+    return [results_from_records(records, baseline=k % 2 == 1) for k, records in enumerate(ensemble["results"])]
+
+def build(mode: str, ensemble: dict, store_dir: str) -> MainResults_GSA:
+    results = new_results(ensemble)
+    frames = ensemble_frames(ensemble)
+    if mode.startswith("store"):
+        store = ResultsStore(store_dir, chunk_scenarios=16)
+        for k, df in enumerate(frames):
+            store.write(ensemble["model_names"][k // 2], split_results_tables(df))
+        results.open_results_store(store_dir)
+    elif mode.startswith("appended"):
+        # The scenarios of each model are imported in two batches
+        first = [df[df['Scenarios'] <= n_scenarios // 2] if k % 2 == 0 else df for k, df in enumerate(frames)]
+        results.import_results_frames(first, compact=mode == "appended_compact")
+        if mode == "appended_compact":
+            results.build_results_rollup()
+        results.append_results_frames([df[df['Scenarios'] > n_scenarios // 2] for df in frames[::2]], ensemble["model_names"])
+    else:
+        results.import_results_frames(frames, compact="compact" in mode, index=mode in ["index", "compact_index"])
+    if mode.endswith("cube"):
+        results.build_results_cube()
+    if mode.endswith("rollup"):
+        results.build_results_rollup()
+    return results
+
+# Results sorted by scenario (and importing country), with plain dtypes
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    columns = [column for column in ['Scenarios', 'CI'] if column in df.columns]
+    df = df.astype({'Scenarios': np.int64, 'value': np.float64} | ({'CI': str} if 'CI' in df.columns else {}))
+    return df.sort_values(columns, ignore_index=True)[columns + ['value']]
+
+@pytest.fixture(scope="module")
+def reference(ensemble, tmp_path_factory):
+    results = build("rows", ensemble, str(tmp_path_factory.mktemp("rows")))
+    # The reference results are computed once for all the modes
+    results.enable_query_cache()
+    return results
+
+@pytest.mark.parametrize("mode", ["index", "compact", "compact_index", "cube", "rollup", "store", "store_cube", "store_rollup",
+                                  "appended", "appended_compact"])
+def test_get_results_modes(mode, ensemble, reference, tmp_path):
+    results = build(mode, ensemble, str(tmp_path))
+    for model in ensemble["model_names"]:
+        for selection in results_selections:
+            for Countries in countries:
+                for YEAR in years:
+                    expected = normalize(reference.get_results(model, selection, Countries, YEAR))
+                    assert len(expected) != 0 or "Transmission" in selection or "Import" in selection
+                    pd.testing.assert_frame_equal(normalize(results.get_results(model, selection, Countries, YEAR)), expected,
+                                                  check_exact=False, rtol=1e-12, obj=f"{mode} {model} {selection} {Countries} {YEAR}")
+
+def test_years_str_and_int(reference):
+    df_int = normalize(reference.get_results("Model 1", "Elec PV Capacity", EU_West, 2050))
+    df_str = normalize(reference.get_results("Model 1", "Elec PV Capacity", EU_West, "2050"))
+    assert len(df_int) != 0
+    pd.testing.assert_frame_equal(df_int, df_str)
+
+@pytest.mark.parametrize("mode", ["compact", "store"])
+def test_h2_network_modes(mode, ensemble, reference, tmp_path):
+    results = build(mode, ensemble, str(tmp_path))
+    for model in ensemble["model_names"]:
+        expected, network = reference.h2_network(model), results.h2_network(model)
+        assert network.shape == expected.shape
+        for kind in ["capacity", "flow"]:
+            assert (network.matrices[kind] != expected.matrices[kind]).nnz == 0
+        pd.testing.assert_frame_equal(network.net_imports({"West": EU_West, "North": EU_North}, 2050),
+                                      expected.net_imports({"West": EU_West, "North": EU_North}, 2050))
+
+# The lazy models read each table from the files on first use, the GDX reading is replaced by the tables of the ensemble
+def test_lazy_matches_eager(ensemble, reference, monkeypatch):
+    import Functions_analysis
+    frames = dict(zip([file for name in ensemble["model_names"] for file in [f"{name}.gdx", f"{name}_baseline.gdx"]], ensemble_frames(ensemble)))
+
+    def read_table(files, Table, float32=False, profiler=None, model=None):
+        tables = [split_results_tables(frames[os.path.basename(file_path)]) for file_path, baseline in files]
+        return Functions_analysis.results_table_from_frames([tables[Table] for tables in tables if Table in tables], Table, float32=float32)
+
+    monkeypatch.setattr(Functions_analysis, "read_results_table", read_table)
+    results = new_results(ensemble)
+    results.import_results(lazy=True, max_memory=1e6)
+    for model in ensemble["model_names"]:
+        for selection in results_selections:
+            for YEAR in years:
+                pd.testing.assert_frame_equal(normalize(results.get_results(model, selection, EU_West, YEAR)),
+                                              normalize(reference.get_results(model, selection, EU_West, YEAR)), obj=f"{model} {selection} {YEAR}")
+
+# The scenarios which are not in all the models are counted without the baselines (scenario 0)
+@pytest.mark.parametrize("baselines", [[True, True], [True, False]])
+def test_compare_models_dropped(baselines, ensemble, caplog):
+    frames = ensemble_frames(ensemble)
+    # The second model only has the first half of the scenarios
+    frames[2] = frames[2][frames[2]['Scenarios'] <= n_scenarios // 2]
+    if not baselines[1]:
+        frames[3] = frames[3].iloc[:0]
+    results = new_results(ensemble)
+    results.import_results_frames(frames)
+    with caplog.at_level("INFO", logger="GSA_Analysis"):
+        results.compare_models(["Elec PV Capacity"], EU_West, 2050)
+    messages = [record.getMessage() for record in caplog.records if getattr(record, "event", None) == "compare_models"]
+    assert messages == [f"{n_scenarios - n_scenarios // 2} scenarios are not in all the models and are not compared"]
@@ -0,0 +1,86 @@
+import numpy as np
+from scipy import stats
+from Functions_sensitivity import (rank_bins, bins_one_hot, first_order_indices, cdf_indicators, pawn_indices, sensitivity_indices,
+                                   prcc_matrix, correlation_coefficients)
+
+# Indices of simple models with known values: y = x1 + 0.1 x2 with independent uniform inputs has the first order
+# indices 1 / 1.01 for x1 and 0.01 / 1.01 for x2, and the input x3 has no effect on y
+
+n = 20000
+
+def linear_model(seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(size=(n, 3))
+    Y = (X[:, 0] + 0.1 * X[:, 1])[:, None]
+    return X, Y
+
+def test_first_order_linear():
+    X, Y = linear_model()
+    n_bins = 50
+    indices = first_order_indices(bins_one_hot(rank_bins(X, n_bins), n_bins), Y, n_bins)
+    assert indices.shape == (3, 1)
+    np.testing.assert_allclose(indices[:, 0], [1 / 1.01, 0.01 / 1.01, 0], atol=5e-3)
+
+def test_first_order_weights():
+    # Integer weights are the same as repeating the scenarios
+    X, Y = linear_model()
+    X, Y = X[:500], Y[:500]
+    weights = np.random.default_rng(1).integers(0, 3, size=500).astype(np.float64)
+    repeated = np.repeat(np.arange(500), weights.astype(int))
+    one_hot = bins_one_hot(rank_bins(X, 10), 10)
+    np.testing.assert_allclose(first_order_indices(one_hot, Y, 10, weights), first_order_indices(one_hot[repeated], Y[repeated], 10))
+    # The CDFs are evaluated on the same grid
+    indicators = cdf_indicators(Y)
+    repeated_indicators = [(start, stop, below[repeated]) for start, stop, below in indicators]
+    np.testing.assert_allclose(pawn_indices(one_hot, Y, 10, weights, indicators=indicators),
+                               pawn_indices(one_hot[repeated], Y[repeated], 10, indicators=repeated_indicators), atol=1e-6)
+
+# The null band of the PAWN indices is given by the indices of the inputs for outputs resampled independently of the inputs (bootstrap
+# of the output alone): an input without effect has an index inside the band, the inputs with an effect are above it
+def test_pawn_no_effect():
+    X, Y = linear_model()
+    one_hot = bins_one_hot(rank_bins(X, 10), 10)
+    indices = sensitivity_indices(X, Y, methods=["pawn"], n_boot=50, seed=0)["pawn"]
+    rng = np.random.default_rng(2)
+    null = np.stack([pawn_indices(one_hot, Y[rng.integers(len(Y), size=len(Y))], 10) for _ in range(50)])
+    low, high = np.quantile(null, [0.025, 0.975])
+    assert low <= indices["value"][2, 0] <= high
+    assert indices["CI_low"][0, 0] > high
+    assert indices["CI_low"][1, 0] > high
+
+def test_bootstrap_seed():
+    X, Y = linear_model()
+    X, Y = X[:2000], np.column_stack([Y[:2000, 0], X[:2000, 1]**2])
+    first = sensitivity_indices(X, Y, n_boot=50, seed=3, workers=4)
+    second = sensitivity_indices(X, Y, n_boot=50, seed=3, workers=2)
+    other = sensitivity_indices(X, Y, n_boot=50, seed=4, workers=4)
+    for method in ["first_order", "pawn"]:
+        for key in ["value", "CI_low", "CI_high"]:
+            np.testing.assert_array_equal(first[method][key], second[method][key])
+        np.testing.assert_array_equal(first[method]["value"], other[method]["value"])
+        assert not np.array_equal(first[method]["CI_low"], other[method]["CI_low"])
+        assert (first[method]["CI_low"] <= first[method]["CI_high"]).all()
+
+# Reference PRCC: correlation of the residuals of the ranks of x_j and of y regressed on the ranks of the other parameters
+def prcc_reference(X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+    X, Y = stats.rankdata(X, axis=0), stats.rankdata(Y, axis=0)
+    prcc = np.empty((X.shape[1], Y.shape[1]))
+    for j in range(X.shape[1]):
+        others = np.column_stack([np.ones(len(X)), np.delete(X, j, axis=1)])
+        x_residuals = X[:, j] - others @ np.linalg.lstsq(others, X[:, j], rcond=None)[0]
+        for k in range(Y.shape[1]):
+            y_residuals = Y[:, k] - others @ np.linalg.lstsq(others, Y[:, k], rcond=None)[0]
+            prcc[j, k] = np.corrcoef(x_residuals, y_residuals)[0, 1]
+    return prcc
+
+def test_prcc_matches_regression_residuals():
+    rng = np.random.default_rng(4)
+    # Correlated parameters, and outputs depending on several of them
+    X = rng.normal(size=(200, 5)) @ rng.normal(size=(5, 5))
+    Y = np.column_stack([X[:, 0] + 0.5 * X[:, 1]**3, np.exp(X[:, 2]) - X[:, 3], rng.normal(size=200)]) + 0.3 * rng.normal(size=(200, 3))
+    expected = prcc_reference(X, Y)
+    np.testing.assert_allclose(prcc_matrix(X, Y), expected, atol=1e-10)
+    # Only the first columns of the parameters are controlled for
+    coefficients = correlation_coefficients(X, Y, prcc_columns=3)
+    np.testing.assert_allclose(coefficients["prcc"][:3], prcc_reference(X[:, :3], Y), atol=1e-10)
+    assert np.isnan(coefficients["prcc"][3:]).all()
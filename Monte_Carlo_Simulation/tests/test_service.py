@@ -0,0 +1,57 @@
+import pandas as pd
+import json
+import pytest
+from Functions_analysis import MainResults_GSA, results_from_records, results_selections, EU_West
+from Functions_benchmark import synthetic_ensemble_records
+from Functions_figures import load_config_file, load_plot_grid
+from Functions_service import ResultsService, ResultsClient
+
+# The service answers the queries of a client with the results of get_results on the loaded results
+
+@pytest.fixture(scope="module")
+def results():
+    ensemble = synthetic_ensemble_records(20, n_models=2, seed=5)
+    names = ensemble["model_names"]
+    results = MainResults_GSA(".", [f"{name}.gdx" for name in names], [f"{name}_baseline.gdx" for name in names], names)
+    results.import_results_frames([results_from_records(records, baseline=k % 2 == 1) for k, records in enumerate(ensemble["results"])])
+    return results
+
+@pytest.fixture(scope="module")
+def service(results):
+    # The port 0 lets the system choose a free port
+    service = ResultsService(results, port=0, cache_size=8)
+    service.serve(background=True)
+    yield service
+    service.shutdown()
+
+def test_client_matches_get_results(results, service):
+    client = ResultsClient(service.url)
+    assert client.health()["models"] == results.model_names
+    for model in results.model_names:
+        for selection in results_selections[:4]:
+            for YEAR in [2050, "2030"]:
+                expected = results.get_results(model, selection, EU_West, YEAR).reset_index(drop=True)
+                pd.testing.assert_frame_equal(client.get_results(model, selection, EU_West, YEAR), expected, obj=f"{model} {selection} {YEAR}")
+    # The last query again is answered from the cache of the responses
+    hits = client.stats()["hits"]
+    client.get_results(model, selection, EU_West, YEAR)
+    assert client.stats()["hits"] == hits + 1
+    assert len(results.query_cache) <= service.cache_size
+    client.close()
+
+def test_client_errors(service):
+    client = ResultsClient(service.url)
+    errors = client.stats()["errors"]
+    with pytest.raises(ValueError):
+        client.get_results("Unknown model", results_selections[0], EU_West, 2050)
+    assert client.stats()["errors"] == errors + 1
+    client.close()
+
+# The command line serves the results of a file with only a results section, which is not a plot grid
+def test_results_only_config(tmp_path):
+    file_path = str(tmp_path / "service.json")
+    with open(file_path, 'w') as file:
+        json.dump({"results": {"path": ".", "store_dir": "store"}}, file)
+    assert load_config_file(file_path)["results"]["store_dir"] == "store"
+    with pytest.raises(ValueError):
+        load_plot_grid(file_path)
@@ -0,0 +1,121 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from Functions_analysis import MainResults_GSA, results_from_records, EU_West
+from Functions_benchmark import synthetic_ensemble_records
+from Functions_storage import ResultsCache
+
+# The results cache is keyed by the content of the GDX files, the GDX files are replaced by small files with a DataFrame each
+
+def gdx_files(directory, n: int) -> list[str]:
+    files = []
+    for i in range(n):
+        file_path = os.path.join(directory, f"scenarios_{i}.gdx")
+        with open(file_path, 'wb') as file:
+            file.write(os.urandom(1024))
+        files.append(file_path)
+    return files
+
+def frame(i: int) -> pd.DataFrame:
+    return pd.DataFrame({"Scenarios": np.arange(100), "value": np.full(100, float(i))})
+
+def test_cache_hits_write_index_once(tmp_path, monkeypatch):
+    files = gdx_files(str(tmp_path), 5)
+    cache = ResultsCache(str(tmp_path / "cache"))
+    for i, file_path in enumerate(files):
+        cache.store(file_path, frame(i))
+
+    writes = []
+    dump = json.dump
+    monkeypatch.setattr(json, "dump", lambda *args, **kwargs: (writes.append(1), dump(*args, **kwargs)))
+    cache = ResultsCache(str(tmp_path / "cache"))
+    for i, file_path in enumerate(files):
+        pd.testing.assert_frame_equal(cache.load(file_path), frame(i))
+    assert len(writes) == 0
+    cache.save_index()
+    cache.save_index()
+    assert len(writes) == 1
+    # The access times of the hits are kept in the index
+    with open(cache.index_path, 'r') as file:
+        assert json.load(file) == cache.index
+
+def test_cache_misses(tmp_path):
+    file_path = gdx_files(str(tmp_path), 1)[0]
+    cache = ResultsCache(str(tmp_path / "cache"))
+    cache.store(file_path, frame(0))
+    assert cache.load(file_path, baseline=True) is None
+    assert ResultsCache(str(tmp_path / "cache"), format_version=2).load(file_path) is None
+    with open(file_path, 'ab') as file:
+        file.write(b"changed")
+    assert cache.load(file_path) is None
+    assert len(cache.index) == 0
+
+def test_cache_eviction(tmp_path):
+    files = gdx_files(str(tmp_path), 6)
+    cache = ResultsCache(str(tmp_path / "cache"))
+    cache.store(files[0], frame(0))
+    nbytes = cache.size()
+    cache = ResultsCache(str(tmp_path / "cache2"), max_size=3.5 * nbytes)
+    for i, file_path in enumerate(files):
+        cache.store(file_path, frame(i))
+    # The least recently used files are evicted, the last stored file is always kept
+    assert list(cache.index.keys()) == [os.path.abspath(file_path) for file_path in files[3:]]
+    assert cache.size() <= cache.max_size
+    assert len([file for file in os.listdir(cache.cache_dir) if file.endswith(".parquet")]) == 3
+
+# The results published for worker processes are attached without copy, and released without leaving files in shared memory
+
+def imported_results(n_scenarios: int = 30) -> MainResults_GSA:
+    ensemble = synthetic_ensemble_records(n_scenarios, n_models=2, seed=7)
+    names = ensemble["model_names"]
+    results = MainResults_GSA(".", [f"{name}.gdx" for name in names], [f"{name}_baseline.gdx" for name in names], names)
+    results.import_results_frames([results_from_records(records, baseline=k % 2 == 1) for k, records in enumerate(ensemble["results"])])
+    return results
+
+# PV capacities of a model in the results attached to a handle, sorted by scenario
+def shared_get_results(handle: dict, model: str) -> pd.DataFrame:
+    df = MainResults_GSA.from_shared(handle).get_results(model, "Elec PV Capacity", EU_West, 2050)
+    return df.sort_values("Scenarios", ignore_index=True)[["Scenarios", "value"]]
+
+def shared_memory_files() -> set:
+    return set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+
+def test_shared_results_released():
+    results = imported_results()
+    expected = results.get_results("Model 1", "Elec PV Capacity", EU_West, 2050).sort_values("Scenarios", ignore_index=True)[["Scenarios", "value"]]
+    before = shared_memory_files()
+    handle = results.publish_shared(chunk_scenarios=8)
+    if os.path.isdir("/dev/shm"):
+        assert handle["shared_dir"].startswith("/dev/shm/")
+
+    # The workers attach to the handle and get the same results as the publishing process
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        frames = list(executor.map(shared_get_results, [handle] * 2, ["Model 1"] * 2))
+    for df in frames + [shared_get_results(handle, "Model 1")]:
+        pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+    # Only the publishing process can release the shared results
+    with pytest.raises(ValueError):
+        MainResults_GSA.from_shared(handle).release_shared()
+    results.release_shared()
+    assert not os.path.exists(handle["shared_dir"])
+    assert shared_memory_files() == before
+    with pytest.raises(ValueError):
+        results.release_shared()
+
+# Results already in a store are published without copying the store, and the store is kept when they are released
+def test_shared_store_not_copied(tmp_path):
+    results = imported_results()
+    handle = results.publish_shared(str(tmp_path / "first"))
+    stored = MainResults_GSA(".", results.scenario_files, results.baseline_files, results.model_names)
+    stored.open_results_store(handle["store_dir"], read_only=True)
+    stored_handle = stored.publish_shared(str(tmp_path / "second"))
+    assert stored_handle["store_dir"] == handle["store_dir"]
+    stored.release_shared()
+    assert not os.path.exists(stored_handle["shared_dir"]) and os.path.exists(handle["store_dir"])
+    pd.testing.assert_frame_equal(shared_get_results(stored_handle, "Model 2"), shared_get_results(handle, "Model 2"))
+    results.release_shared()
+    assert len(os.listdir(tmp_path)) == 0
@@ -0,0 +1,45 @@
+import pandas as pd
+import numpy as np
+import os
+import Functions_surrogate
+from Functions_surrogate import SurrogateModels
+
+# The trained emulators are stored in the cache directory: a second fit on the same data loads them, and new data trains new ones
+
+def sample(seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0.5, 1.5, size=(300, 3))
+    Y = np.column_stack([X[:, 0] * X[:, 1], np.sin(3 * X[:, 2]) + 0.1 * rng.normal(size=300)])
+    return X, Y
+
+def test_fit_cache_round_trip(tmp_path, monkeypatch):
+    fits = []
+    fit_surrogate = Functions_surrogate._fit_surrogate
+    monkeypatch.setattr(Functions_surrogate, "_fit_surrogate", lambda *args: (fits.append(1), fit_surrogate(*args))[1])
+    outputs = pd.DataFrame({"Selection": ["A", "B"]})
+    X, Y = sample()
+    grid = np.random.default_rng(1).uniform(0.5, 1.5, size=(50, 3))
+
+    first = SurrogateModels(["x1", "x2", "x3"], outputs, cache_dir=str(tmp_path), max_iter=50).fit(X, Y, workers=1)
+    assert len(fits) == 2
+    assert len(os.listdir(tmp_path)) == 1
+
+    # Same data and settings: the emulators are loaded from the cache
+    second = SurrogateModels(["x1", "x2", "x3"], outputs, cache_dir=str(tmp_path), max_iter=50).fit(X, Y, workers=1)
+    assert len(fits) == 2
+    assert second.key == first.key
+    np.testing.assert_array_equal(second.predict(grid), first.predict(grid))
+    np.testing.assert_array_equal(second.scores, first.scores)
+    np.testing.assert_array_equal(second.test, first.test)
+
+    # New data: the emulators are trained again and stored next to the first ones
+    X_new, Y_new = sample(seed=2)
+    third = SurrogateModels(["x1", "x2", "x3"], outputs, cache_dir=str(tmp_path), max_iter=50).fit(X_new, Y_new, workers=1)
+    assert len(fits) == 4
+    assert third.key != first.key
+    assert len(os.listdir(tmp_path)) == 2
+    assert not np.array_equal(third.predict(grid), first.predict(grid))
+
+    # New hyperparameters on the same data: trained again too
+    SurrogateModels(["x1", "x2", "x3"], outputs, cache_dir=str(tmp_path), max_iter=60).fit(X, Y, workers=1)
+    assert len(fits) == 6